@@ -0,0 +1,102 @@
+"""partition predictions by month
+
+Revision ID: a7c3e9f15d48
+Revises: f1b6d0c94e2a
+Create Date: 2026-10-18 14:58:09.602311
+
+Rebuilds `predictions` as a table RANGE-partitioned on `timestamp`, one
+partition per calendar month (UTC) named ``predictions_yYYYYmMM`` plus a
+``predictions_default`` catch-all.  Partitions cover the oldest stored
+month up to `MONTHS_AHEAD` months from now; `app.scripts.manage_partitions`
+keeps creating future ones and applies retention.
+
+The primary key becomes ``(id, timestamp)`` because a unique constraint on
+a partitioned table must include the partition key.  Indexes are declared
+on the parent, so Postgres builds them per partition, HNSW included; a
+partitioned index cannot be built CONCURRENTLY, so this migration locks
+`predictions` while it copies and indexes.
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f15d48'
+down_revision: Union[str, Sequence[str], None] = 'f1b6d0c94e2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+
+INDEXES = {
+    "ix_predictions_risk_level": "(risk_level)",
+    "ix_predictions_team_ts_id": "(team_id, timestamp DESC, id DESC)",
+    "ix_predictions_team_model_ts_id": "(team_id, model_id, timestamp DESC, id DESC)",
+    "ix_predictions_team_level_ts_id": "(team_id, risk_level, timestamp DESC, id DESC)",
+    "ix_predictions_embedding_hnsw_l2":
+        "USING hnsw ((embedding::halfvec(2944)) halfvec_l2_ops) WITH (m = 16, ef_construction = 64)",
+    "ix_predictions_embedding_hnsw_cosine":
+        "USING hnsw ((embedding::halfvec(2944)) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)",
+}
+
+
+def _add_months(month: date, n: int) -> date:
+    y, m = divmod(month.month - 1 + n, 12)
+    return date(month.year + y, m + 1, 1)
+
+
+def _create_indexes() -> None:
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON predictions {definition}")
+
+
+def _recreate_from(old: str, partitioned: bool) -> None:
+    """Create a fresh `predictions` shaped like `old`, copy rows, drop `old`."""
+    suffix = ' PARTITION BY RANGE ("timestamp")' if partitioned else ""
+    op.execute(f"CREATE TABLE predictions (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){suffix}")
+    pk = '(id, "timestamp")' if partitioned else "(id)"
+    op.execute(f"ALTER TABLE predictions ADD CONSTRAINT predictions_pkey PRIMARY KEY {pk}")
+    op.execute("ALTER TABLE predictions ADD FOREIGN KEY (model_id) REFERENCES models (id)")
+    op.execute("ALTER TABLE predictions ADD FOREIGN KEY (team_id) REFERENCES teams (id)")
+
+    if partitioned:
+        oldest = op.get_bind().execute(sa.text(
+            f"SELECT date_trunc('month', min(\"timestamp\") AT TIME ZONE 'UTC')::date FROM {old}"
+        )).scalar()
+        this_month = datetime.now(timezone.utc).date().replace(day=1)
+        month = min(oldest or this_month, this_month)
+        while month <= _add_months(this_month, MONTHS_AHEAD):
+            nxt = _add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE predictions_y{month:%Y}m{month:%m} PARTITION OF predictions "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{nxt:%Y-%m-%d} 00:00:00+00')"
+            )
+            month = nxt
+        op.execute("CREATE TABLE predictions_default PARTITION OF predictions DEFAULT")
+
+    op.execute(f"INSERT INTO predictions SELECT * FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+    _create_indexes()
+
+
+def upgrade() -> None:
+    """Upgrade schema: monthly range partitions on predictions.timestamp."""
+    op.execute("ALTER TABLE predictions RENAME TO predictions_unpartitioned")
+    op.execute("ALTER TABLE predictions_unpartitioned RENAME CONSTRAINT predictions_pkey TO predictions_unpartitioned_pkey")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    _recreate_from("predictions_unpartitioned", partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema: back to a single unpartitioned predictions table."""
+    op.execute("ALTER TABLE predictions RENAME TO predictions_partitioned")
+    op.execute("ALTER TABLE predictions_partitioned RENAME CONSTRAINT predictions_pkey TO predictions_partitioned_pkey")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    # Dropping the parent below drops every partition with it
+    _recreate_from("predictions_partitioned", partitioned=False)
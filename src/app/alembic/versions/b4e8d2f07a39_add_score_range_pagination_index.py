@@ -0,0 +1,55 @@
+"""add score range pagination index
+
+Revision ID: b4e8d2f07a39
+Revises: a7c3e9f15d48
+Create Date: 2026-10-18 16:20:31.518204
+
+The score-range variant of the keyset pagination indexes for GET
+/predictions: ``(team_id, risk_score, timestamp DESC, id DESC)``.  A range
+on `risk_score` cannot also deliver rows in timestamp order, so this does
+not replace walking ``ix_predictions_team_ts_id``; it gives the planner
+the cheap plan for selective ranges (read only the rows in range, then a
+top-N sort), where filtering the timestamp walk would visit most of the
+table before finding a page.
+
+`predictions` is partitioned, and a partitioned index cannot be built
+CONCURRENTLY, so the parent index is created empty (ON ONLY) and each
+partition's index is built concurrently and attached; writes are never
+blocked.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8d2f07a39'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e9f15d48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+NAME = "ix_predictions_team_score_ts_id"
+COLUMNS = "(team_id, risk_score, timestamp DESC, id DESC)"
+
+
+def upgrade() -> None:
+    """Upgrade schema: keyset pagination index for the score range filter."""
+    op.execute(f"CREATE INDEX IF NOT EXISTS {NAME} ON ONLY predictions {COLUMNS}")
+    partitions = op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'predictions'::regclass ORDER BY c.relname"
+    )).scalars().all()
+    # CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            child = f"{partition}_team_score_ts_id"
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {COLUMNS}")
+            op.execute(f"ALTER INDEX {NAME} ATTACH PARTITION {child}")
+
+
+def downgrade() -> None:
+    """Downgrade schema: drop the score range pagination index."""
+    # Dropping the parent index drops every partition's index with it
+    op.execute(f"DROP INDEX IF EXISTS {NAME}")
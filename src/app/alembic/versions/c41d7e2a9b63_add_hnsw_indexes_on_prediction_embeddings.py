@@ -0,0 +1,51 @@
+"""add hnsw indexes on prediction embeddings
+
+Revision ID: c41d7e2a9b63
+Revises: 3579aec49ee1
+Create Date: 2026-10-18 10:12:04.318842
+
+pgvector's HNSW index supports at most 2000 dimensions for `vector` but
+4000 for `halfvec`, so the 2944-d column is indexed through a
+`embedding::halfvec(2944)` expression (requires pgvector >= 0.7.0).
+Queries must order by the same expression to use these indexes; see
+`app/crud/predictions_help.py`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e2a9b63'
+down_revision: Union[str, Sequence[str], None] = '3579aec49ee1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = {
+    "ix_predictions_embedding_hnsw_l2": "halfvec_l2_ops",
+    "ix_predictions_embedding_hnsw_cosine": "halfvec_cosine_ops",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema: expression HNSW indexes for L2 and cosine search."""
+    # halfvec and its HNSW opclasses arrived in pgvector 0.7.0
+    op.execute("ALTER EXTENSION vector UPDATE")
+
+    # CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, opclass in INDEXES.items():
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON predictions "
+                f"USING hnsw ((embedding::halfvec(2944)) {opclass}) "
+                "WITH (m = 16, ef_construction = 64)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema: drop the HNSW indexes."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,43 @@
+"""add keyset pagination indexes
+
+Revision ID: d8e2f4a61c07
+Revises: c41d7e2a9b63
+Create Date: 2026-10-18 11:02:47.905113
+
+Composite B-tree indexes matching the `(timestamp, id)` descending order
+of GET /predictions, so a cursor page is an index range scan whatever its
+depth.  The score range variant is added by b4e8d2f07a39.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e2f4a61c07'
+down_revision: Union[str, Sequence[str], None] = 'c41d7e2a9b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = {
+    "ix_predictions_team_ts_id": "team_id, timestamp DESC, id DESC",
+    "ix_predictions_team_model_ts_id": "team_id, model_id, timestamp DESC, id DESC",
+    "ix_predictions_team_level_ts_id": "team_id, risk_level, timestamp DESC, id DESC",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema: composite indexes for keyset pagination."""
+    # CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON predictions ({columns})")
+
+
+def downgrade() -> None:
+    """Downgrade schema: drop the keyset pagination indexes."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
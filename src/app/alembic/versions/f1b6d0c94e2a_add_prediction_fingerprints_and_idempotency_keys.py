@@ -0,0 +1,53 @@
+"""add prediction fingerprints and idempotency keys
+
+Revision ID: f1b6d0c94e2a
+Revises: d8e2f4a61c07
+Create Date: 2026-10-18 13:41:52.117063
+
+`prediction_fingerprints` is a separate table (rather than a unique
+column on `predictions`) so its primary key stays a plain unique index
+whatever happens to the layout of `predictions`; `prediction_id` is
+therefore not a foreign key.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b6d0c94e2a'
+down_revision: Union[str, Sequence[str], None] = 'd8e2f4a61c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema: content-address and idempotency-key tables."""
+    op.create_table(
+        "prediction_fingerprints",
+        sa.Column("team_id", sa.UUID(), sa.ForeignKey("teams.id"), nullable=False),
+        sa.Column("fingerprint", sa.LargeBinary(length=32), nullable=False),
+        sa.Column("model_id", sa.UUID(), sa.ForeignKey("models.id"), nullable=False),
+        sa.Column("prediction_id", sa.UUID(), nullable=False),
+        sa.Column("risk_score", sa.Float(), nullable=False),
+        sa.Column("risk_level", sa.SmallInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("team_id", "fingerprint"),
+    )
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("team_id", sa.UUID(), sa.ForeignKey("teams.id"), nullable=False),
+        sa.Column("key", sa.Text(), nullable=False),
+        sa.Column("request_hash", sa.LargeBinary(length=32), nullable=False),
+        sa.Column("response_json", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("team_id", "key"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema: drop the content-address and idempotency-key tables."""
+    op.drop_table("idempotency_keys")
+    op.drop_table("prediction_fingerprints")
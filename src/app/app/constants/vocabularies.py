@@ -0,0 +1,22 @@
+"""Closed vocabularies for text columns whose values come from a fixed set.
+
+Used by `app/scripts/build_vocab_tables.py` to precompute embedding tables;
+values outside these lists are still encoded live at request time.
+"""
+
+US_STATES = [
+    "AK", "AL", "AR", "AZ", "CA", "CO", "CT", "DC", "DE", "FL", "GA", "HI", "IA",
+    "ID", "IL", "IN", "KS", "KY", "LA", "MA", "MD", "ME", "MI", "MN", "MO", "MS",
+    "MT", "NC", "ND", "NE", "NH", "NJ", "NM", "NV", "NY", "OH", "OK", "OR", "PA",
+    "RI", "SC", "SD", "TN", "TX", "UT", "VA", "VT", "WA", "WI", "WV", "WY",
+]
+
+SUB_GRADES = [f"{grade}{step}" for grade in "ABCDEFG" for step in range(1, 6)]
+
+EMP_LENGTHS = ["< 1 year", "1 year"] + [f"{n} years" for n in range(2, 10)] + ["10+ years"]
+
+CLOSED_VOCABULARIES = {
+    "addr_state": US_STATES,
+    "sub_grade": SUB_GRADES,
+    "emp_length": EMP_LENGTHS,
+}
@@ -0,0 +1,101 @@
+"""app/crud/dedup.py
+Async helper functions for the `prediction_fingerprints` and
+`idempotency_keys` tables.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession  # type: ignore[import-not-found]
+
+from app.models_db import IdempotencyKey, PredictionFingerprint
+from app.crud.predictions_help import DEFAULT_TEAM_ID
+
+__all__ = ["get_fingerprints", "insert_fingerprints", "get_idempotency_key", "insert_idempotency_key"]
+
+# Get fingerprints
+async def get_fingerprints(
+    session: AsyncSession,
+    fingerprints: Sequence[bytes],
+    team_id: UUID = DEFAULT_TEAM_ID,
+) -> Dict[bytes, Any]:
+    """Fetch stored results for `fingerprints`.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        Active SQLAlchemy async session.
+    fingerprints : Sequence[bytes]
+        sha256 digests from `payload_fingerprint`.
+    team_id : UUID, optional
+        Team the payloads belong to.
+
+    Returns
+    -------
+    dict[bytes, Row]
+        Rows with `prediction_id`, `risk_score` and `risk_level`, keyed by
+        fingerprint; unknown fingerprints are absent.
+    """
+    if not fingerprints:
+        return {}
+    stmt = select(
+        PredictionFingerprint.fingerprint,
+        PredictionFingerprint.prediction_id,
+        PredictionFingerprint.risk_score,
+        PredictionFingerprint.risk_level,
+    ).where(
+        PredictionFingerprint.team_id == team_id,
+        PredictionFingerprint.fingerprint.in_(list(fingerprints)),
+    )
+    result = await session.execute(stmt)
+    return {row.fingerprint: row for row in result.all()}
+
+# Insert fingerprints
+async def insert_fingerprints(
+    session: AsyncSession,
+    rows: Sequence[Dict[str, Any]],
+) -> None:
+    """Insert fingerprint rows, keeping the existing row on conflict.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        Active SQLAlchemy async session.
+    rows : Sequence[dict]
+        Values for `team_id`, `fingerprint`, `model_id`, `prediction_id`,
+        `risk_score` and `risk_level`.
+    """
+    if not rows:
+        return
+    stmt = pg_insert(PredictionFingerprint).on_conflict_do_nothing(
+        index_elements=[PredictionFingerprint.team_id, PredictionFingerprint.fingerprint])
+    await session.execute(stmt, list(rows))
+
+# Get idempotency key
+async def get_idempotency_key(
+    session: AsyncSession,
+    key: str,
+    team_id: UUID = DEFAULT_TEAM_ID,
+) -> Optional[IdempotencyKey]:
+    """Fetch the stored response for an `Idempotency-Key`, or None."""
+    stmt = select(IdempotencyKey).where(IdempotencyKey.team_id == team_id, IdempotencyKey.key == key)
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+# Insert idempotency key
+async def insert_idempotency_key(
+    session: AsyncSession,
+    key: str,
+    request_hash: bytes,
+    response_json: List[Dict[str, Any]],
+    team_id: UUID = DEFAULT_TEAM_ID,
+) -> None:
+    """Store the response for `key`; a concurrent first write wins."""
+    stmt = pg_insert(IdempotencyKey).values(
+        team_id=team_id, key=key, request_hash=request_hash, response_json=response_json,
+    ).on_conflict_do_nothing(index_elements=[IdempotencyKey.team_id, IdempotencyKey.key])
+    await session.execute(stmt)
@@ -15,10 +15,10 @@ from app.models_db import Model
 
 async def get_or_create_model(session: AsyncSession, *, name: str, version: str) -> UUID:
     
-    stmt = sa.select(Model).where(Model.name == name, Model.version == version)
-    model = await session.scalar(stmt)
-    if model:
-        return cast(UUID, model.id)
+    stmt = sa.select(Model.id).where(Model.name == name, Model.version == version)
+    model_id = await session.scalar(stmt)
+    if model_id:
+        return cast(UUID, model_id)
 
     new = Model(id=uuid4(), name=name, version=version)
     session.add(new)
@@ -4,25 +4,35 @@ Async helper functions for interacting with the `predictions` table.
 
 from __future__ import annotations
 
+import base64
+import json
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, cast
+from typing import Any, Dict, Optional, Sequence, cast
 from uuid import UUID, uuid4
-from sqlalchemy import select, update, func, Float, type_coerce
+from sqlalchemy import select, update, func, text, literal, tuple_, Float, type_coerce
+from sqlalchemy import cast as sa_cast
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession  # type: ignore[import-not-found]
+import numpy as np  # type: ignore[import-not-found]
 
 
 from app.models_db import Prediction
+from app.vector_codec import HalfVector, NumpyVector
 from app.schemas import RecordListQuery
 
-__all__ = ["create_prediction", "get_prediction", "add_explanation", "predictions_list", "get_nearest_neighbors"]
+__all__ = ["create_prediction", "create_predictions_bulk", "build_prediction_rows", "insert_prediction_rows", "get_prediction", "get_prediction_record", "add_explanation", "predictions_list", "encode_cursor", "decode_cursor", "get_nearest_neighbors_euclidean", "get_nearest_neighbors_cosine", "distinct_feature_values", "embedding_column_types"]
 DEFAULT_TEAM_ID = UUID('00000000-0000-0000-0000-000000000001')
+# Dimension of `predictions.embedding` and of its halfvec HNSW indexes
+EMBEDDING_DIM = 2944
+# Tables with an `embedding` column stored as EMBEDDING_STORAGE selects
+EMBEDDING_TABLES = ("predictions", "training_samples")
 
 # Create prediction
 async def create_prediction(
     session: AsyncSession,
     *,
     model_id: UUID,
-    embedding: list[float],
+    embedding: np.ndarray,
     risk_score: float,
     risk_level: int,
     features_json: Dict[str, Any],
@@ -37,8 +47,9 @@ async def create_prediction(
         SQLAlchemy session provided by FastAPI dependency.
     model_id : UUID
         Foreign-key reference to the `models` table.
-    embedding : list[float]
-        Flattened embedding vector (length must match column dimension).
+    embedding : np.ndarray
+        Flattened float32 embedding vector (length must match column dimension);
+        sent to Postgres in pgvector's binary format.
     risk_score : float
         Raw probability produced by the model.
     risk_level : int
@@ -68,6 +79,113 @@ async def create_prediction(
     await session.flush()
     return cast(UUID, pred.id)
 
+# Build rows for bulk insertion
+def build_prediction_rows(
+    *,
+    model_id: UUID,
+    embeddings: np.ndarray,
+    risk_scores: Sequence[float],
+    risk_levels: Sequence[int],
+    features_json: Sequence[Dict[str, Any]],
+    team_id: UUID = DEFAULT_TEAM_ID,
+) -> list[dict[str, Any]]:
+    """Build `predictions` rows with client-side ids and a shared timestamp.
+
+    Parameters are as for `create_predictions_bulk`; the rows can be passed
+    to `insert_prediction_rows` now or later (write-behind).
+    """
+    n = len(features_json)
+    if not (len(embeddings) == len(risk_scores) == len(risk_levels) == n):
+        raise ValueError("Bulk insert inputs must all have the same length")
+
+    timestamp = datetime.now(timezone.utc)
+    return [
+        {
+            "id": uuid4(),
+            "model_id": model_id,
+            "timestamp": timestamp,
+            "features_json": features_json[i],
+            "embedding": embeddings[i],
+            "risk_score": float(risk_scores[i]),
+            "risk_level": int(risk_levels[i]),
+            "explanation_json": None,
+            "team_id": team_id,
+        }
+        for i in range(n)
+    ]
+
+# Insert prebuilt rows
+async def insert_prediction_rows(
+    session: AsyncSession,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    skip_existing: bool = False,
+) -> None:
+    """Insert rows from `build_prediction_rows` with one multi-row INSERT.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        Active SQLAlchemy async session.
+    rows : Sequence[dict]
+        Column values per row, ids included.
+    skip_existing : bool, optional
+        Ignore rows whose (id, timestamp) key is already stored (ON CONFLICT
+        DO NOTHING), so replaying rows that may have been written before is
+        safe.
+    """
+    if not rows:
+        return
+    stmt = pg_insert(Prediction)
+    if skip_existing:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Prediction.id, Prediction.timestamp])
+    # executemany of a single INSERT; SQLAlchemy batches it into multi-row VALUES
+    await session.execute(stmt, list(rows))
+
+# Create many predictions in one statement
+async def create_predictions_bulk(
+    session: AsyncSession,
+    *,
+    model_id: UUID,
+    embeddings: np.ndarray,
+    risk_scores: Sequence[float],
+    risk_levels: Sequence[int],
+    features_json: Sequence[Dict[str, Any]],
+    team_id: UUID = DEFAULT_TEAM_ID,
+) -> list[UUID]:
+    """Persist a batch of prediction rows with one multi-row INSERT.
+
+    IDs are generated client-side, so they are returned in input order
+    without a RETURNING round trip.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        SQLAlchemy session provided by FastAPI dependency.
+    model_id : UUID
+        Foreign-key reference to the `models` table.
+    embeddings : np.ndarray
+        Float32 matrix with one flattened embedding per row.
+    risk_scores : Sequence[float]
+        Raw probability per row.
+    risk_levels : Sequence[int]
+        Category code per row.
+    features_json : Sequence[dict]
+        Original input features payload per row.
+    team_id : UUID, optional
+        Foreign-key reference to the `teams` table.
+    """
+    rows = build_prediction_rows(
+        model_id=model_id,
+        embeddings=embeddings,
+        risk_scores=risk_scores,
+        risk_levels=risk_levels,
+        features_json=features_json,
+        team_id=team_id,
+    )
+    await insert_prediction_rows(session, rows)
+    return [row["id"] for row in rows]
+
 # Get prediction
 async def get_prediction(
     session: AsyncSession,
@@ -109,21 +227,102 @@ async def add_explanation(
         raise ValueError("Prediction Not Found") # Will be a 404 error
 
 
+# Column projection for read endpoints
+def _record_columns(include_embedding: bool) -> list:
+    """Prediction columns returned by the read endpoints.
+
+    Selecting columns rather than the ORM entity skips the relationship
+    loaders, and dropping `embedding` keeps the 2944-float vector from
+    ever leaving Postgres.
+    """
+    return [
+        getattr(Prediction, col.key)
+        for col in Prediction.__table__.columns
+        if include_embedding or col.key != "embedding"
+    ]
+
+# Get prediction record
+async def get_prediction_record(
+    session: AsyncSession,
+    pred_id: UUID,
+    *,
+    include_embedding: bool = True,
+) -> Any | None:
+    """Fetch one prediction as a column row, optionally without its embedding.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        Active SQLAlchemy async session.
+    pred_id : UUID
+        Primary key of the desired prediction row.
+    include_embedding : bool, optional
+        Whether to fetch the `embedding` column.
+
+    Returns
+    -------
+    Row | None
+        Row with one attribute per selected column, or None if not found.
+    """
+    stmt = select(*_record_columns(include_embedding)).where(Prediction.id == pred_id)
+    result = await session.execute(stmt)
+    return result.one_or_none()
+
+# Time window filter (partition pruning)
+def _time_window(stmt, since: Optional[datetime], until: Optional[datetime]):
+    """Restrict `stmt` to ``since <= timestamp < until`` (either bound optional)."""
+    if since is not None:
+        stmt = stmt.where(Prediction.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(Prediction.timestamp < until)
+    return stmt
+
+# Keyset cursor for listing
+def encode_cursor(timestamp: datetime, pred_id: UUID) -> str:
+    """Opaque cursor pointing just past the row `(timestamp, pred_id)`."""
+    raw = json.dumps({"t": timestamp.isoformat(), "id": str(pred_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of `encode_cursor`; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), UUID(data["id"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
 # List predictions
 async def predictions_list(
     session: AsyncSession, 
     query: RecordListQuery
-) -> list[Prediction]:
+) -> tuple[list[Any], Optional[str]]:
     """Fetch a page of predictions from the database.
 
+    Rows are ordered by ``(timestamp, id)`` descending. With `query.cursor`
+    the page starts right after the cursor row (keyset pagination, served
+    by the composite ``(team_id, [filter,] timestamp DESC, id DESC)``
+    indexes; ``(team_id, risk_score, ...)`` covers selective score
+    ranges), so deep pages cost the same as the first one and concurrent
+    inserts do not shift them. Without a cursor, `query.page` is applied
+    as an OFFSET for backward compatibility.
+
     Parameters
     ----------
     session : AsyncSession
         Active SQLAlchemy async session.
     query : RecordListQuery
-        Query parameters for filtering and pagination.
+        Query parameters for filtering and pagination. The embedding column
+        is only selected when `query.include_embedding` is set.
+
+    Returns
+    -------
+    tuple[list[Row], str | None]
+        Rows with one attribute per selected column, and the cursor of the
+        next page (None on the last page).
     """
-    stmt = select(Prediction).where(Prediction.team_id == DEFAULT_TEAM_ID)
+    stmt = select(*_record_columns(query.include_embedding)).where(Prediction.team_id == DEFAULT_TEAM_ID)
     
     if query.mdl_id:
         stmt = stmt.where(Prediction.model_id == query.mdl_id)
@@ -133,84 +332,204 @@ async def predictions_list(
         stmt = stmt.where(Prediction.risk_score >= query.score_min)
     if query.score_max is not None:
         stmt = stmt.where(Prediction.risk_score <= query.score_max)
+    # Time bounds let Postgres skip whole monthly partitions
+    stmt = _time_window(stmt, query.since, query.until)
+
+    stmt = stmt.order_by(Prediction.timestamp.desc(), Prediction.id.desc())
+    if query.cursor:
+        after_ts, after_id = decode_cursor(query.cursor)
+        stmt = stmt.where(tuple_(Prediction.timestamp, Prediction.id) < tuple_(after_ts, after_id))
+    else:
+        stmt = stmt.offset((query.page - 1) * query.page_size)
+
+    # One extra row tells whether another page exists
+    rows = (await session.execute(stmt.limit(query.page_size + 1))).all()
+    if len(rows) <= query.page_size:
+        return rows, None
+    rows = rows[:query.page_size]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+# Nearest-neighbour search shared by both metrics
+async def _nearest_neighbors(
+    session: AsyncSession,
+    embedding: np.ndarray,
+    k: int,
+    anchor_id: UUID,
+    operator: str,
+    *,
+    exact: bool,
+    ef_search: Optional[int],
+    rerank_factor: int,
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> list[dict[str, Any]]:
+    """Order predictions by `operator` distance to `embedding`.
 
-    stmt = stmt.order_by(Prediction.timestamp.desc()) \
-        .offset((query.page - 1) * query.page_size) \
-        .limit(query.page_size)
-    rows = await session.execute(stmt)
-    return rows.scalars().all()
+    Exact mode scans the table at full precision. ANN mode first asks the
+    HNSW index over ``embedding::halfvec`` for ``k * rerank_factor``
+    candidates and then re-ranks only those by the exact float32 distance,
+    so returned distances are unaffected by the half-precision index.
+    `since` / `until` limit the search to the partitions in that window.
+    """
+    exact_dist = type_coerce(Prediction.embedding.op(operator)(embedding), Float).label('dist_metric')
+    stmt = _time_window(
+        select(Prediction.id, Prediction.risk_level, Prediction.risk_score, exact_dist)
+        .where(Prediction.team_id == DEFAULT_TEAM_ID, Prediction.id != anchor_id),
+        since, until,
+    )
+
+    if not exact:
+        n_candidates = k * max(int(rerank_factor), 1)
+        # HNSW returns at most ef_search rows, so never ask for fewer candidates
+        ef = max(int(ef_search or 0), n_candidates)
+        # SET LOCAL lasts until the request's transaction ends
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {ef}"))
+
+        # Must match the indexed expression for the planner to use the index;
+        # the query vector is cast via `vector` so it still binds as float32
+        query = sa_cast(sa_cast(literal(embedding, NumpyVector(EMBEDDING_DIM)), NumpyVector(EMBEDDING_DIM)),
+                        HalfVector(EMBEDDING_DIM))
+        ann_dist = sa_cast(Prediction.embedding, HalfVector(EMBEDDING_DIM)).op(operator)(query)
+        candidates = (
+            _time_window(
+                select(Prediction.id)
+                .where(Prediction.team_id == DEFAULT_TEAM_ID, Prediction.id != anchor_id),
+                since, until,
+            )
+            .order_by(ann_dist)
+            .limit(n_candidates)
+        )
+        stmt = stmt.where(Prediction.id.in_(candidates))
+
+    stmt = stmt.order_by('dist_metric').limit(k)
+    result = await session.execute(stmt)
+    return [
+        {"id": r.id, "risk_level": r.risk_level, "risk_score": r.risk_score, "dist_metric": r.dist_metric}
+        for r in result.all()
+    ]
 
 # Get nearest neighbors
 async def get_nearest_neighbors_euclidean(
     session: AsyncSession,
-    embedding: list[float],
+    embedding: np.ndarray,
     k: int,
     anchor_id: UUID,
-) -> list[Prediction]:
+    *,
+    exact: bool = True,
+    ef_search: Optional[int] = None,
+    rerank_factor: int = 4,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list[dict[str, Any]]:
     """Fetch a list of nearest neighbors order by smallest to largest euclidean-distance.
 
     Parameters
     ----------
     session : AsyncSession
         Active SQLAlchemy async session.
-    embedding : list[float]
-        Flattened embedding vector (length must match column dimension).
+    embedding : np.ndarray
+        Flattened float32 embedding vector (length must match column dimension).
     k : int
         Number of nearest neighbors to return.
+    anchor_id : UUID
+        Prediction the neighbours are computed for; excluded from the result.
+    exact : bool, optional
+        Full table scan when True, HNSW candidates plus exact re-rank otherwise.
+    ef_search : int | None, optional
+        `hnsw.ef_search` for the ANN query (raised to the candidate count if lower).
+    rerank_factor : int, optional
+        ANN candidates fetched per requested neighbour.
+    since, until : datetime | None, optional
+        Only consider predictions with ``since <= timestamp < until``.
     """
-
-    stmt = (
-    select(
-        Prediction.id,
-        Prediction.risk_level,
-        Prediction.risk_score,
-            type_coerce(Prediction.embedding.op('<->')(embedding), Float).label('dist_metric')
-    )
-    .where(Prediction.team_id == DEFAULT_TEAM_ID, Prediction.id != anchor_id)
-    .order_by('dist_metric')
-    .limit(k)
-    )
-    
-    result = await session.execute(stmt)
-    return [
-        {"id": r.id, "risk_level": r.risk_level, "risk_score": r.risk_score, "dist_metric": r.dist_metric}
-        for r in result.all()
-    ]
+    return await _nearest_neighbors(session, embedding, k, anchor_id, '<->',
+                                    exact=exact, ef_search=ef_search, rerank_factor=rerank_factor,
+                                    since=since, until=until)
 
 
 # Get nearest neighbors
 async def get_nearest_neighbors_cosine(
     session: AsyncSession,
-    embedding: list[float],
+    embedding: np.ndarray,
     k: int,
     anchor_id: UUID,
-) -> list[Prediction]:
+    *,
+    exact: bool = True,
+    ef_search: Optional[int] = None,
+    rerank_factor: int = 4,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list[dict[str, Any]]:
     """Fetch a list of nearest neighbors order by smallest to largest cosine-distance.
 
     Parameters
     ----------
     session : AsyncSession
         Active SQLAlchemy async session.
-    embedding : list[float]
-        Flattened embedding vector (length must match column dimension).
+    embedding : np.ndarray
+        Flattened float32 embedding vector (length must match column dimension).
     k : int
         Number of nearest neighbors to return.
+    anchor_id : UUID
+        Prediction the neighbours are computed for; excluded from the result.
+    exact : bool, optional
+        Full table scan when True, HNSW candidates plus exact re-rank otherwise.
+    ef_search : int | None, optional
+        `hnsw.ef_search` for the ANN query (raised to the candidate count if lower).
+    rerank_factor : int, optional
+        ANN candidates fetched per requested neighbour.
+    since, until : datetime | None, optional
+        Only consider predictions with ``since <= timestamp < until``.
     """
+    return await _nearest_neighbors(session, embedding, k, anchor_id, '<=>',
+                                    exact=exact, ef_search=ef_search, rerank_factor=rerank_factor,
+                                    since=since, until=until)
 
-    stmt = (
-    select(
-        Prediction.id,
-        Prediction.risk_level,
-        Prediction.risk_score,
-            type_coerce(Prediction.embedding.op('<=>')(embedding), Float).label('dist_metric')
-    )
-    .where(Prediction.team_id == DEFAULT_TEAM_ID, Prediction.id != anchor_id)
-    .order_by('dist_metric')
-    .limit(k)
-    )
-    
-    result = await session.execute(stmt)
-    return [
-        {"id": r.id, "risk_level": r.risk_level, "risk_score": r.risk_score, "dist_metric": r.dist_metric}
-        for r in result.all()
-    ]
+
+# Distinct feature values (embedding-cache prewarming)
+async def distinct_feature_values(
+    session: AsyncSession,
+    columns: list[str],
+    *,
+    model_id: UUID,
+    limit: int,
+) -> dict[str, list[str]]:
+    """Fetch up to `limit` distinct stored values per feature column.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        Active SQLAlchemy async session.
+    columns : list[str]
+        Keys of `features_json` to collect values for.
+    model_id : UUID
+        Only rows scored by this model are considered.
+    limit : int
+        Maximum number of distinct values returned per column.
+    """
+    values: dict[str, list[str]] = {}
+    for col in columns:
+        value = Prediction.features_json[col].astext
+        stmt = (
+            select(value)
+            .where(Prediction.model_id == model_id, value.is_not(None))
+            .distinct()
+            .limit(limit)
+        )
+        result = await session.execute(stmt)
+        values[col] = list(result.scalars().all())
+    return values
+
+
+async def embedding_column_types(session) -> Dict[str, str]:
+    """Type name ('vector' or 'halfvec') of the `embedding` column of each
+    existing `EMBEDDING_TABLES` table; `session` may also be a connection."""
+    found = {}
+    for table in EMBEDDING_TABLES:
+        typname = (await session.execute(text(
+            "SELECT t.typname FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid "
+            "WHERE a.attrelid = to_regclass(:table) AND a.attname = 'embedding'"
+        ), {"table": table})).scalar_one_or_none()
+        if typname is not None:
+            found[table] = typname
+    return found
@@ -17,8 +17,11 @@ from __future__ import annotations
 import os
 from typing import AsyncIterator
 
+from sqlalchemy import event  # type: ignore
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # type: ignore
 
+from app.vector_codec import register_vector_codecs
+
 # DB connection
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
@@ -28,6 +31,13 @@ DATABASE_URL = os.getenv(
 # SQL-Alchemy boilerplate
 # Engine to manage database connections
 engine = create_async_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _register_vector_codecs(dbapi_connection, connection_record) -> None:
+    """Send / receive pgvector values in binary float32 on every new connection."""
+    dbapi_connection.run_async(register_vector_codecs)
+
 # Factory that creates individual sessions
 async_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -45,4 +55,4 @@ async def async_session() -> AsyncIterator[AsyncSession]:
         await session.rollback()
         raise
     finally:
-        await session.close()
\ No newline at end of file
+        await session.close()
@@ -10,6 +10,7 @@ echo "postgres:5432 - accepting connections"
 
 echo "Postgres is up – running migrations"
 alembic -c /app/alembic.ini upgrade head     # uses DATABASE_URL
+python -m app.scripts.manage_partitions ensure
 
 echo "Starting API ..."
 exec uvicorn app.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -4,4 +4,8 @@ class EmbeddingError(Exception):
 
 class InferenceError(Exception):
     """Raised when model forward pass fails."""
-    pass
\ No newline at end of file
+    pass
+
+class ServiceOverloadedError(Exception):
+    """Raised when the inference executor queue is full and new work is rejected."""
+    pass
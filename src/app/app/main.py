@@ -10,12 +10,14 @@ import logging
 # FastAPI
 from fastapi import FastAPI, Request # type: ignore[import-not-found]
 from fastapi.responses import JSONResponse # type: ignore[import-not-found]
-from app.errors import EmbeddingError, InferenceError
+from app.errors import EmbeddingError, InferenceError, ServiceOverloadedError
 from app.service_loader import ServiceLoader
 from pathlib import Path
 from app.logging.logging_config import setup_logging
 from app.crud.models import get_or_create_model
+from app.crud.predictions_help import distinct_feature_values, embedding_column_types
 from app.db import async_factory
+from app.vector_codec import EMBEDDING_STORAGE
 
 
 
@@ -35,6 +37,10 @@ async def embedding_error_handler(request: Request, exc: EmbeddingError):
 async def inference_error_handler(request: Request, exc: InferenceError):
     return JSONResponse(status_code=500, content={"detail": str(exc)})
 
+@app.exception_handler(ServiceOverloadedError)
+async def overloaded_error_handler(request: Request, exc: ServiceOverloadedError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Lazy-load heavy ML components at application startup instead of import time.
 HERE = Path(__file__).parent
 CONFIG_PATH = HERE.parent / "config.yaml"
@@ -52,6 +58,14 @@ async def startup_event() -> None:
 
     # Persist or fetch model metadata and cache its UUID
     async with async_factory() as s:
+        # Embeddings are bound as EMBEDDING_STORAGE's type; refuse to run against the other
+        mismatched = {t: typ for t, typ in (await embedding_column_types(s)).items() if typ != EMBEDDING_STORAGE}
+        if mismatched:
+            raise RuntimeError(
+                f"EMBEDDING_STORAGE={EMBEDDING_STORAGE} but the embedding columns are {mismatched}; "
+                f"set EMBEDDING_STORAGE to match or run "
+                f"'python -m app.scripts.convert_embedding_storage {EMBEDDING_STORAGE}'")
+
         mdl_id = await get_or_create_model(
             s,
             name=loader.cfg.active_model,
@@ -59,18 +73,49 @@ async def startup_event() -> None:
         )
         loader.model_id = mdl_id  # type: ignore[attr-defined]
 
+        # Collect values to prewarm the text-embedding cache with
+        prewarm_values = loader.prewarm_vocab()
+        cache_cfg = loader.cfg.service.get("embedding_cache") or {}
+        if loader.embedding_manager.cache is not None and cache_cfg.get("prewarm_from_db", False):
+            db_values = await distinct_feature_values(
+                s,
+                loader.embedding_manager.text_cols,
+                model_id=mdl_id,
+                limit=cache_cfg.get("prewarm_db_limit", 1000),
+            )
+            for col, values in db_values.items():
+                prewarm_values[col] = list(prewarm_values.get(col, [])) + values
+
+    if prewarm_values:
+        n = await loader.executor.run(loader.embedding_manager.prewarm, prewarm_values)
+        logger.info("Prewarmed embedding cache with %d values", n)
+
+    # Start merging concurrent /predict calls into micro-batches
+    await loader.batcher.start()
+
+    # Replay spooled predictions from earlier runs, then persist in the background
+    if loader.write_behind is not None:
+        await loader.write_behind.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
     """Release resources on shutdown (placeholder for future GPU / file clean-up)."""
     logger.info("Shutting down...")
     global loader
+    if loader is not None and loader.batcher is not None:
+        await loader.batcher.stop()
+    if loader is not None and loader.write_behind is not None:
+        await loader.write_behind.stop()
+    if loader is not None and loader.executor is not None:
+        loader.executor.shutdown()
     loader = None
 
 # Import other routes
-from app.routes import predictions, metadata, explain, predict, health
+from app.routes import predictions, metadata, explain, predict, health, metrics
 app.include_router(predictions.router)
 app.include_router(metadata.router)
 app.include_router(explain.router)
 app.include_router(predict.router)
-app.include_router(health.router)
\ No newline at end of file
+app.include_router(health.router)
+app.include_router(metrics.router)
\ No newline at end of file
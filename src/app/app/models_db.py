@@ -6,8 +6,8 @@ import sqlalchemy # type: ignore
 from sqlalchemy.ext.asyncio import AsyncAttrs # type: ignore
 from sqlalchemy.dialects.postgresql import UUID, JSONB # type: ignore
 from sqlalchemy.orm import DeclarativeBase, relationship # type: ignore
-from pgvector.sqlalchemy import Vector # type: ignore
-from sqlalchemy import Column, DateTime, Text, func, Float, ForeignKey, SmallInteger # type: ignore
+from app.vector_codec import embedding_column_type
+from sqlalchemy import Column, DateTime, Text, func, Float, ForeignKey, SmallInteger, LargeBinary # type: ignore
 from uuid import uuid4
 
 
@@ -22,7 +22,9 @@ class Model(Base):
     version = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    predictions = relationship("Prediction", back_populates="model", lazy="selectin")
+    # Never loaded implicitly: a model can own millions of predictions. Use an
+    # explicit query (or selectinload) where the collection is really needed.
+    predictions = relationship("Prediction", back_populates="model", lazy="raise", passive_deletes=True)
 
 class Team(Base):
     """Logical ownership group for predictions.  Future authentication will
@@ -35,24 +37,29 @@ class Team(Base):
     name = Column(Text, nullable=False, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    predictions = relationship("Prediction", back_populates="team", lazy="selectin")
+    predictions = relationship("Prediction", back_populates="team", lazy="raise", passive_deletes=True)
 
 class Prediction(Base):
+    """Scored payload. Range-partitioned by month on `timestamp`, see the
+    partition_predictions_by_month migration and app/scripts/manage_partitions.py."""
     __tablename__ = "predictions"
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     model_id = Column(UUID(as_uuid=True), ForeignKey("models.id"), nullable=False)
-    timestamp = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Partition key (monthly RANGE partitions), hence part of the primary key
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
     features_json = Column(JSONB, nullable=False)
-    embedding = Column(Vector(dim=2944), nullable=False)
+    embedding = Column(embedding_column_type(2944), nullable=False)  # vector or halfvec, see EMBEDDING_STORAGE
     risk_score = Column(Float, nullable=False)
     risk_level = Column(SmallInteger, nullable=False)
     explanation_json = Column(JSONB, nullable=True)
     explained_at = Column(DateTime(timezone=True), nullable=True)
     team_id = Column(UUID(as_uuid=True), ForeignKey("teams.id"), nullable=False)
 
-    model = relationship("Model", back_populates="predictions", lazy="selectin")
-    team = relationship("Team", back_populates="predictions", lazy="selectin")
+    # model_id / team_id cover every current use; load the objects explicitly if needed
+    model = relationship("Model", back_populates="predictions", lazy="raise")
+    team = relationship("Team", back_populates="predictions", lazy="raise")
     
 # Index for fast filtering by risk level
 from sqlalchemy import Index  # type: ignore[import-not-found]  # placed at bottom to avoid circular import issues
@@ -60,10 +67,48 @@ from sqlalchemy import Index  # type: ignore[import-not-found]  # placed at bott
 # Plain B-tree index on the integer column
 Index("ix_predictions_risk_level", Prediction.risk_level)
 
+# Keyset pagination for GET /predictions: (timestamp, id) descending within a team,
+# optionally behind the equality filters RecordListQuery supports
+Index("ix_predictions_team_ts_id", Prediction.team_id, Prediction.timestamp.desc(), Prediction.id.desc())
+Index("ix_predictions_team_model_ts_id", Prediction.team_id, Prediction.model_id,
+      Prediction.timestamp.desc(), Prediction.id.desc())
+Index("ix_predictions_team_level_ts_id", Prediction.team_id, Prediction.risk_level,
+      Prediction.timestamp.desc(), Prediction.id.desc())
+Index("ix_predictions_team_score_ts_id", Prediction.team_id, Prediction.risk_score,
+      Prediction.timestamp.desc(), Prediction.id.desc())
+
 class TrainingSample(Base):
     __tablename__ = "training_samples"
 
     id           = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    embedding     = Column(Vector(dim=2944), nullable=False)
+    embedding     = Column(embedding_column_type(2944), nullable=False)
     label         = Column(SmallInteger, nullable=False)   # 0/1 default no default
-    created_at    = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at    = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class PredictionFingerprint(Base):
+    """Content address of a scored payload: sha256 of the model id and the
+    canonical `features_json`, with the result it produced. Repeated
+    payloads are answered from here instead of being re-embedded and stored
+    again. The scoring result is copied so lookups never touch `predictions`."""
+    __tablename__ = "prediction_fingerprints"
+
+    team_id       = Column(UUID(as_uuid=True), ForeignKey("teams.id"), primary_key=True)
+    fingerprint   = Column(LargeBinary(32), primary_key=True)
+    model_id      = Column(UUID(as_uuid=True), ForeignKey("models.id"), nullable=False)
+    prediction_id = Column(UUID(as_uuid=True), nullable=False)
+    risk_score    = Column(Float, nullable=False)
+    risk_level    = Column(SmallInteger, nullable=False)
+    created_at    = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IdempotencyKey(Base):
+    """Response stored under a client-supplied `Idempotency-Key` header so a
+    retried /predict or /predict/batch call returns the original records."""
+    __tablename__ = "idempotency_keys"
+
+    team_id       = Column(UUID(as_uuid=True), ForeignKey("teams.id"), primary_key=True)
+    key           = Column(Text, primary_key=True)
+    request_hash  = Column(LargeBinary(32), nullable=False)
+    response_json = Column(JSONB, nullable=False)
+    created_at    = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,30 @@
+# app/routes/metrics.py
+from fastapi import APIRouter, HTTPException
+
+from app import main  # access main.loader dynamically to avoid stale reference
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("", summary="Runtime service metrics", description="Return in-process counters, one section each for micro-batching (batch sizes, queue wait times), the inference executor, the embedding cache, vocabulary tables, the write-behind buffer and payload deduplication.")
+async def get_metrics():
+    if main.loader is None:
+        raise HTTPException(status_code=503, detail="Service initialising; please retry")
+    batcher = main.loader.batcher
+    executor = main.loader.executor
+    cache = main.loader.embedding_manager.cache
+    write_behind = main.loader.write_behind
+
+    return {"status": "ok",
+        "batching": {
+            "enabled": batcher.enabled,
+            "max_batch_size": batcher.max_batch_size,
+            "queue_depth": batcher.queue_depth,
+            **batcher.metrics.snapshot(),
+        },
+        "inference": executor.snapshot(),
+        "embedding_cache": {"enabled": False} if cache is None else {"enabled": True, **cache.snapshot()},
+        "vocab_tables": {col: len(table) for col, table in main.loader.embedding_manager.vocab_tables.items()},
+        "write_behind": {"enabled": False} if write_behind is None else {"enabled": True, **write_behind.snapshot()},
+        "dedup": main.loader.dedup.snapshot(),
+    }
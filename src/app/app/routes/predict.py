@@ -1,17 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import binascii
+import csv
+import json
+import logging
+import tempfile
+import time
+from collections import deque
+from functools import partial
+from typing import AsyncIterator, Iterator, Literal, Sequence, Union
+import anyio
+import numpy as np
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db import async_session
-from app.schemas import InputData, RiskResult, PredictionResponse, BatchPredictRequest
-from app.crud.predictions_help import create_prediction
-from app.errors import EmbeddingError, InferenceError
+from starlette.requests import ClientDisconnect
+from app.db import async_factory, async_session
+from app.schemas import InputData, PredictionResponse, BatchPredictRequest, EmbeddingScoreRequest, RiskResult
+from app.crud.predictions_help import build_prediction_rows, insert_prediction_rows
+from app.crud.dedup import get_idempotency_key, insert_idempotency_key
+from app.errors import EmbeddingError, InferenceError, ServiceOverloadedError
+from app.services.dedup import StoredResult, request_fingerprint
+from app.services.tabular import FeatureChunk, ResultWriter, TabularError, detect_format, read_chunks
 
 from app import main  # access main.loader dynamically to avoid stale reference
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/predict", tags=["predict"])
 
+IDEMPOTENCY_KEY_HEADER = Header(
+    default=None, alias="Idempotency-Key", max_length=255,
+    description="Retries with the same key and payload return the original records",
+)
+
 
 @router.post("", response_model = PredictionResponse)
-async def predict(input_data: InputData, session: AsyncSession = Depends(async_session)):
+async def predict(
+    input_data: InputData,
+    session: AsyncSession = Depends(async_session),
+    idempotency_key: Union[str, None] = IDEMPOTENCY_KEY_HEADER,
+):
     """Embed the raw features, run the model, and return a
     `PredictionResponse`."""
     if main.loader is None or main.loader.embedding_manager is None or main.loader.prediction_service is None:
@@ -21,105 +50,558 @@ async def predict(input_data: InputData, session: AsyncSession = Depends(async_s
     expected_features = len(main.loader.embedding_manager.feature_order)
     if len(input_data.features) != expected_features:
         raise HTTPException(status_code=400, detail=f"Expected {expected_features} features, got {len(input_data.features)}")
-    
-    # Embed & predict
-    try:
-        embedding = main.loader.embedding_manager.embed(input_data.features)
-        result: RiskResult = main.loader.prediction_service.predict(embedding)
-    except EmbeddingError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
-    except InferenceError as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
-
-    # Upload prediction to db
-    record_id = await create_prediction(
-        session,
-        model_id=main.loader.model_id,  # type: ignore[attr-defined]
-        embedding=embedding.flatten().tolist(),
-        risk_score=result.risk_score,
-        risk_level=result.risk_level,
-        features_json=input_data.features,
-        explanation_json=None,
-    )
 
-    # Combine DB ID with inference result
-    response = PredictionResponse(
-        record_id=record_id,
-        risk_level=result.risk_level,
-        risk_score=result.risk_score,
-        mdl_used=result.mdl_used,
-        version=result.version,
-    )
+    responses = await _predict_and_store(
+        session, main.loader, [input_data.features], _score_queued, "/predict", idempotency_key)
+    return responses[0]
 
-    return response
+async def _score_queued(loader: main.ServiceLoader, rows: list[dict], positions: list[int]):
+    """Embed & predict one row, merged with concurrent requests by the micro-batcher."""
+    embedding, result = await loader.batcher.submit(rows[0])
+    return embedding.reshape(1, -1), [result]
 
-# Helper function to process a single prediction
-async def _process_and_save_prediction(
-    input_data: InputData,
-    session: AsyncSession,
-    loader: main.ServiceLoader,
-) -> PredictionResponse:
-    """
-    Validates, embeds, predicts, and saves a single prediction record.
+async def _score_batch(loader: main.ServiceLoader, rows: list[dict], positions: list[int]):
+    """Embed all rows at once, then score them in one forward pass (off the event loop)."""
+    embeddings, scores, levels = await loader.executor.run(_embed_and_score, loader, rows)
+    return embeddings.reshape(len(embeddings), -1), loader.prediction_service.to_results(scores, levels)
+
+def _embed_and_score(loader: main.ServiceLoader, rows: list[dict]):
+    """Batched embed + forward pass; runs on the inference executor."""
+    embeddings = loader.embedding_manager.embed_many(rows)
+    scores, levels = loader.prediction_service.predict_batch(embeddings)
+    return embeddings, scores, levels
+
+async def _persist(session: AsyncSession, rows: list[dict]) -> None:
+    """Queue `rows` for write-behind when enabled, otherwise (or when its
+    buffer is full) insert them in the request's own transaction."""
+    writer = main.loader.write_behind
+    if writer is None or not await writer.enqueue(rows):
+        await insert_prediction_rows(session, rows)
+
+async def _predict_and_store(session: AsyncSession, loader: main.ServiceLoader, features: Sequence[dict],
+                             score, endpoint: str, idempotency_key: Union[str, None]) -> list[PredictionResponse]:
+    """Score and persist `features`, reusing earlier results where possible.
+
+    A known `Idempotency-Key` replays its stored response. With
+    `service.dedup` enabled, payloads seen before (same canonical features
+    and model) return their existing record; only the distinct new ones are
+    scored with `score(loader, rows, positions)`, `positions` being their
+    indices in `features`, and stored.
     """
-    # Feature count check
-    expected_features = len(loader.embedding_manager.feature_order)
-    if len(input_data.features) != expected_features:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Expected {expected_features} features, got {len(input_data.features)}"
-        )
+    dedup = loader.dedup
+    # Only dedup and idempotency keys need them; skipping them leaves lazy rows unbuilt
+    fingerprints = ([dedup.fingerprint(loader.model_id, f) for f in features]
+                    if dedup.enabled or idempotency_key else [])
 
-    # Embed & predict
-    try:
-        embedding = loader.embedding_manager.embed(input_data.features)
-        result: RiskResult = loader.prediction_service.predict(embedding)
-    except EmbeddingError as exc:
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
-    except InferenceError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    if idempotency_key:
+        request_hash = request_fingerprint(endpoint, fingerprints)
+        stored = await get_idempotency_key(session, idempotency_key)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different payload")
+            return [PredictionResponse(**item) for item in stored.response_json]
 
-    # Upload prediction to db
-    record_id = await create_prediction(
-        session,
-        model_id=loader.model_id,
-        embedding=embedding.flatten().tolist(),
-        risk_score=result.risk_score,
-        risk_level=result.risk_level,
-        features_json=input_data.features,
-        explanation_json=None,
-    )
+    # Without dedup every row is new, duplicates within the request included
+    keys = fingerprints if dedup.enabled else list(range(len(features)))
+    known = dict(await dedup.lookup(session, fingerprints))
+    todo = {}
+    for i, key in enumerate(keys):
+        if key not in known and key not in todo:
+            todo[key] = i
 
-    # Combine DB ID with inference result and return
-    return PredictionResponse(
-        record_id=record_id,
-        risk_level=result.risk_level,
-        risk_score=result.risk_score,
-        mdl_used=result.mdl_used,
-        version=result.version,
-    )
+    if todo:
+        rows = [features[i] for i in todo.values()]
+        try:
+            embeddings, results = await score(loader, rows, list(todo.values()))
+        except EmbeddingError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        except InferenceError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+        # Upload predictions to db in one multi-row INSERT (or hand them to write-behind)
+        records = build_prediction_rows(
+            model_id=loader.model_id,
+            embeddings=embeddings,
+            risk_scores=[result.risk_score for result in results],
+            risk_levels=[result.risk_level for result in results],
+            features_json=rows,
+        )
+        await _persist(session, records)
+        scored = {
+            key: StoredResult(record["id"], result.risk_score, result.risk_level)
+            for key, record, result in zip(todo, records, results)
+        }
+        if dedup.enabled:
+            await dedup.remember(session, loader.model_id, scored)
+        known.update(scored)
+
+    # Combine DB IDs with inference results
+    mdl_used = str(loader.cfg.active_model)
+    version = loader.cfg.service["version"]
+    responses = [
+        PredictionResponse(
+            record_id=known[key].prediction_id,
+            risk_level=known[key].risk_level,
+            risk_score=known[key].risk_score,
+            mdl_used=mdl_used,
+            version=version,
+        )
+        for key in keys
+    ]
+
+    if idempotency_key:
+        await insert_idempotency_key(
+            session, idempotency_key, request_hash, [r.model_dump(mode="json") for r in responses])
+    return responses
 
 # ---------------------------------------------------------------------------
 # Batch prediction endpoint
 # ---------------------------------------------------------------------------
-# Processes up to 100 feature payloads.  Items are handled sequentially to
-# avoid re-entrancy issues with a single `AsyncSession`.  If any item raises
-# during embedding or inference the whole request fails – this keeps the
+# Processes up to 1000 feature payloads.  All rows are validated and embedded
+# together through `EmbeddingManager.embed_many`, so the encoder runs a few
+# large batches instead of one call per row.  If any item raises during
+# embedding or inference the whole request fails – this keeps the
 # implementation simple for v1; a future enhancement could stream partial
-# successes.
+# successes.  Payloads already scored (see `service.dedup`) are not re-run.
 # ---------------------------------------------------------------------------
 @router.post("/batch", response_model=list[PredictionResponse],
         summary="Batch predict endpoint", description="Send a number of feature sets to batch predict")
 async def batch_pred(
     payload: BatchPredictRequest,
     session: AsyncSession = Depends(async_session),
+    idempotency_key: Union[str, None] = IDEMPOTENCY_KEY_HEADER,
 ):
     # Guard: service loader must be ready
     if main.loader is None or main.loader.embedding_manager is None or main.loader.prediction_service is None:
         raise HTTPException(status_code=503, detail="Service not ready")
+    loader = main.loader
 
-    results = []
+    # Feature count check
+    expected_features = len(loader.embedding_manager.feature_order)
     for item in payload.items:
-        results.append(await _process_and_save_prediction(item, session, main.loader))
+        if len(item.features) != expected_features:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Expected {expected_features} features, got {len(item.features)}"
+            )
+
+    return await _predict_and_store(
+        session, loader, [item.features for item in payload.items], _score_batch, "/predict/batch", idempotency_key)
+
+# ---------------------------------------------------------------------------
+# Streaming prediction endpoint
+# ---------------------------------------------------------------------------
+# Reads an NDJSON body (one `InputData` object per line) as it arrives and
+# scores it in chunks of `service.stream.chunk_rows` through the same batched
+# embed / predict / insert path as `/predict/batch`.  Each chunk is committed
+# on its own and its results are written back as NDJSON straight away, so
+# memory stays bounded by one chunk and a bad row only fails itself:
+#
+#   {"line": 1, "record_id": "...", "risk_level": 0, "risk_score": 0.1, ...}
+#   {"line": 2, "error": "Expected 34 features, got 33"}
+#   {"line": 3, "error": "Service overloaded; retry this row", "retryable": true}
+#   {"summary": {"rows": 3, "succeeded": 1, "failed": 2}}
+#
+# A chunk is also scored early once its first row has waited `max_wait_ms`,
+# whether or not more lines arrive, so a slow upload still sees results
+# before it finishes.
+# ---------------------------------------------------------------------------
+_TIMED_OUT = object()
+# Pauses before re-trying a chunk the inference queue rejected as full
+_OVERLOAD_BACKOFF_S = (0.1, 0.5, 2.0)
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator reads the request body.
+
+    Under ASGI < 2.4 Starlette listens for a disconnect by consuming
+    `receive`, which would swallow the request body; the generator notices
+    a disconnect itself (`ClientDisconnect`) so that listener is disabled.
+    """
+    media_type = "application/x-ndjson"
+
+    async def listen_for_disconnect(self, receive) -> None:
+        await anyio.sleep_forever()
+
+class _NDJSONLines:
+    """Non-blank lines of an NDJSON request body, read straight from
+    `receive` as they arrive.
+
+    `next()` returns ``(line_number, raw_line)``, or None at the end of the
+    body; `raw_line` is None for a line longer than `max_line_bytes`, which
+    is skipped without being buffered.  Its only await is on `receive`,
+    before any state changes, so a call can be cancelled (by a timeout) and
+    simply repeated without losing data.
+    """
+    def __init__(self, request: Request, max_line_bytes: int):
+        self._receive = request.receive
+        self.max_line_bytes = max_line_bytes
+        self._buf = bytearray()
+        self._lineno = 0
+        self._oversized = False
+        self._ready: deque[tuple[int, Union[bytes, None]]] = deque()
+        self._done = False
+
+    async def next(self) -> Union[tuple[int, Union[bytes, None]], None]:
+        while not self._ready:
+            if self._done:
+                return None
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnect()
+            self._feed(message.get("body", b""))
+            if not message.get("more_body", False):
+                self._done = True
+                if self._oversized or self._buf.strip():
+                    self._ready.append((self._lineno + 1, None if self._oversized else bytes(self._buf)))
+        return self._ready.popleft()
 
-    return results
\ No newline at end of file
+    def _feed(self, piece: bytes) -> None:
+        buf = self._buf
+        start = 0
+        while True:
+            end = piece.find(b"\n", start)
+            if end < 0:
+                if not self._oversized:
+                    buf += piece[start:]
+                    if len(buf) > self.max_line_bytes:
+                        self._oversized = True
+                        buf.clear()
+                return
+            self._lineno += 1
+            if not self._oversized:
+                buf += piece[start:end]
+            if self._oversized or len(buf) > self.max_line_bytes:
+                self._ready.append((self._lineno, None))
+            elif buf.strip():
+                self._ready.append((self._lineno, bytes(buf)))
+            buf.clear()
+            self._oversized = False
+            start = end + 1
+
+async def _score_stream_chunk(loader: main.ServiceLoader, lines: Sequence[int], features: Sequence[dict],
+                              score=_score_batch, endpoint: str = "/predict/stream") -> list[dict]:
+    """Score and commit the rows `features` (input line numbers `lines`);
+    returns one NDJSON object per row.  When the batched embed rejects a
+    row, the chunk is retried row by row so only the offending rows report
+    an error.  While the inference queue is full the chunk is retried after
+    each of the `_OVERLOAD_BACKOFF_S` pauses, then its rows are reported as
+    retryable."""
+    for delay in (*_OVERLOAD_BACKOFF_S, None):
+        async with async_factory() as session:
+            try:
+                responses = await _predict_and_store(session, loader, features, score, endpoint, None)
+                await session.commit()
+            except ServiceOverloadedError:
+                await session.rollback()
+                if delay is None:
+                    logger.warning("Inference queue full; %s chunk of %d rows not scored", endpoint, len(lines))
+                    return [{"line": line, "error": "Service overloaded; retry this row", "retryable": True}
+                            for line in lines]
+            except HTTPException as exc:
+                await session.rollback()
+                if exc.status_code == 400 and len(lines) > 1:
+                    results = []
+                    for i, line in enumerate(lines):
+                        results.extend(await _score_stream_chunk(loader, [line], features[i:i + 1], endpoint=endpoint))
+                    return results
+                return [{"line": line, "error": exc.detail} for line in lines]
+            except Exception:
+                await session.rollback()
+                logger.exception("Storing a %s chunk of %d rows failed", endpoint, len(lines))
+                return [{"line": line, "error": "Failed to store prediction"} for line in lines]
+            else:
+                return [{"line": line, **r.model_dump(mode="json")} for line, r in zip(lines, responses)]
+        await anyio.sleep(delay)
+
+async def _stream_predictions(request: Request, loader: main.ServiceLoader, chunk_rows: int,
+                              max_wait_ms: float, max_line_bytes: int) -> AsyncIterator[bytes]:
+    expected = len(loader.embedding_manager.feature_order)
+    rows = succeeded = 0
+    pending_lines: list[int] = []
+    pending: list[dict] = []
+    out: list[dict] = []
+    first_pending = 0.0
+
+    def encode(items: list[dict]) -> bytes:
+        return "".join(json.dumps(item, separators=(",", ":")) + "\n" for item in items).encode("utf-8")
+
+    lines = _NDJSONLines(request, max_line_bytes)
+    try:
+        while True:
+            # Wait for the next line only until the pending chunk is due
+            due = max_wait_ms / 1000.0 - (time.perf_counter() - first_pending) if pending else None
+            item = _TIMED_OUT
+            with anyio.move_on_after(due):
+                item = await lines.next()
+            if item is None:
+                break
+            if item is _TIMED_OUT:
+                out = await _score_stream_chunk(loader, pending_lines, pending)
+                pending_lines, pending = [], []
+                succeeded += sum("error" not in result for result in out)
+                yield encode(out)
+                out = []
+                continue
+
+            line, raw = item
+            rows += 1
+            if raw is None:
+                out.append({"line": line, "error": f"Line longer than {max_line_bytes} bytes"})
+            else:
+                try:
+                    features = InputData.model_validate_json(raw).features
+                except ValidationError as exc:
+                    err = exc.errors(include_url=False)[0]
+                    loc = ".".join(str(part) for part in err["loc"])
+                    out.append({"line": line, "error": f"{loc}: {err['msg']}" if loc else err["msg"]})
+                else:
+                    if len(features) != expected:
+                        out.append({"line": line, "error": f"Expected {expected} features, got {len(features)}"})
+                    else:
+                        if not pending:
+                            first_pending = time.perf_counter()
+                        pending_lines.append(line)
+                        pending.append(features)
+
+            waited_ms = (time.perf_counter() - first_pending) * 1000.0
+            if len(pending) >= chunk_rows or (pending and waited_ms >= max_wait_ms):
+                out.extend(await _score_stream_chunk(loader, pending_lines, pending))
+                pending_lines, pending = [], []
+            if out:
+                succeeded += sum("error" not in item for item in out)
+                yield encode(out)
+                out = []
+    except ClientDisconnect:
+        logger.info("/predict/stream client disconnected after %d rows", rows)
+        return
+
+    if pending:
+        out = await _score_stream_chunk(loader, pending_lines, pending)
+        succeeded += sum("error" not in item for item in out)
+        yield encode(out)
+    yield encode([{"summary": {"rows": rows, "succeeded": succeeded, "failed": rows - succeeded}}])
+
+@router.post("/stream", response_class=_DuplexStreamingResponse,
+        summary="Streaming predict endpoint",
+        description=(
+            "Send NDJSON, one `{\"features\": {...}}` object per line, of any length. "
+            "Rows are scored and stored in chunks as they arrive and each gets an NDJSON "
+            "result or error line (with its input `line` number) while the upload continues; "
+            "a final `summary` line closes the stream."
+        ))
+async def stream_pred(request: Request):
+    if main.loader is None or main.loader.embedding_manager is None or main.loader.prediction_service is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    loader = main.loader
+    opts = loader.cfg.service.get("stream") or {}
+    return _DuplexStreamingResponse(_stream_predictions(
+        request, loader,
+        chunk_rows=int(opts.get("chunk_rows", 256)),
+        max_wait_ms=float(opts.get("max_wait_ms", 250)),
+        max_line_bytes=int(opts.get("max_line_bytes", 1_048_576)),
+    ))
+
+# ---------------------------------------------------------------------------
+# File prediction endpoint
+# ---------------------------------------------------------------------------
+# Takes a raw CSV, Arrow IPC or Parquet file as the request body (format from
+# `?format=` or the Content-Type), maps its columns to `feature_order` and
+# scores it in chunks of `service.file_upload.chunk_rows`.  Chunks are parsed
+# column-wise (`app.services.tabular`) and embedded with `embed_columns`, so
+# numeric columns reach DICE as float arrays; a chunk holding an unparseable
+# value goes through the row path instead, which reports the bad rows.
+# Every chunk is committed on its own (partial success, as `/predict/stream`)
+# and the results are streamed back in the upload's format, one row each:
+# row, record_id, risk_level, risk_score, mdl_used, version, error.  If the
+# upload turns out to be unreadable part-way through, a final row with an
+# empty `row` and the reason in `error` ends the output.
+# ---------------------------------------------------------------------------
+_EXTENSIONS = {"csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+
+async def _score_columns(chunk: FeatureChunk, loader: main.ServiceLoader, rows: list[dict], positions: list[int]):
+    """Embed the rows at `positions` of `chunk` from its columns, then score them."""
+    embeddings, scores, levels = await loader.executor.run(
+        _embed_columns_and_score, loader, chunk.take(positions), len(positions))
+    return embeddings.reshape(len(embeddings), -1), loader.prediction_service.to_results(scores, levels)
+
+def _embed_columns_and_score(loader: main.ServiceLoader, columns: dict, n_rows: int):
+    """Columnar embed + forward pass; runs on the inference executor."""
+    embeddings = loader.embedding_manager.embed_columns(columns, n_rows)
+    scores, levels = loader.prediction_service.predict_batch(embeddings)
+    return embeddings, scores, levels
+
+async def _spool_upload(request: Request, max_bytes: int, memory_bytes: int):
+    """Copy the request body into a temporary file (in memory up to
+    `memory_bytes`); Parquet and Arrow files need to be seekable."""
+    spool = tempfile.SpooledTemporaryFile(max_size=memory_bytes)
+    size = 0
+    try:
+        async for piece in request.stream():
+            size += len(piece)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload larger than {max_bytes} bytes")
+            spool.write(piece)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def _file_predictions(loader: main.ServiceLoader, spool, chunks: Iterator[FeatureChunk],
+                            writer: ResultWriter) -> AsyncIterator[bytes]:
+    next_row = 1
+    try:
+        while True:
+            # Parsing reads the spooled file, so keep it off the event loop
+            chunk = await anyio.to_thread.run_sync(next, chunks, None)
+            if chunk is None:
+                break
+            lines = range(chunk.first_row, chunk.first_row + len(chunk.rows))
+            score = _score_batch if chunk.columns is None else partial(_score_columns, chunk)
+            # chunk.rows builds each row's mapping only when it is stored or reported
+            results = await _score_stream_chunk(loader, lines, chunk.rows, score=score, endpoint="/predict/file")
+            yield writer.write([{"row": item.pop("line"), **item} for item in results])
+            next_row = chunk.first_row + len(chunk.rows)
+        yield writer.close()
+    except (ValueError, csv.Error) as exc:
+        # Status and headers are already sent, so the error goes in the body:
+        # a last row without a row number tells the client where reading stopped
+        logger.error("Reading /predict/file upload failed mid-stream at row %d: %s", next_row, exc)
+        yield writer.write([{"row": None, "error": f"Upload could not be read from row {next_row} on: {exc}"}])
+        yield writer.close()
+    finally:
+        spool.close()
+
+@router.post("/file", response_class=StreamingResponse,
+        summary="File predict endpoint",
+        description=(
+            "Send a CSV, Arrow IPC or Parquet file as the request body (`format` query "
+            "parameter or Content-Type `text/csv`, `application/vnd.apache.arrow.stream`, "
+            "`application/vnd.apache.parquet`) with one column per feature. Rows are scored "
+            "in chunks, each committed on its own; results stream back in the same format "
+            "with one row per input row (`error` set where that row failed). A final row "
+            "with an empty `row` and an `error` means the rest of the upload could not be read."
+        ))
+async def file_pred(
+    request: Request,
+    format: Union[Literal["csv", "arrow", "parquet"], None] = Query(
+        None, description="Upload format; defaults to the one implied by Content-Type"),
+):
+    if main.loader is None or main.loader.embedding_manager is None or main.loader.prediction_service is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    loader = main.loader
+    fmt = format or detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv, Arrow IPC or Parquet, or pass ?format=")
+    opts = loader.cfg.service.get("file_upload") or {}
+
+    em = loader.embedding_manager
+    spool = await _spool_upload(
+        request,
+        max_bytes=int(opts.get("max_bytes", 512 * 1024 * 1024)),
+        memory_bytes=int(opts.get("spool_memory_bytes", 8 * 1024 * 1024)),
+    )
+    try:
+        writer = ResultWriter(fmt)
+        chunks = await anyio.to_thread.run_sync(
+            read_chunks, spool, fmt, em.feature_order, em.numeric_columns, int(opts.get("chunk_rows", 1000)))
+    except TabularError as exc:
+        spool.close()
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except BaseException:
+        spool.close()
+        raise
+    return StreamingResponse(
+        _file_predictions(loader, spool, chunks, writer),
+        media_type=writer.media_type,
+        headers={"Content-Disposition": f'attachment; filename="predictions.{_EXTENSIONS[fmt]}"'},
+    )
+
+# ---------------------------------------------------------------------------
+# Embedding scoring endpoint
+# ---------------------------------------------------------------------------
+# Scores embeddings the caller already has (computed offline, or read back
+# from `predictions.embedding`) without the encoder, DICE or feature
+# validation; only the shape is checked against the model's `input_shape`.
+# Nothing is stored, so re-scoring stored rows after a threshold or model
+# change costs one forward pass.  Body: raw little-endian float32
+# (`application/octet-stream`, rows back to back) or JSON
+# `{"embeddings": ["<base64>", ...]}`.
+# ---------------------------------------------------------------------------
+_EMBEDDING_DTYPE = np.dtype("<f4")
+
+def _decode_embeddings(data: bytearray, row_values: int) -> np.ndarray:
+    """Rows of `row_values` float32 values viewing `data` (a bytearray, so
+    the array is writable as torch expects); 400 on a partial row."""
+    if not data or len(data) % (row_values * _EMBEDDING_DTYPE.itemsize):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Body must hold whole embeddings of {row_values} float32 values "
+                   f"({row_values * _EMBEDDING_DTYPE.itemsize} bytes each); got {len(data)} bytes")
+    return np.frombuffer(data, dtype=_EMBEDDING_DTYPE).reshape(-1, row_values)
+
+@router.post("/embedding", response_model=list[RiskResult],
+        summary="Score precomputed embeddings",
+        description=(
+            "Score embeddings shaped like the model's `input_shape` without embedding "
+            "features; nothing is stored. Send raw little-endian float32 rows as "
+            "`application/octet-stream`, or JSON `{\"embeddings\": [\"<base64>\", ...]}`."
+        ),
+        openapi_extra={"requestBody": {"required": True, "content": {
+            "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+            "application/json": {"schema": EmbeddingScoreRequest.model_json_schema()},
+        }}})
+async def embedding_pred(request: Request):
+    if main.loader is None or main.loader.prediction_service is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    loader = main.loader
+    ps = loader.prediction_service
+    opts = loader.cfg.service.get("embedding_scoring") or {}
+    max_rows = int(opts.get("max_rows", 10_000))
+    row_values = int(np.prod(ps.input_shape))
+    max_bytes = max_rows * row_values * _EMBEDDING_DTYPE.itemsize
+
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type not in ("application/octet-stream", "application/json"):
+        raise HTTPException(status_code=415, detail="Send application/octet-stream or application/json")
+
+    body = bytearray()
+    async for piece in request.stream():
+        body += piece
+        # base64 JSON is about 4/3 the size of the raw floats
+        if len(body) > max_bytes * (2 if content_type == "application/json" else 1):
+            raise HTTPException(status_code=413, detail=f"More than {max_rows} embeddings")
+
+    if content_type == "application/octet-stream":
+        matrix = _decode_embeddings(body, row_values)
+    else:
+        try:
+            payload = EmbeddingScoreRequest.model_validate_json(bytes(body))
+        except ValidationError as exc:
+            raise HTTPException(status_code=422, detail=exc.errors(include_url=False)) from exc
+        row_bytes = row_values * _EMBEDDING_DTYPE.itemsize
+        rows = []
+        for i, item in enumerate(payload.embeddings):
+            try:
+                row = base64.b64decode(item, validate=True)
+            except binascii.Error as exc:
+                raise HTTPException(status_code=400, detail=f"embeddings[{i}]: invalid base64: {exc}") from exc
+            # Checked per item: uneven items could otherwise add up to whole rows
+            if len(row) != row_bytes:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"embeddings[{i}] must hold {row_values} float32 values "
+                           f"({row_bytes} bytes); got {len(row)} bytes")
+            rows.append(row)
+        matrix = _decode_embeddings(bytearray(b"".join(rows)), row_values)
+
+    if len(matrix) > max_rows:
+        raise HTTPException(status_code=413, detail=f"More than {max_rows} embeddings")
+    if not np.isfinite(matrix).all():
+        raise HTTPException(status_code=400, detail="Embeddings must be finite")
+
+    try:
+        scores, levels = await loader.executor.run(ps.predict_batch, matrix.reshape(-1, *ps.input_shape))
+    except InferenceError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    return ps.to_results(scores, levels)
@@ -1,11 +1,12 @@
 # app/routes/predictions.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from uuid import UUID
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Union
 from app.db import async_session
 from app.schemas import PredictionDB, ExplainRequest, ExplanationResponse, RecordListQuery, Neighbour
-from app.crud.predictions_help import get_prediction, add_explanation, predictions_list, get_nearest_neighbors_euclidean, get_nearest_neighbors_cosine
+from app.crud.predictions_help import get_prediction, get_prediction_record, add_explanation, predictions_list, get_nearest_neighbors_euclidean, get_nearest_neighbors_cosine
 
 from app import main  # access main.loader dynamically to avoid stale reference
 
@@ -13,12 +14,13 @@ router = APIRouter(prefix="/predictions", tags=["predictions"])
 
 # Get prediction by ID
 @router.get("/{pred_id}", response_model=PredictionDB, 
-    summary="Get prediction by ID", description="Return the full persisted prediction record, including optional explanation if previously generated.")
+    summary="Get prediction by ID", description="Return the full persisted prediction record, including optional explanation if previously generated. Pass `include_embedding=false` to skip the embedding vector.")
 async def read_prediction(
     pred_id: UUID,
+    include_embedding: bool = True,
     session: AsyncSession = Depends(async_session),
 ):
-    row = await get_prediction(session, pred_id)
+    row = await get_prediction_record(session, pred_id, include_embedding=include_embedding)
     if row is None:
 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prediction not found")
@@ -65,24 +67,49 @@ async def explain_prediction(
 # List predictions
 @router.get("", response_model=list[PredictionDB],
     summary="List predictions",
-    description="Return a page of predictions, optionally filtered by model, risk level, and score range.", tags=["predictions"]
+    responses={200: {"headers": {"X-Next-Cursor": {
+        "description": "Opaque cursor of the next page; absent on the last page. Sent as a "
+                       "header so the response body stays a plain list of predictions.",
+        "schema": {"type": "string"},
+    }}}},
+    description=(
+        "Return a page of predictions, optionally filtered by model, risk level, and score range. "
+        "Embeddings are omitted unless `include_embedding=true`. When more rows exist, the "
+        "`X-Next-Cursor` response header carries an opaque cursor; pass it back as `cursor` "
+        "to fetch the next page at constant cost."
+    ), tags=["predictions"]
 )
 async def list_predictions(
+    response: Response,
     query: RecordListQuery = Depends(),
     session: AsyncSession = Depends(async_session),
 ):
-    rows = await predictions_list(session, query)
+    try:
+        rows, next_cursor = await predictions_list(session, query)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [PredictionDB.model_validate(row) for row in rows]
 
 
 # Nearest neighbours
 @router.get("/{pred_id}/nearest", response_model=dict[str, list[Neighbour]],
             summary="Nearest neighbours for a prediction",
-            description="Return *k* predictions with smallest cosine distance to the given record.")
+            description=(
+                "Return *k* predictions with smallest euclidean and cosine distance to the given record. "
+                "Uses the HNSW indexes unless `service.vector_search.mode` is `exact` or `exact=true` is passed; "
+                "`ef_search` overrides the configured `hnsw.ef_search` for this request; "
+                "`since` / `until` restrict neighbours to that time window."
+            ))
 async def nearest(
     pred_id: UUID,
     session: AsyncSession = Depends(async_session),
     k: int = 5,
+    exact: Union[bool, None] = None,
+    ef_search: Union[int, None] = Query(None, ge=1, le=1000),
+    since: Union[datetime, None] = None,
+    until: Union[datetime, None] = None,
 ):
     anchor = await get_prediction(session, pred_id)
     if anchor is None:
@@ -90,7 +117,18 @@ async def nearest(
     if k > 50 or k < 1:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="k must be between 1 and 50")
 
+    opts = main.loader.cfg.service.get("vector_search") or {}
+    if exact is None:
+        exact = opts.get("mode", "ann") == "exact"
+    search = {
+        "exact": exact,
+        "ef_search": ef_search or opts.get("ef_search"),
+        "rerank_factor": opts.get("rerank_factor", 4),
+        "since": since,
+        "until": until,
+    }
+
     # Get nearest neighbors
-    eu = await get_nearest_neighbors_euclidean(session, anchor.embedding, k, pred_id)
-    sim = await get_nearest_neighbors_cosine(session, anchor.embedding, k, pred_id)
-    return {"euclidean": eu, "cosine": sim}
\ No newline at end of file
+    eu = await get_nearest_neighbors_euclidean(session, anchor.embedding, k, pred_id, **search)
+    sim = await get_nearest_neighbors_cosine(session, anchor.embedding, k, pred_id, **search)
+    return {"euclidean": eu, "cosine": sim}
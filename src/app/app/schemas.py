@@ -41,13 +41,18 @@ class RiskResult(BaseModel):
     mdl_used: str = Field(..., description="Model used")
     version: str = Field(..., description="Version")
 
+class EmbeddingScoreRequest(BaseModel):
+    """JSON body of `/predict/embedding`: precomputed embeddings, each the
+    base64 of little-endian float32 values laid out as the model's `input_shape`."""
+    embeddings: list[str] = Field(..., min_length=1, description="Base64 float32 embeddings, one per row")
+
 class PredictionDB(BaseModel):
     """DB fields exposed using get_prediction_by_id."""
     id: UUID = Field(..., description="ID")
     model_id: UUID = Field(..., description="Model ID")
     timestamp: datetime = Field(..., description="Timestamp")
     features_json: dict = Field(..., description="Features")
-    embedding: list[float] = Field(..., description="Embedding")
+    embedding: Union[list[float], None] = Field(default=None, description="Embedding (omitted unless requested)")  # float32 ndarray from the DB, serialised as a list
     risk_score: float = Field(..., description="Risk score")
     risk_level: int = Field(..., description="Risk level")
     team_id: UUID = Field(..., description="Team ID")
@@ -66,11 +71,19 @@ class ExplanationResponse(BaseModel):
     risk_drivers: List[str] = Field(description="A list of feature names that, when changed, flipped the prediction.")
     notes: str = Field(default="", description="Additional context for the explanation.")
 
+class DiceLutConfig(BaseModel):
+    features: list[str] = Field(..., description="Numeric features served from a DICE lookup table")
+    size: int = Field(default=4096, ge=2, description="Number of precomputed angles")
+    interpolate: bool = Field(default=True, description="Blend neighbouring entries instead of snapping to the nearest")
+    tolerance: float = Field(default=1e-4, gt=0, description="Max abs deviation from exact DICE; larger falls back to exact")
+
 class ModelEmbedding(BaseModel):
     strategy: Literal["value_only", "key_value", "hybrid_1d"] = Field(..., description="Embedding Strategy")
     embedder_name: str = Field(..., description="Embedder name")
     numeric_dim: Union[int, None] = Field(default=32, description="Numeric dimension")
     feature_order: list[str] = Field(..., description="Feature order")
+    vocab_dir: Union[str, None] = Field(default=None, description="Directory of precomputed vocabulary embedding tables")
+    dice_lut: Union[DiceLutConfig, None] = Field(default=None, description="Optional DICE lookup-table mode")
 
 class ModelConfig(BaseModel):
     mdl_class_name: str = Field(..., description="Model class name")
@@ -89,12 +102,16 @@ class AppConfig(BaseModel):
 
 # Query-string model used by GET /predictions for pagination & filtering
 class RecordListQuery(BaseModel):
-    page: int = Field(1, ge=1, description="1-based page number")
+    page: int = Field(1, ge=1, description="1-based page number (ignored when `cursor` is given)")
     page_size: int = Field(50, ge=1, le=200, description="results per page")
     mdl_id: Union[UUID, None] = Field(default=None, description="Model ID")
     risk_level: Union[int, None] = Field(default=None, description="Risk level")
     score_min: Union[float, None] = Field(default=None, description="Minimum score")
     score_max: Union[float, None] = Field(default=None, description="Maximum score")
+    include_embedding: bool = Field(default=False, description="Return the 2944-d embedding with each row")
+    cursor: Union[str, None] = Field(default=None, description="Opaque cursor from a previous page's X-Next-Cursor header")
+    since: Union[datetime, None] = Field(default=None, description="Only predictions at or after this time")
+    until: Union[datetime, None] = Field(default=None, description="Only predictions before this time")
 
 class Neighbour(BaseModel):
        id: UUID = Field(..., description="ID")
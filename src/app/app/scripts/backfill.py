@@ -0,0 +1,471 @@
+"""backfill.py
+Bulk back-fill of historical files into `predictions` or `training_samples`.
+
+Built for tens of millions of rows:
+
+* the file (CSV, or Arrow IPC / Parquet with `pyarrow`) is read in chunks
+  of `--chunk-rows` with the `/predict/file` readers, so memory stays flat
+  and numeric columns are parsed column-wise;
+* chunks are embedded (and, for `predictions`, scored) in a pool of
+  `--workers` processes, each loading only the model and encoder;
+* results are written in file order with `COPY` (asyncpg
+  `copy_records_to_table`), one transaction per chunk;
+* after every chunk the progress is checkpointed to a JSON file, and a
+  rerun with the same arguments resumes from it.  Row ids are derived
+  from the run id and row number, so a chunk committed just before a
+  crash is replaced rather than duplicated;
+* HNSW indexes stay in place by default, so a load into the live
+  `predictions` table never takes nearest-neighbour search away from the
+  API.  For a table nobody is querying yet, `--drop-indexes` drops them
+  first and rebuilds them once the load finishes, which is much faster
+  than maintaining them row by row.  The rebuild does not block writes:
+  each partition's index is built with CREATE INDEX CONCURRENTLY and
+  attached to the parent index (which stays invalid, and unused, until
+  every partition has one).
+
+Rows that fail validation are skipped and listed in ``<checkpoint>.errors.csv``.
+Missing monthly partitions of `predictions` are created on the way.
+Back-filled predictions are not registered for deduplication.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.backfill predictions --input history.csv --workers 4
+    python -m app.scripts.backfill predictions --input history.parquet --timestamp-column scored_at
+    python -m app.scripts.backfill training_samples --input labelled.csv --label-column label
+    python -m app.scripts.backfill predictions --input history.csv --drop-indexes
+    python -m app.scripts.backfill predictions --input history.csv --restore-indexes
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore[import-not-found]
+from sqlalchemy import text
+
+from app.crud.models import get_or_create_model
+from app.crud.predictions_help import DEFAULT_TEAM_ID
+from app.db import async_factory, engine
+from app.errors import EmbeddingError
+from app.scripts.manage_partitions import ensure_months, month_of
+from app.services.tabular import FeatureChunk, TabularError, read_chunks
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+TARGETS = ("predictions", "training_samples")
+
+_EXTENSIONS = {".csv": "csv", ".arrow": "arrow", ".arrows": "arrow", ".feather": "arrow", ".ipc": "arrow",
+               ".parquet": "parquet", ".pq": "parquet"}
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Pool worker side
+# ---------------------------------------------------------------------------
+_LOADER = None
+
+
+def _init_worker(config_path: str, torch_threads: int) -> None:
+    """Load the model and encoder once per worker process."""
+    global _LOADER
+    import torch  # type: ignore[import-not-found]
+
+    from app.logging.logging_config import setup_logging
+    from app.service_loader import ServiceLoader
+
+    setup_logging("WARNING")
+    _LOADER = ServiceLoader(config_path, inference_only=True)
+    torch.set_num_threads(torch_threads)
+
+
+def _worker_info() -> Tuple[List[str], List[str], str, str]:
+    em = _LOADER.embedding_manager
+    return list(em.feature_order), list(em.numeric_columns), str(_LOADER.cfg.active_model), \
+        _LOADER.cfg.service["version"]
+
+
+def _embed_chunk(chunk: FeatureChunk, score: bool):
+    """Embed (and optionally score) `chunk`.
+
+    Returns ``(kept, embeddings, scores, levels, errors)``: `kept` are the
+    chunk positions that made it, `errors` ``(position, message)`` pairs.
+    """
+    em = _LOADER.embedding_manager
+    n_rows = len(chunk.rows)
+    errors: List[Tuple[int, str]] = []
+    try:
+        if chunk.columns is None:
+            raise EmbeddingError("chunk is not columnar")
+        kept = list(range(n_rows))
+        embeddings = em.embed_columns(chunk.columns, n_rows)
+    except EmbeddingError:
+        # Pin down the bad rows, then embed the rest together
+        features = [{col: row[col] for col in em.feature_order if col in row} for row in chunk.rows]
+        kept = []
+        for i, row in enumerate(features):
+            try:
+                em.validate(row)
+                kept.append(i)
+            except (EmbeddingError, TypeError) as exc:
+                errors.append((i, str(exc)))
+        if not kept:
+            return kept, None, None, None, errors
+        embeddings = em.embed_many([features[i] for i in kept])
+
+    embeddings = np.ascontiguousarray(embeddings.reshape(len(kept), -1), dtype=np.float32)
+    if not score:
+        return kept, embeddings, None, None, errors
+    scores, levels = _LOADER.prediction_service.predict_batch(embeddings)
+    return kept, embeddings, np.asarray(scores, dtype=np.float64), np.asarray(levels), errors
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint
+# ---------------------------------------------------------------------------
+class Checkpoint:
+    """Progress of one back-fill, persisted as JSON after every chunk."""
+    def __init__(self, path: Path, state: Dict[str, Any]):
+        self.path = path
+        self.state = state
+
+    @classmethod
+    def load(cls, path: Path, source: Path, target: str) -> "Checkpoint":
+        if path.exists():
+            state = json.loads(path.read_text())
+            if state["source"] != str(source) or state["target"] != target:
+                raise SystemExit(f"{path} belongs to a back-fill of {state['source']} into {state['target']}")
+            return cls(path, state)
+        return cls(path, {
+            "source": str(source),
+            "target": target,
+            "run_id": str(uuid.uuid4()),
+            "rows_read": 0,
+            "loaded": 0,
+            "skipped": 0,
+            "last_chunk_rows": 0,
+            "dropped_indexes": {},
+            "finished": False,
+        })
+
+    def __getitem__(self, key: str) -> Any:
+        return self.state[key]
+
+    def save(self, **changes: Any) -> None:
+        self.state.update(changes)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2))
+        os.replace(tmp, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Database side
+# ---------------------------------------------------------------------------
+async def _drop_vector_indexes(table: str, checkpoint: Checkpoint) -> None:
+    """Drop the HNSW indexes on `table`, recording their definitions first."""
+    async with engine.begin() as conn:
+        rows = await conn.execute(text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = :table AND indexdef ILIKE '%USING hnsw%'"
+        ), {"table": table})
+        found = dict(rows.all())
+    if not found:
+        return
+    checkpoint.save(dropped_indexes={**checkpoint["dropped_indexes"], **found})
+    async with engine.begin() as conn:
+        for name in found:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    print(f"dropped {', '.join(found)}; rebuilt after the load")
+
+
+_INDEX_DEF = re.compile(r"^CREATE INDEX (\S+) ON ONLY (\S+) (USING .*)$", re.DOTALL)
+
+
+def _partition_index_name(partition: str, index: str) -> str:
+    name = f"{partition}_{index}"
+    if len(name) > 63:  # Postgres identifier limit
+        name = f"{partition}_{hashlib.sha1(index.encode()).hexdigest()[:12]}"
+    return name
+
+
+async def _build_concurrently(conn, name: str, definition: str) -> None:
+    """CREATE INDEX CONCURRENTLY `definition`, first dropping an invalid
+    `name` left behind by an interrupted build."""
+    valid = (await conn.execute(text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+    ), {"name": name})).scalar_one_or_none()
+    if valid is False:
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    await conn.execute(text(definition.replace("CREATE INDEX ", "CREATE INDEX CONCURRENTLY IF NOT EXISTS ", 1)))
+
+
+async def _rebuild_partitioned(conn, name: str, parent: str, using: str, definition: str) -> None:
+    """Recreate partitioned index `name` without blocking writes.
+
+    The ON ONLY parent index is created empty and invalid; each partition's
+    index is then built concurrently and attached.  Partitions that already
+    have an attached index (e.g. created meanwhile) are skipped.
+    """
+    await conn.execute(text(definition.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)))
+    partitions = (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent) ORDER BY c.relname"
+    ), {"parent": parent})).scalars().all()
+    for partition in partitions:
+        attached = (await conn.execute(text(
+            "SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:index) AND x.indrelid = to_regclass(:partition)"
+        ), {"index": name, "partition": partition})).first()
+        if attached:
+            continue
+        child = _partition_index_name(partition, name)
+        await _build_concurrently(conn, child, f"CREATE INDEX {child} ON {partition} {using}")
+        await conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {child}"))
+        print(f"  built {child}")
+
+
+async def _rebuild_indexes(checkpoint: Checkpoint, maintenance_work_mem: str) -> None:
+    """Recreate the indexes `_drop_vector_indexes` recorded, concurrently."""
+    for name, definition in dict(checkpoint["dropped_indexes"]).items():
+        start = time.perf_counter()
+        # CONCURRENTLY cannot run inside a transaction block
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("SELECT set_config('maintenance_work_mem', :mem, false)"),
+                               {"mem": maintenance_work_mem})
+            try:
+                # Partitioned parents report "ON ONLY"
+                match = _INDEX_DEF.match(definition)
+                if match:
+                    await _rebuild_partitioned(conn, name, match[2], match[3], definition)
+                else:
+                    await _build_concurrently(conn, name, definition)
+            finally:
+                await conn.execute(text("RESET maintenance_work_mem"))
+        remaining = {k: v for k, v in checkpoint["dropped_indexes"].items() if k != name}
+        checkpoint.save(dropped_indexes=remaining)
+        print(f"rebuilt {name} in {time.perf_counter() - start:.1f} s")
+
+
+def _parse_timestamp(value: Any) -> datetime:
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    # Naive timestamps are taken as UTC, like the rest of the service
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _records(args, chunk: FeatureChunk, result, run_id: uuid.UUID, model_id: uuid.UUID,
+             feature_order: List[str], now: datetime):
+    """COPY records for `chunk`, plus ``(row, message)`` for rows left out."""
+    kept, embeddings, scores, levels, errors = result
+    failed = [(chunk.first_row + i, msg) for i, msg in errors]
+    records = []
+    for j, i in enumerate(kept):
+        row = chunk.rows[i]
+        row_no = chunk.first_row + i
+        rec_id = uuid.uuid5(run_id, str(row_no))
+        try:
+            ts = _parse_timestamp(row[args.timestamp_column]) if args.timestamp_column else now
+            if args.target == "training_samples":
+                records.append((rec_id, embeddings[j], int(float(row[args.label_column])), ts))
+                continue
+        except (TypeError, ValueError, KeyError) as exc:
+            failed.append((row_no, f"{type(exc).__name__}: {exc}"))
+            continue
+        features = {col: row[col] for col in feature_order}
+        records.append((
+            rec_id, model_id, ts, json.dumps(features, default=str), embeddings[j],
+            float(scores[j]), int(levels[j]), DEFAULT_TEAM_ID,
+        ))
+    return records, failed
+
+
+_COLUMNS = {
+    "predictions": ["id", "model_id", "timestamp", "features_json", "embedding", "risk_score", "risk_level", "team_id"],
+    "training_samples": ["id", "embedding", "label", "created_at"],
+}
+
+
+async def _copy(table: str, records: list, replace_ids: Optional[list]) -> None:
+    """COPY `records` into `table` in one transaction, first deleting rows
+    with `replace_ids` (the chunk a crash may have committed unrecorded)."""
+    async with engine.begin() as conn:
+        raw = await conn.get_raw_connection()
+        apg = raw.driver_connection
+        if replace_ids:
+            await apg.execute(f"DELETE FROM {table} WHERE id = ANY($1::uuid[])", replace_ids)
+        if records:
+            await apg.copy_records_to_table(table, records=records, columns=_COLUMNS[table])
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+def _skip_done(chunks, rows_read: int):
+    """Drop the rows a previous run already handled."""
+    for chunk in chunks:
+        done = rows_read - (chunk.first_row - 1)
+        if done >= len(chunk.rows):
+            continue
+        if done > 0:
+            keep = range(done, len(chunk.rows))
+            chunk = FeatureChunk(chunk.first_row + done, chunk.rows[done:],
+                                 None if chunk.columns is None else chunk.take(list(keep)))
+        yield chunk
+
+
+async def run(args) -> int:
+    checkpoint = Checkpoint.load(args.checkpoint, args.input, args.target)
+    if args.restore_indexes or checkpoint["finished"]:
+        if checkpoint["finished"]:
+            print(f"{args.input} already loaded ({checkpoint['loaded']:,} rows); delete {args.checkpoint} to load it again")
+        await _rebuild_indexes(checkpoint, args.maintenance_work_mem)
+        return 0
+
+    ctx = multiprocessing.get_context("spawn")
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(str(args.config), torch_threads)) as pool:
+        feature_order, numeric_cols, model_name, version = await loop.run_in_executor(pool, _worker_info)
+        extra = [c for c in (args.label_column, args.timestamp_column) if c and c not in feature_order]
+
+        async with async_factory() as session:
+            model_id = await get_or_create_model(session, name=model_name, version=version)
+        if args.drop_indexes:
+            await _drop_vector_indexes(args.target, checkpoint)
+
+        run_id = uuid.UUID(checkpoint["run_id"])
+        resumed = checkpoint["rows_read"] > 0
+        if resumed:
+            print(f"resuming after row {checkpoint['rows_read']:,}")
+        known_months = set()
+        errors_path = args.checkpoint.with_suffix(".errors.csv")
+        started = time.perf_counter()
+        last_report, last_rows = started, 0
+        loaded_now = 0
+
+        with open(args.input, "rb") as fh, open(errors_path, "a", newline="") as errors_fh:
+            errors_out = csv.writer(errors_fh)
+            try:
+                chunks = read_chunks(fh, args.format, feature_order, numeric_cols, args.chunk_rows,
+                                     extra_columns=extra)
+            except TabularError as exc:
+                raise SystemExit(str(exc))
+            chunks = _skip_done(chunks, checkpoint["rows_read"])
+
+            in_flight: deque = deque()
+            score = args.target == "predictions"
+            now = datetime.now(timezone.utc)
+            exhausted = False
+            while in_flight or not exhausted:
+                # Keep every worker busy while the oldest chunk is written
+                while not exhausted and len(in_flight) < 2 * args.workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    in_flight.append((chunk, loop.run_in_executor(pool, _embed_chunk, chunk, score)))
+                if not in_flight:
+                    break
+
+                chunk, future = in_flight.popleft()
+                records, failed = _records(args, chunk, await future, run_id, model_id, feature_order, now)
+                if args.target == "predictions" and records:
+                    months = {month_of(rec[2]) for rec in records} - known_months
+                    if months:
+                        for name, moved in await ensure_months(months):
+                            print(f"created partition {name}" + (f" ({moved} rows moved from default)" if moved else ""))
+                        known_months |= months
+
+                # The chunk after the checkpoint may have been committed just before a crash
+                replace_ids = None
+                if resumed:
+                    n_rows = max(len(chunk.rows), checkpoint["last_chunk_rows"])
+                    replace_ids = [uuid.uuid5(run_id, str(checkpoint["rows_read"] + 1 + i)) for i in range(n_rows)]
+                    resumed = False
+                await _copy(args.target, records, replace_ids)
+                errors_out.writerows(failed)
+                errors_fh.flush()
+                loaded_now += len(records)
+                checkpoint.save(
+                    rows_read=chunk.first_row - 1 + len(chunk.rows),
+                    loaded=checkpoint["loaded"] + len(records),
+                    skipped=checkpoint["skipped"] + len(failed),
+                    last_chunk_rows=len(chunk.rows),
+                )
+
+                tick = time.perf_counter()
+                if tick - last_report >= args.progress_every:
+                    recent = (loaded_now - last_rows) / (tick - last_report)
+                    print(f"{checkpoint['rows_read']:>12,} rows read  {checkpoint['loaded']:>12,} loaded  "
+                          f"{checkpoint['skipped']:,} skipped  {loaded_now / (tick - started):,.0f} rows/s "
+                          f"(last {recent:,.0f} rows/s)")
+                    last_report, last_rows = tick, loaded_now
+
+    elapsed = time.perf_counter() - started
+    checkpoint.save(finished=True)
+    print(f"loaded {loaded_now:,} rows in {elapsed:.1f} s ({loaded_now / elapsed if elapsed else 0:,.0f} rows/s); "
+          f"{checkpoint['loaded']:,} total, {checkpoint['skipped']:,} skipped (see {errors_path})")
+
+    await _rebuild_indexes(checkpoint, args.maintenance_work_mem)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Back-fill historical files into predictions or training_samples.")
+    parser.add_argument("target", choices=TARGETS, help="Table to load")
+    parser.add_argument("--input", type=Path, required=True, help="CSV, Arrow IPC or Parquet file")
+    parser.add_argument("--format", choices=("csv", "arrow", "parquet"), help="Input format (default: from extension)")
+    parser.add_argument("--config", type=Path, default=APP_DIR / "config.yaml", help="Path to config.yaml")
+    parser.add_argument("--label-column", help="Label column (required for training_samples)")
+    parser.add_argument("--timestamp-column", help="Column holding each row's timestamp (default: load time)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Embedding processes")
+    parser.add_argument("--torch-threads", type=int, help="Torch threads per worker (default: cpu_count // workers)")
+    parser.add_argument("--chunk-rows", type=int, default=2000, help="Rows per chunk / COPY")
+    parser.add_argument("--checkpoint", type=Path, help="Progress file (default: <input>.backfill.json)")
+    parser.add_argument("--drop-indexes", action="store_true",
+                        help="Drop HNSW indexes for the load and rebuild them after; only for tables nobody queries")
+    parser.add_argument("--restore-indexes", action="store_true",
+                        help="Only rebuild indexes an interrupted run dropped, then exit")
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="maintenance_work_mem for index builds")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    args.input = args.input.resolve()
+    if args.format is None:
+        args.format = _EXTENSIONS.get(args.input.suffix.lower())
+        if args.format is None:
+            parser.error(f"cannot tell the format of {args.input.name}; pass --format")
+    if args.target == "training_samples" and not args.label_column:
+        parser.error("training_samples needs --label-column")
+    if args.workers < 1 or args.chunk_rows < 1:
+        parser.error("--workers and --chunk-rows must be >= 1")
+    args.checkpoint = (args.checkpoint or args.input.with_name(args.input.name + ".backfill.json")).resolve()
+
+    async def _main() -> int:
+        try:
+            return await run(args)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
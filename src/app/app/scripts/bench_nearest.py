@@ -0,0 +1,105 @@
+"""bench_nearest.py
+Recall-versus-latency benchmark of HNSW nearest-neighbour search against
+exact search on the `predictions` table.
+
+Samples `--anchors` stored predictions, runs the exact query once per
+anchor and metric as ground truth, then repeats the ANN query at each
+`--ef-search` value and reports recall@k and p50/p95 latency.  Needs the
+HNSW migration applied and a populated database (`DATABASE_URL`).
+
+Usage (from `src/app`):
+
+    python -m app.scripts.bench_nearest
+    python -m app.scripts.bench_nearest --k 10 --anchors 200 --ef-search 20 40 80 160
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np  # type: ignore[import-not-found]
+from sqlalchemy import func, select
+
+from app.crud.predictions_help import (
+    DEFAULT_TEAM_ID,
+    get_nearest_neighbors_cosine,
+    get_nearest_neighbors_euclidean,
+)
+from app.db import async_factory, engine
+from app.models_db import Prediction
+
+METRICS = {
+    "euclidean": get_nearest_neighbors_euclidean,
+    "cosine": get_nearest_neighbors_cosine,
+}
+
+
+async def _timed(search, anchor, k: int, **kwargs):
+    """Run one search in its own transaction; returns (ids, elapsed ms)."""
+    async with async_factory() as session:
+        start = time.perf_counter()
+        rows = await search(session, anchor.embedding, k, anchor.id, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        await session.rollback()
+    return [r["id"] for r in rows], elapsed
+
+
+def _summary(latencies: List[float]) -> str:
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return f"p50 {p50:8.2f} ms  p95 {p95:8.2f} ms"
+
+
+async def run(args) -> int:
+    async with async_factory() as session:
+        stmt = (
+            select(Prediction.id, Prediction.embedding)
+            .where(Prediction.team_id == DEFAULT_TEAM_ID)
+            .order_by(func.random())
+            .limit(args.anchors)
+        )
+        anchors = (await session.execute(stmt)).all()
+    if not anchors:
+        print("No predictions stored; nothing to benchmark")
+        return 1
+    print(f"{len(anchors)} anchors, k={args.k}, rerank_factor={args.rerank_factor}")
+
+    for metric, search in METRICS.items():
+        truth: Dict = {}
+        latencies: List[float] = []
+        for anchor in anchors:
+            ids, ms = await _timed(search, anchor, args.k, exact=True)
+            truth[anchor.id] = set(ids)
+            latencies.append(ms)
+        print(f"\n[{metric}]\n  exact            recall 1.0000  {_summary(latencies)}")
+
+        for ef in args.ef_search:
+            hits = total = 0
+            latencies = []
+            for anchor in anchors:
+                ids, ms = await _timed(search, anchor, args.k, exact=False,
+                                       ef_search=ef, rerank_factor=args.rerank_factor)
+                hits += len(truth[anchor.id].intersection(ids))
+                total += len(truth[anchor.id])
+                latencies.append(ms)
+            recall = hits / total if total else 1.0
+            print(f"  ann ef={ef:<6d}    recall {recall:.4f}  {_summary(latencies)}")
+
+    await engine.dispose()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark HNSW vs exact nearest-neighbour search.")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--anchors", type=int, default=100, help="Stored predictions used as queries")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 80, 160], help="hnsw.ef_search values to try (raised to k * rerank factor if lower)")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="ANN candidates per requested neighbour")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
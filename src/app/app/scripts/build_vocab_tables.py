@@ -0,0 +1,65 @@
+"""build_vocab_tables.py
+Offline build step for the memory-mapped vocabulary embedding tables.
+
+Embeds every value of the closed vocabularies in
+`app/constants/vocabularies.py` with the model's configured embedder and
+writes `<column>.npy` + `<column>.json` into the model's `vocab_dir`.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.build_vocab_tables
+    python -m app.scripts.build_vocab_tables --model hybrid_risk_mlp --columns addr_state sub_grade
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+from pathlib import Path
+
+import yaml  # type: ignore[import-not-found]
+from sentence_transformers import SentenceTransformer  # type: ignore[import-not-found]
+
+from app.constants.vocabularies import CLOSED_VOCABULARIES
+from app.logging.logging_config import setup_logging
+from app.schemas import AppConfig
+from app.services.embedding_service import EmbeddingManager
+from app.services.vocab_tables import build_vocab_table
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute vocabulary embedding tables.")
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG, help="Path to config.yaml")
+    parser.add_argument("--model", default=None, help="Model key in config.yaml (default: ACTIVE_MODEL / active_model)")
+    parser.add_argument("--columns", nargs="*", default=None, help="Columns to build (default: every closed vocabulary the model embeds as text)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    with open(args.config) as f:
+        cfg = AppConfig.model_validate(yaml.safe_load(f))
+    model_key = args.model or os.getenv("ACTIVE_MODEL", cfg.active_model)
+    model_cfg = cfg.models[model_key]
+    if not model_cfg.embedding.vocab_dir:
+        raise SystemExit(f"Model '{model_key}' has no embedding.vocab_dir configured")
+    out_dir = args.config.parent / model_cfg.embedding.vocab_dir
+
+    embedder = SentenceTransformer(model_cfg.embedding.embedder_name)
+    em = EmbeddingManager(embedder, model_cfg, "cpu")
+    text_cols = em.feature_order if em.strategy == "value_only" else em.text_cols
+
+    columns = args.columns or [col for col in CLOSED_VOCABULARIES if col in text_cols]
+    for col in columns:
+        if col not in CLOSED_VOCABULARIES:
+            raise SystemExit(f"No closed vocabulary defined for column '{col}'")
+        if col not in text_cols:
+            raise SystemExit(f"Column '{col}' is not embedded as text by model '{model_key}'")
+        path = build_vocab_table(em, col, CLOSED_VOCABULARIES[col], out_dir)
+        logger.info("Wrote %d values for '%s' to %s", len(CLOSED_VOCABULARIES[col]), col, path)
+
+
+if __name__ == "__main__":
+    main()
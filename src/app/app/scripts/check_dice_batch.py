@@ -0,0 +1,105 @@
+"""check_dice_batch.py
+Verify that the vectorised `DICE.make_dice_batch` matches the per-value
+DICE encoding.
+
+For every numeric feature in `MLP_1D_BOUNDS` it encodes a spread of values
+(a grid over the bounds, the bounds themselves, values just inside and
+outside them, far out-of-range values and random draws around the range)
+three ways: one `make_dice_batch` call, `make_dice` per value, and a
+scalar reference written like the original one-value-at-a-time
+implementation (`math.sin` / `math.cos`, float32 polar coordinates, one
+basis product and norm per value).  Reports the max absolute deviation per
+feature and exits non-zero if any exceeds `--tolerance`.
+
+Runs offline; no model or database is needed.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.check_dice_batch
+    python -m app.scripts.check_dice_batch --points 5000 --tolerance 1e-6 --d 32
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+from pathlib import Path
+
+import numpy as np  # type: ignore[import-not-found]
+import yaml  # type: ignore[import-not-found]
+
+from app.constants.feature_bounds import MLP_1D_BOUNDS
+from app.services.dice import DICE
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+
+def reference_dice(dice: DICE, num: float) -> np.ndarray:
+    """DICE embedding of one value, computed one scalar at a time."""
+    span = dice.max_bound - dice.min_bound
+    t = 0.0 if span == 0 else min(max((float(num) - dice.min_bound) / span, 0.0), 1.0)
+    theta = t * math.pi
+    if dice.d == 2:
+        polar = np.array([math.cos(theta), math.sin(theta)], dtype=np.float32)
+    else:
+        polar = np.array([
+            math.sin(theta) ** (k - 1) * math.cos(theta) if k < dice.d else math.sin(theta) ** dice.d
+            for k in range(1, dice.d + 1)
+        ], dtype=np.float32)
+    out = np.dot(dice.Q.astype(np.float32), polar)
+    if dice.norm == "l2":
+        n = float(np.linalg.norm(out))
+        if n > 0:
+            out = out / n
+    return out.astype(np.float32)
+
+
+def probe_values(lo: float, hi: float, points: int, rng: np.random.Generator) -> np.ndarray:
+    """Grid, edge and out-of-range values for bounds ``[lo, hi]``."""
+    span = hi - lo
+    eps = max(abs(lo), abs(hi), 1.0) * 1e-9
+    edges = [lo, hi, lo + eps, hi - eps, lo - eps, hi + eps, (lo + hi) / 2,
+             lo - span, hi + span, lo - 1e12, hi + 1e12, 0.0]
+    return np.concatenate([
+        np.linspace(lo, hi, points),
+        np.asarray(edges, dtype=np.float64),
+        rng.uniform(lo - span / 2, hi + span / 2, points),
+    ])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare batched and per-value DICE embeddings.")
+    parser.add_argument("--config", type=Path, default=APP_DIR / "config.yaml", help="Path to config.yaml")
+    parser.add_argument("--d", type=int, default=None, help="DICE dimension (default: active model's numeric_dim, else 32)")
+    parser.add_argument("--points", type=int, default=2000, help="Grid points (and random draws) per feature")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Max allowed absolute deviation")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random draws")
+    args = parser.parse_args(argv)
+
+    d = args.d
+    if d is None:
+        with open(args.config) as f:
+            raw = yaml.safe_load(f) or {}
+        model = (raw.get("models") or {}).get(raw.get("active_model")) or {}
+        d = int((model.get("embedding") or {}).get("numeric_dim") or 32)
+
+    rng = np.random.default_rng(args.seed)
+    worst = 0.0
+    print(f"{'feature':<18} {'values':>7} {'vs reference':>13} {'vs make_dice':>13}")
+    for col, (lo, hi) in sorted(MLP_1D_BOUNDS.items()):
+        dice = DICE(d=d, min_bound=lo, max_bound=hi, seed=13)
+        values = probe_values(lo, hi, args.points, rng)
+        batch = dice.make_dice_batch(values)
+        reference = np.stack([reference_dice(dice, v) for v in values])
+        single = np.stack([dice.make_dice(v) for v in values])
+        dev_ref = float(np.abs(batch - reference).max())
+        dev_single = float(np.abs(batch - single).max())
+        worst = max(worst, dev_ref, dev_single)
+        print(f"{col:<18} {len(values):>7} {dev_ref:>13.3e} {dev_single:>13.3e}")
+
+    print(f"max deviation: {worst:.3e} (tolerance {args.tolerance:.1e}, d={d})")
+    return 1 if worst > args.tolerance else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""check_dice_lut.py
+Verify that the DICE lookup-table mode leaves model predictions unchanged.
+
+Embeds a CSV payload twice (exact DICE vs. the configured `dice_lut`, or
+`--features` if given), scores both with the active model and reports the
+max embedding deviation, the max score difference and any risk-level
+changes.  Exits non-zero if a single prediction changes level.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.check_dice_lut
+    python -m app.scripts.check_dice_lut --csv test_data/test_payload.csv --size 1024 --no-interpolate
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+import numpy as np  # type: ignore[import-not-found]
+
+from app.logging.logging_config import setup_logging
+from app.schemas import DiceLutConfig
+from app.service_loader import ServiceLoader
+from app.services.embedding_service import EmbeddingManager
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare exact and lookup-table DICE predictions.")
+    parser.add_argument("--config", type=Path, default=APP_DIR / "config.yaml", help="Path to config.yaml")
+    parser.add_argument("--csv", type=Path, default=APP_DIR / "test_data" / "test_payload_large.csv", help="Payload CSV")
+    parser.add_argument("--features", nargs="*", default=None, help="Features to serve from the table (default: config dice_lut.features, else all numeric)")
+    parser.add_argument("--size", type=int, default=None, help="Lookup-table size (default: config or 4096)")
+    parser.add_argument("--no-interpolate", action="store_true", help="Snap to the nearest entry instead of interpolating")
+    args = parser.parse_args(argv)
+
+    setup_logging("WARNING")
+    loader = ServiceLoader(args.config)
+    model_cfg = loader.model_cfg
+    if model_cfg.embedding.strategy != "hybrid_1d":
+        print(f"Model uses '{model_cfg.embedding.strategy}' embeddings; DICE is not involved")
+        return 0
+
+    base = model_cfg.embedding.dice_lut or DiceLutConfig(features=[])
+    lut = DiceLutConfig(
+        features=args.features or base.features or loader.embedding_manager.numerical_cols,
+        size=args.size or base.size,
+        interpolate=base.interpolate and not args.no_interpolate,
+        tolerance=1.0,  # measure, do not fall back
+    )
+    exact_cfg = model_cfg.model_copy(update={"embedding": model_cfg.embedding.model_copy(update={"dice_lut": None})})
+    lut_cfg = model_cfg.model_copy(update={"embedding": model_cfg.embedding.model_copy(update={"dice_lut": lut})})
+    text_model = loader.embedding_manager.text_model
+    exact = EmbeddingManager(text_model, exact_cfg, loader.device)
+    table = EmbeddingManager(text_model, lut_cfg, loader.device)
+
+    with open(args.csv, newline="") as f:
+        rows = [{k: row[k] for k in exact.feature_order} for row in csv.DictReader(f)]
+
+    emb_exact = exact.embed_many(rows)
+    emb_table = table.embed_many(rows)
+    scores_exact, levels_exact = loader.prediction_service.predict_batch(emb_exact)
+    scores_table, levels_table = loader.prediction_service.predict_batch(emb_table)
+
+    changed = np.flatnonzero(levels_exact != levels_table)
+    print(f"rows:                  {len(rows)}")
+    print(f"features:              {', '.join(lut.features)}")
+    print(f"table size:            {lut.size} ({'interpolated' if lut.interpolate else 'nearest'})")
+    print(f"max DICE deviation:    {max(table.dice_by_feature[c].lut_max_error for c in lut.features):.3e}")
+    print(f"max embedding delta:   {float(np.abs(emb_exact - emb_table).max()):.3e}")
+    print(f"max score delta:       {float(np.abs(scores_exact - scores_table).max()):.3e}")
+    print(f"risk-level changes:    {len(changed)}")
+    for i in changed[:20]:
+        print(f"  row {i}: {levels_exact[i]} ({scores_exact[i]:.5f}) -> {levels_table[i]} ({scores_table[i]:.5f})")
+    return 1 if len(changed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
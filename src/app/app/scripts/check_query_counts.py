@@ -0,0 +1,154 @@
+"""check_query_counts.py
+Regression check: CRUD helpers must not get more expensive as the
+`predictions` table grows.
+
+Inside one transaction that is rolled back at the end, seeds a small
+baseline of predictions, records the statements issued and rows fetched
+by each CRUD helper, inserts `--rows` more predictions, and records them
+again.  Exits non-zero if any helper's statement or row count changed.
+Nothing is left behind in the database (`DATABASE_URL`).
+
+Usage (from `src/app`):
+
+    python -m app.scripts.check_query_counts
+    python -m app.scripts.check_query_counts --rows 5000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np  # type: ignore[import-not-found]
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession  # type: ignore[import-not-found]
+
+from app.crud.models import get_or_create_model
+from app.crud.predictions_help import (
+    create_predictions_bulk,
+    distinct_feature_values,
+    get_nearest_neighbors_cosine,
+    get_prediction,
+    get_prediction_record,
+    predictions_list,
+)
+from app.db import engine
+from app.models_db import Prediction
+from app.schemas import RecordListQuery
+
+MODEL_NAME = "query-count-check"
+EMBEDDING_DIM = Prediction.__table__.c.embedding.type.dim
+BASELINE_ROWS = 120  # enough for every helper below to return a full page
+
+
+@dataclass
+class QueryCounter:
+    """Count statements and result rows executed on `engine` while active.
+
+    Used to check that CRUD helpers issue a fixed number of queries and
+    fetch a bounded number of rows however large the tables grow::
+
+        with QueryCounter(engine) as qc:
+            await get_prediction(session, pred_id)
+        qc.statements, qc.rows
+
+    Rows come from the DBAPI cursor's `rowcount`, which asyncpg fills in
+    for SELECTs as well; drivers that report -1 count as zero rows.
+    """
+    engine: object
+    statements: int = 0
+    rows: int = 0
+    sql: List[str] = field(default_factory=list)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements += 1
+        self.rows += max(cursor.rowcount, 0)
+        self.sql.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self._sync_engine, "after_cursor_execute", self._after_execute)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(self._sync_engine, "after_cursor_execute", self._after_execute)
+
+    @property
+    def _sync_engine(self):
+        return getattr(self.engine, "sync_engine", self.engine)
+
+
+async def _seed(session: AsyncSession, model_id, n: int, rng: np.random.Generator) -> list:
+    ids = []
+    for start in range(0, n, 500):
+        size = min(500, n - start)
+        ids += await create_predictions_bulk(
+            session,
+            model_id=model_id,
+            embeddings=rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32),
+            risk_scores=rng.random(size).tolist(),
+            risk_levels=rng.integers(0, 3, size).tolist(),
+            features_json=[{"addr_state": "CA", "loan_amnt": float(i)} for i in range(size)],
+        )
+    return ids
+
+
+async def _measure(session: AsyncSession, model_id, anchor_id) -> Dict[str, Tuple[int, int]]:
+    """Run each helper once and return ``{name: (statements, rows)}``."""
+    anchor = await get_prediction(session, anchor_id)
+    _, cursor = await predictions_list(session, RecordListQuery(page_size=50))
+    checks = {
+        "get_or_create_model": lambda: get_or_create_model(session, name=MODEL_NAME, version="v0"),
+        "get_prediction": lambda: get_prediction(session, anchor_id),
+        "get_prediction_record": lambda: get_prediction_record(session, anchor_id, include_embedding=False),
+        "predictions_list": lambda: predictions_list(session, RecordListQuery(page_size=50)),
+        "predictions_list(cursor)": lambda: predictions_list(session, RecordListQuery(page_size=50, cursor=cursor)),
+        "nearest(exact)": lambda: get_nearest_neighbors_cosine(session, anchor.embedding, 5, anchor_id, exact=True),
+        "distinct_feature_values": lambda: distinct_feature_values(session, ["addr_state"], model_id=model_id, limit=10),
+    }
+    counts = {}
+    for name, call in checks.items():
+        # Start from an empty identity map so nothing is served from memory
+        session.expunge_all()
+        with QueryCounter(engine) as qc:
+            await call()
+        counts[name] = (qc.statements, qc.rows)
+    return counts
+
+
+async def run(extra_rows: int) -> int:
+    rng = np.random.default_rng(0)
+    async with engine.connect() as conn:
+        outer = await conn.begin()
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            model_id = await get_or_create_model(session, name=MODEL_NAME, version="v0")
+            anchor_id = (await _seed(session, model_id, BASELINE_ROWS, rng))[0]
+            before = await _measure(session, model_id, anchor_id)
+            await _seed(session, model_id, extra_rows, rng)
+            after = await _measure(session, model_id, anchor_id)
+        finally:
+            await session.close()
+            await outer.rollback()
+    await engine.dispose()
+
+    failed = False
+    print(f"{'helper':<26} {'statements':>12} {'rows':>14}   (+{extra_rows} predictions)")
+    for name, (stmts, rows) in before.items():
+        stmts_after, rows_after = after[name]
+        ok = (stmts, rows) == (stmts_after, rows_after)
+        failed |= not ok
+        print(f"{name:<26} {stmts:>5} -> {stmts_after:<5} {rows:>6} -> {rows_after:<6} {'ok' if ok else 'GREW'}")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check CRUD query and row counts do not depend on table size.")
+    parser.add_argument("--rows", type=int, default=2000, help="Predictions added between the two measurements")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.rows))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""convert_embedding_storage.py
+Switch the stored embeddings between `vector` (float32) and `halfvec`
+(float16).
+
+Converts `predictions.embedding` (every partition) and
+`training_samples.embedding` with ``ALTER COLUMN ... TYPE``, one table per
+transaction; tables already of the requested type are left alone.  The
+rewrite rebuilds each table and its indexes, HNSW included (they index
+``embedding::halfvec(2944)`` and work with either type), under an ACCESS
+EXCLUSIVE lock, so stop the API or expect writes to wait until it is done.
+Converting to `halfvec` rounds every stored embedding to float16; see
+`report_halfvec_quality` for what that costs.
+
+This is deliberately not an Alembic revision: the migrations always
+create `vector` columns, and the storage type is an operational choice
+made per database.  Afterwards run the API with a matching
+``EMBEDDING_STORAGE``; it refuses to start otherwise.  Needs `DATABASE_URL`.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.convert_embedding_storage halfvec --dry-run
+    python -m app.scripts.convert_embedding_storage halfvec --maintenance-work-mem 2GB
+    python -m app.scripts.convert_embedding_storage vector
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.crud.predictions_help import EMBEDDING_DIM, embedding_column_types
+from app.db import engine
+
+
+async def convert(target: str, maintenance_work_mem: str, dry_run: bool) -> int:
+    async with engine.connect() as conn:
+        current = await embedding_column_types(conn)
+    todo = [table for table, typname in current.items() if typname != target]
+    for table, typname in current.items():
+        print(f"{table}: {typname}")
+    if not todo:
+        print(f"already {target}")
+        return 0
+
+    for table in todo:
+        if dry_run:
+            print(f"would convert {table} to {target}({EMBEDDING_DIM})")
+            continue
+        start = time.perf_counter()
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT set_config('maintenance_work_mem', :mem, true)"),
+                               {"mem": maintenance_work_mem})
+            await conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN embedding "
+                f"TYPE {target}({EMBEDDING_DIM}) USING embedding::{target}({EMBEDDING_DIM})"
+            ))
+        print(f"converted {table} to {target} in {time.perf_counter() - start:.1f}s")
+    if not dry_run:
+        print(f"now run the API with EMBEDDING_STORAGE={target}")
+    return 0
+
+
+async def run(args) -> int:
+    try:
+        return await convert(args.target, args.maintenance_work_mem, args.dry_run)
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert stored embeddings between vector and halfvec.")
+    parser.add_argument("target", choices=("vector", "halfvec"), help="Column type to store embeddings as")
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="maintenance_work_mem for the index rebuilds")
+    parser.add_argument("--dry-run", action="store_true", help="Only show the current types and what would change")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""manage_partitions.py
+Maintain the monthly partitions of the `predictions` table.
+
+`predictions` is RANGE-partitioned on `timestamp`, one partition per UTC
+calendar month named ``predictions_yYYYYmMM``; rows outside every month
+land in ``predictions_default``.
+
+* ``ensure`` creates the partitions for this month and the next
+  `--ahead` months, plus one for every month that currently has rows in
+  the default partition (those rows are moved into it in the same
+  transaction).  Indexes, HNSW included, are created on each new
+  partition automatically.  Safe to run repeatedly; the container
+  entrypoint runs it after the migrations.
+* ``retention`` detaches every partition whose month ended more than
+  `--keep-months` months ago, then drops it or, with ``--archive``, moves
+  it to the ``archive`` schema.  Dedup fingerprints pointing at the
+  removed rows are deleted, as are idempotency keys older than the cutoff.
+
+Defaults come from `service.partitions` in `config.yaml`.  Needs
+`DATABASE_URL`.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.manage_partitions ensure
+    python -m app.scripts.manage_partitions ensure --ahead 6
+    python -m app.scripts.manage_partitions retention --keep-months 12 --dry-run
+    python -m app.scripts.manage_partitions retention --keep-months 12 --archive
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import yaml  # type: ignore[import-not-found]
+from sqlalchemy import text
+
+from app.db import engine
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+PARENT = "predictions"
+DEFAULT_PARTITION = "predictions_default"
+ARCHIVE_SCHEMA = "archive"
+_NAME = re.compile(r"^predictions_y(\d{4})m(\d{2})$")
+
+
+def _add_months(month: date, n: int) -> date:
+    y, m = divmod(month.month - 1 + n, 12)
+    return date(month.year + y, m + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"{PARENT}_y{month:%Y}m{month:%m}"
+
+
+def _bound(month: date) -> str:
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def _this_month() -> date:
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+async def _monthly_partitions(conn) -> Dict[date, str]:
+    """Month -> name of every monthly partition currently attached."""
+    rows = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": PARENT})
+    found = {}
+    for (name,) in rows:
+        match = _NAME.match(name)
+        if match:
+            found[date(int(match[1]), int(match[2]), 1)] = name
+    return found
+
+
+async def _create_partition(conn, month: date) -> int:
+    """Create `month`'s partition, moving its rows out of the default
+    partition first (Postgres refuses the new partition otherwise).
+    Returns the number of rows moved."""
+    lo, hi = _bound(month), _bound(_add_months(month, 1))
+    await conn.execute(text(f"CREATE TEMP TABLE _moved (LIKE {PARENT}) ON COMMIT DROP"))
+    moved = await conn.execute(text(
+        f"WITH gone AS (DELETE FROM {DEFAULT_PARTITION} "
+        f'WHERE "timestamp" >= {lo} AND "timestamp" < {hi} RETURNING *) '
+        f"INSERT INTO _moved SELECT * FROM gone"
+    ))
+    await conn.execute(text(
+        f"CREATE TABLE {_partition_name(month)} PARTITION OF {PARENT} FOR VALUES FROM ({lo}) TO ({hi})"
+    ))
+    await conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM _moved"))
+    await conn.execute(text("DROP TABLE _moved"))
+    return moved.rowcount
+
+
+def month_of(ts: datetime) -> date:
+    """First day of the UTC month `ts` falls in (its partition's month)."""
+    return ts.astimezone(timezone.utc).date().replace(day=1)
+
+
+async def ensure_months(months: Iterable[date]) -> List[Tuple[str, int]]:
+    """Create the partitions missing for `months` (first days of months).
+    Returns ``(partition, rows moved from default)`` for each one created."""
+    async with engine.connect() as conn:
+        existing = await _monthly_partitions(conn)
+    created = []
+    for month in sorted(set(months) - set(existing)):
+        # One transaction per month keeps the lock on the default partition short
+        async with engine.begin() as conn:
+            moved = await _create_partition(conn, month)
+        created.append((_partition_name(month), moved))
+    return created
+
+
+async def ensure(ahead: int) -> int:
+    async with engine.connect() as conn:
+        stray = await conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE 'UTC')::date "
+            f"FROM {DEFAULT_PARTITION}"
+        ))
+        wanted = {_add_months(_this_month(), n) for n in range(ahead + 1)}
+        wanted.update(month for (month,) in stray)
+
+    created = await ensure_months(wanted)
+    for name, moved in created:
+        print(f"created {name}" + (f" ({moved} rows moved from default)" if moved else ""))
+    if not created:
+        print("all partitions present")
+    return 0
+
+
+async def retention(keep_months: int, archive: bool, dry_run: bool) -> int:
+    cutoff = _add_months(_this_month(), -keep_months)
+    async with engine.connect() as conn:
+        expired: List[str] = [name for month, name in sorted((await _monthly_partitions(conn)).items())
+                              if month < cutoff]
+    if not expired:
+        print(f"nothing older than {cutoff:%Y-%m}")
+        return 0
+
+    action = f"archive to {ARCHIVE_SCHEMA}" if archive else "drop"
+    for name in expired:
+        if dry_run:
+            print(f"would {action} {name}")
+            continue
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            # Dedup must not hand out record ids that no longer resolve
+            await conn.execute(text(
+                f"DELETE FROM prediction_fingerprints f USING {name} p WHERE f.prediction_id = p.id"
+            ))
+            if archive:
+                await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+                await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            else:
+                await conn.execute(text(f"DROP TABLE {name}"))
+        print(f"{'archived' if archive else 'dropped'} {name}")
+
+    if not dry_run:
+        async with engine.begin() as conn:
+            keys = await conn.execute(
+                text("DELETE FROM idempotency_keys WHERE created_at < :cutoff"),
+                {"cutoff": datetime(cutoff.year, cutoff.month, 1, tzinfo=timezone.utc)},
+            )
+        print(f"deleted {keys.rowcount} idempotency keys older than {cutoff:%Y-%m}")
+    return 0
+
+
+async def run(args) -> int:
+    try:
+        if args.command == "ensure":
+            return await ensure(args.ahead)
+        return await retention(args.keep_months, args.archive, args.dry_run)
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Create future and drop expired monthly prediction partitions.")
+    parser.add_argument("--config", type=Path, default=APP_DIR / "config.yaml", help="Path to config.yaml")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ens = sub.add_parser("ensure", help="Create partitions for the coming months")
+    ens.add_argument("--ahead", type=int, default=None, help="Months ahead of the current one to cover")
+    ret = sub.add_parser("retention", help="Drop or archive partitions older than the retention window")
+    ret.add_argument("--keep-months", type=int, default=None, help="Full months kept before the current one")
+    ret.add_argument("--archive", action="store_true", default=None, help="Move to the archive schema instead of dropping")
+    ret.add_argument("--dry-run", action="store_true", help="Only list what would be removed")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        opts = ((yaml.safe_load(f) or {}).get("service") or {}).get("partitions") or {}
+    if args.command == "ensure":
+        if args.ahead is None:
+            args.ahead = opts.get("months_ahead", 3)
+    else:
+        if args.keep_months is None:
+            args.keep_months = opts.get("retention_months")
+        if args.keep_months is None:
+            parser.error("no --keep-months given and service.partitions.retention_months is not set")
+        if args.keep_months < 0:
+            parser.error("--keep-months must be >= 0")
+        if args.archive is None:
+            args.archive = opts.get("archive", False)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""report_halfvec_quality.py
+Report what half-precision embedding storage (`EMBEDDING_STORAGE=halfvec`)
+costs in quality.
+
+Embeds a CSV payload with the active model, rounds the embeddings to
+float16 as `halfvec` storage would, and compares against float32:
+
+* storage per embedding,
+* nearest-neighbour recall@k (euclidean and cosine) within the payload,
+* score / risk-level drift when a stored embedding is re-scored,
+* risk drivers when explanations reuse the stored embedding instead of
+  re-embedding `features_json`.
+
+Runs offline; no database is needed.
+
+Usage (from `src/app`):
+
+    python -m app.scripts.report_halfvec_quality
+    python -m app.scripts.report_halfvec_quality --csv test_data/test_payload.csv --k 10 --explain 100
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+import numpy as np  # type: ignore[import-not-found]
+
+from app.logging.logging_config import setup_logging
+from app.service_loader import ServiceLoader
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+
+def _topk(dist: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest distances per row, excluding the row itself."""
+    dist = dist.copy()
+    np.fill_diagonal(dist, np.inf)
+    return np.argpartition(dist, k, axis=1)[:, :k]
+
+
+def _l2(x: np.ndarray) -> np.ndarray:
+    sq = (x * x).sum(axis=1)
+    return np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * x @ x.T, 0.0))
+
+
+def _cosine(x: np.ndarray) -> np.ndarray:
+    unit = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+    return 1.0 - unit @ unit.T
+
+
+def _recall(full: np.ndarray, half: np.ndarray, metric, k: int) -> float:
+    truth = _topk(metric(full), k)
+    found = _topk(metric(half), k)
+    hits = sum(len(set(t).intersection(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare float32 and halfvec embedding storage.")
+    parser.add_argument("--config", type=Path, default=APP_DIR / "config.yaml", help="Path to config.yaml")
+    parser.add_argument("--csv", type=Path, default=APP_DIR / "test_data" / "test_payload_large.csv", help="Payload CSV")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query for recall@k")
+    parser.add_argument("--explain", type=int, default=50, help="Non-low-risk rows whose risk drivers are compared")
+    args = parser.parse_args(argv)
+
+    setup_logging("WARNING")
+    loader = ServiceLoader(args.config)
+    em = loader.embedding_manager
+    ps = loader.prediction_service
+
+    with open(args.csv, newline="") as f:
+        rows = [{k: row[k] for k in em.feature_order} for row in csv.DictReader(f)]
+    if len(rows) <= args.k:
+        raise SystemExit(f"Need more than k={args.k} rows, got {len(rows)}")
+
+    full = em.embed_many(rows)
+    half = full.astype(np.float16).astype(np.float32)
+    flat_full = full.reshape(len(full), -1).astype(np.float64)
+    flat_half = half.reshape(len(half), -1).astype(np.float64)
+    dim = flat_full.shape[1]
+
+    scores_full, levels_full = ps.predict_batch(full)
+    scores_half, levels_half = ps.predict_batch(half)
+    changed = np.flatnonzero(levels_full != levels_half)
+
+    print(f"rows:                    {len(rows)}")
+    print(f"bytes per embedding:     vector {4 * dim + 8}  halfvec {2 * dim + 8}")
+    print(f"max abs rounding error:  {float(np.abs(full - half).max()):.3e}")
+    print(f"recall@{args.k} euclidean:    {_recall(flat_full, flat_half, _l2, args.k):.4f}")
+    print(f"recall@{args.k} cosine:       {_recall(flat_full, flat_half, _cosine, args.k):.4f}")
+    print(f"max score delta:         {float(np.abs(scores_full - scores_half).max()):.3e}")
+    print(f"risk-level changes:      {len(changed)}")
+
+    # Explanations reusing the stored (rounded) embedding instead of re-embedding
+    explainer = loader.explanation_service
+    candidates = np.flatnonzero(levels_full > 0)[:args.explain]
+    same = 0
+    for i in candidates:
+        drivers_full = explainer._get_risk_drivers(full[i])
+        drivers_half = explainer._get_risk_drivers(half[i])
+        same += drivers_full == drivers_half
+    if len(candidates):
+        print(f"identical risk drivers:  {same}/{len(candidates)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
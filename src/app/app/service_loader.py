@@ -8,6 +8,7 @@ from pathlib import Path
 import torch # type: ignore[import-not-found]
 from sentence_transformers import SentenceTransformer # type: ignore[import-not-found]
 import os
+import json
 import logging
 logger = logging.getLogger(__name__)
 import yaml # type: ignore[import-not-found]
@@ -15,15 +16,28 @@ import yaml # type: ignore[import-not-found]
 from app.services.embedding_service import EmbeddingManager
 from app.services.prediction_service import PredictionService
 from app.services.explanation_service import ExplanationService
+from app.services.batching import MicroBatcher
+from app.services.inference_executor import InferenceExecutor
+from app.services.embedding_cache import EmbeddingCache
+from app.services.vocab_tables import load_vocab_tables
+from app.services.write_behind import WriteBehindWriter
+from app.services.dedup import PredictionDeduplicator
+from app.db import async_factory
 from app.schemas import AppConfig
 
 
 class ServiceLoader:
     """Central factory responsible for constructing the main service
     components (embedding, prediction, explanation) based on the YAML
-    configuration file."""
+    configuration file.
+
+    With ``inference_only=True`` only the `EmbeddingManager` and
+    `PredictionService` are built (no executor, batcher, explanation
+    service, write-behind writer or deduplicator); offline jobs such as
+    the backfill workers use this and manage torch threads themselves.
+    """
     # Initialize config file & services
-    def __init__(self, config_path):
+    def __init__(self, config_path, inference_only=False):
         # Load config file safely
         with open(config_path) as config:
             raw = yaml.safe_load(config)
@@ -34,11 +48,16 @@ class ServiceLoader:
         self.model_cfg = cfg.models[active_id]
         self.base_dir = Path(config_path).parent
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.inference_only = inference_only
 
         # Initialize services
         self.embedding_manager = None
         self.prediction_service = None
         self.explanation_service = None
+        self.batcher = None
+        self.executor = None
+        self.write_behind = None
+        self.dedup = None
         
         self._load_services()
 
@@ -53,12 +72,20 @@ class ServiceLoader:
 
         # Instantiate model
         if self.model_cfg.type == 'pytorch':
+            # Executor first: it fixes torch's thread policy before any model work
+            if not self.inference_only:
+                self._build_executor()
             # Dynamic import of model class name ex. EmbeddingCNN2D
             imp = importlib.import_module(module_path)
             model_class = getattr(imp, class_name)
             self._build_prediction_service(model_class, model_weights_path)
             self._build_embedding_manager()
+            if self.inference_only:
+                return
             self._build_explanation_service()
+            self._build_batcher()
+            self._build_write_behind()
+            self.dedup = PredictionDeduplicator.from_config(self.cfg.service)
         else:
             raise NotImplementedError("Only 'pytorch' model types are currently supported.")
     
@@ -90,7 +117,20 @@ class ServiceLoader:
         embedder_name = self.model_cfg.embedding.embedder_name
         embedd_model = SentenceTransformer(embedder_name)
 
-        self.embedding_manager = EmbeddingManager(embedd_model, self.model_cfg, self.device)
+        cache = EmbeddingCache.from_config(self.cfg.service)
+
+        self.embedding_manager = EmbeddingManager(embedd_model, self.model_cfg, self.device, cache=cache)
+
+        # Memory-map precomputed tables for closed-vocabulary text columns
+        if self.model_cfg.embedding.vocab_dir:
+            em = self.embedding_manager
+            em.vocab_tables = load_vocab_tables(
+                self.base_dir / self.model_cfg.embedding.vocab_dir,
+                em.feature_order if em.strategy == "value_only" else em.text_cols,
+                embedder=em.embedder_name,
+                normalized=em.normalize_text,
+                dim=em.text_dim,
+            )
     
     def _build_explanation_service(self):
         """
@@ -98,5 +138,41 @@ class ServiceLoader:
         prediction_service = self.prediction_service
         embedding_manager = self.embedding_manager
 
-        self.explanation_service = ExplanationService(prediction_service, embedding_manager, self.cfg, self.model_cfg)
+        self.explanation_service = ExplanationService(
+            prediction_service, embedding_manager, self.cfg, self.model_cfg, executor=self.executor)
+
+
+
+    def _build_executor(self):
+        """Create the bounded `InferenceExecutor` every CPU-heavy route
+        path runs on."""
+        self.executor = InferenceExecutor.from_config(self.cfg.service)
+
+    def _build_batcher(self):
+        """Create the `MicroBatcher` that merges concurrent `/predict`
+        calls; its worker is started from the FastAPI startup event."""
+        self.batcher = MicroBatcher.from_config(
+            self.embedding_manager,
+            self.prediction_service,
+            self.executor,
+            self.cfg.service,
+        )
+
+    def _build_write_behind(self):
+        """Create the optional `WriteBehindWriter` for prediction rows; it
+        replays its spool and starts flushing from the FastAPI startup event."""
+        self.write_behind = WriteBehindWriter.from_config(async_factory, self.cfg.service, self.base_dir)
 
+    def prewarm_vocab(self) -> dict:
+        """Read the optional `service.embedding_cache.prewarm_vocab_path`
+        file, a JSON mapping of column name to a list of known values."""
+        opts = self.cfg.service.get("embedding_cache") or {}
+        path = opts.get("prewarm_vocab_path")
+        if not path:
+            return {}
+        path = self.base_dir / path
+        if not path.exists():
+            logger.warning("Embedding-cache vocabulary file %s not found; skipping", path)
+            return {}
+        with open(path) as f:
+            return json.load(f)
@@ -0,0 +1,223 @@
+"""batching.py
+Dynamic micro-batching for single-row `/predict` calls.
+
+Concurrent requests are parked on an asyncio queue; a background worker
+drains the queue into batches of up to `max_batch_size` rows (waiting at
+most `max_wait_ms` after the first row arrives) and runs one
+`embed_many` + `predict_batch` per batch on the `InferenceExecutor`.
+Each caller receives its own embedding row and `RiskResult`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np  # type: ignore[import-not-found]
+
+from app.schemas import RiskResult
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the queue-wait histogram buckets; last bucket is +inf
+WAIT_BUCKETS_MS = (1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 1000.0)
+
+
+@dataclass
+class _Pending:
+    """A single queued request waiting to be batched."""
+    features: Dict[str, Any]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class BatchingMetrics:
+    """Counters describing batch sizes and time spent waiting in the queue."""
+    batches: int = 0
+    rows: int = 0
+    batch_sizes: Counter = field(default_factory=Counter)
+    wait_count: int = 0
+    wait_sum_ms: float = 0.0
+    wait_max_ms: float = 0.0
+    wait_buckets: List[int] = field(default_factory=lambda: [0] * (len(WAIT_BUCKETS_MS) + 1))
+
+    def observe_batch(self, size: int) -> None:
+        self.batches += 1
+        self.rows += size
+        self.batch_sizes[size] += 1
+
+    def observe_wait(self, wait_ms: float) -> None:
+        self.wait_count += 1
+        self.wait_sum_ms += wait_ms
+        self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+        self.wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{b:g}ms" for b in WAIT_BUCKETS_MS] + ["inf"]
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": round(self.rows / self.batches, 3) if self.batches else 0.0,
+            "batch_size_distribution": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            "queue_wait_ms": {
+                "count": self.wait_count,
+                "mean": round(self.wait_sum_ms / self.wait_count, 3) if self.wait_count else 0.0,
+                "max": round(self.wait_max_ms, 3),
+                "histogram": dict(zip(labels, self.wait_buckets)),
+            },
+        }
+
+
+class MicroBatcher:
+    """Asyncio micro-batcher in front of `EmbeddingManager` and `PredictionService`.
+
+    Parameters
+    ----------
+    embedding_manager : EmbeddingManager
+        Provides `embed_many` for the merged rows.
+    prediction_service : PredictionService
+        Provides `predict_batch` / `to_results` for the merged embeddings.
+    executor : InferenceExecutor
+        Pool the batched work runs on, keeping the event loop free.
+    enabled : bool
+        When False, `submit` scores each request on its own (no queueing).
+    max_batch_size : int
+        Maximum number of rows merged into one batch.
+    max_wait_ms : float
+        Maximum time the first row of a batch waits for company.
+    """
+    def __init__(self, embedding_manager, prediction_service, executor, *, enabled: bool = True,
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+        self.embedding_manager = embedding_manager
+        self.prediction_service = prediction_service
+        self.executor = executor
+        self.enabled = bool(enabled)
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.metrics = BatchingMetrics()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Batches handed to the executor and not yet resolved
+        self._in_flight: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_config(cls, embedding_manager, prediction_service, executor, service_cfg: dict) -> "MicroBatcher":
+        """Build a batcher from the `service.batching` section of `config.yaml`."""
+        opts = service_cfg.get("batching") or {}
+        return cls(
+            embedding_manager,
+            prediction_service,
+            executor,
+            enabled=opts.get("enabled", True),
+            max_batch_size=opts.get("max_batch_size", 32),
+            max_wait_ms=opts.get("max_wait_ms", 5),
+        )
+
+    async def start(self) -> None:
+        """Start the background worker; must be called from the running event loop."""
+        if not self.enabled or self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run(), name="micro-batcher")
+        logger.info("Micro-batcher started (max_batch_size=%d, max_wait_ms=%.1f)",
+                    self.max_batch_size, self.max_wait * 1000.0)
+
+    async def stop(self) -> None:
+        """Stop the worker and fail any request still waiting in the queue."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Service shutting down"))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, features: Dict[str, Any]) -> Tuple[np.ndarray, RiskResult]:
+        """Queue one feature payload and wait for its `(embedding, RiskResult)`.
+
+        Input validation runs here, in the caller's own request, so a bad
+        payload never poisons the batch it would have joined.
+        """
+        self.embedding_manager.validate(features)
+        if not self.enabled or self._worker is None:
+            embeddings, results = await self.executor.run(self._score, [features])
+            return embeddings[0], results[0]
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(features, future, time.perf_counter()))
+        return await future
+
+    async def _run(self) -> None:
+        """Collect queued requests into batches and score them."""
+        assert self._queue is not None
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    # Deadline passed: take whatever is already queued, no waiting
+                    while len(batch) < self.max_batch_size and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Hand the batch off and go straight back to collecting the next
+            # one; the executor bounds how many batches run at once.
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[_Pending]) -> None:
+        """Score one batch and resolve each caller's future."""
+        now = time.perf_counter()
+        for pending in batch:
+            self.metrics.observe_wait((now - pending.enqueued_at) * 1000.0)
+
+        # Callers that disconnected while queued do not need scoring
+        batch = [p for p in batch if not p.future.done()]
+        if not batch:
+            return
+        self.metrics.observe_batch(len(batch))
+
+        try:
+            embeddings, results = await self.executor.run(self._score, [p.features for p in batch])
+        except Exception as exc:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
+            return
+
+        for pending, embedding, result in zip(batch, embeddings, results):
+            if not pending.future.done():
+                pending.future.set_result((embedding, result))
+
+    def _score(self, rows: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[RiskResult]]:
+        """Batched embed + forward pass for `rows`."""
+        embeddings = self.embedding_manager.embed_many(rows)
+        scores, levels = self.prediction_service.predict_batch(embeddings)
+        return embeddings, self.prediction_service.to_results(scores, levels)
@@ -0,0 +1,207 @@
+"""dedup.py
+Content-addressed deduplication of scored feature payloads.
+
+A payload's fingerprint is the sha256 of the model id, the scoring
+version (a digest of `risk_categories` and the service version, so new
+thresholds never reuse old risk levels) and its canonical `features_json`
+(sorted keys, values as the strings the embedder sees).
+Retries, re-uploaded CSVs and UI re-submits of the same payload are then
+answered with the prediction already stored for it, skipping embedding,
+inference and another 2944-d row.  Results are looked up in a bounded
+in-process LRU first and in the `prediction_fingerprints` table second.
+The LRU only learns a fingerprint once the session that found or stored
+it has committed, so a rolled-back request never leaves ids behind that
+do not exist.  Entries expire after `ttl_s`: partition retention deletes
+the DB fingerprints of dropped rows but cannot reach other workers' LRUs,
+so a cached id outlives its row by at most that long.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import event  # type: ignore[import-not-found]
+from sqlalchemy.ext.asyncio import AsyncSession  # type: ignore[import-not-found]
+
+from app.crud.dedup import get_fingerprints, insert_fingerprints
+from app.crud.predictions_help import DEFAULT_TEAM_ID
+
+# `Session.info` key holding the results waiting for that session's commit
+_PENDING = "dedup_pending"
+
+
+def scoring_version(service_cfg: Mapping[str, Any]) -> str:
+    """Digest of the settings that turn a score into a stored result:
+    the `risk_categories` thresholds and the service `version`."""
+    canonical = json.dumps(
+        {"risk_categories": service_cfg.get("risk_categories"), "version": service_cfg.get("version")},
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def payload_fingerprint(model_id: UUID, features: Mapping[str, Any], scoring: str = "") -> bytes:
+    """sha256 of `model_id`, the `scoring` version and the canonical form
+    of `features`.
+
+    Values are compared as ``str(value)``, which is what both text and
+    numeric embedding start from, so ``5000`` and ``"5000"`` match.
+    """
+    canonical = json.dumps(
+        {"model_id": str(model_id), "scoring": scoring,
+         "features": {str(k): str(v) for k, v in features.items()}},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+
+def request_fingerprint(endpoint: str, fingerprints: Sequence[bytes]) -> bytes:
+    """sha256 identifying a whole request (endpoint plus ordered payloads)."""
+    digest = hashlib.sha256(endpoint.encode("utf-8"))
+    for fp in fingerprints:
+        digest.update(fp)
+    return digest.digest()
+
+
+@dataclass(frozen=True)
+class StoredResult:
+    """Result previously stored for a fingerprint."""
+    prediction_id: UUID
+    risk_score: float
+    risk_level: int
+
+
+class PredictionDeduplicator:
+    """LRU plus `prediction_fingerprints` lookups for repeated payloads.
+
+    Parameters
+    ----------
+    enabled : bool
+        When False, `lookup` finds nothing and `remember` stores nothing.
+    max_entries : int
+        Fingerprints kept in memory before the least recently used is evicted.
+    ttl_s : float
+        Seconds an in-memory entry is trusted before it is looked up again.
+    scoring : str
+        `scoring_version` of the running configuration, mixed into every
+        fingerprint.
+    """
+    def __init__(self, *, enabled: bool = False, max_entries: int = 100_000, ttl_s: float = 300.0,
+                 scoring: str = ""):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if ttl_s <= 0:
+            raise ValueError("ttl_s must be > 0")
+        self.enabled = bool(enabled)
+        self.max_entries = int(max_entries)
+        self.ttl_s = float(ttl_s)
+        self.scoring = scoring
+        # fingerprint -> (result, expiry on the monotonic clock); only touched
+        # from the event loop thread, so no lock is needed
+        self._lru: "OrderedDict[bytes, Tuple[StoredResult, float]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, service_cfg: dict) -> "PredictionDeduplicator":
+        """Build from the `service.dedup` section of `config.yaml`."""
+        opts = service_cfg.get("dedup") or {}
+        return cls(enabled=opts.get("enabled", False), max_entries=opts.get("max_entries", 100_000),
+                   ttl_s=opts.get("ttl_s", 300.0), scoring=scoring_version(service_cfg))
+
+    def fingerprint(self, model_id: UUID, features: Mapping[str, Any]) -> bytes:
+        """`payload_fingerprint` under this deduplicator's scoring version."""
+        return payload_fingerprint(model_id, features, self.scoring)
+
+    def _remember_local(self, fingerprint: bytes, result: StoredResult) -> None:
+        self._lru[fingerprint] = (result, time.monotonic() + self.ttl_s)
+        self._lru.move_to_end(fingerprint)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _remember_after_commit(self, session: AsyncSession, results: Mapping[bytes, StoredResult]) -> None:
+        """Add `results` to the LRU once `session` commits; drop them if it
+        rolls back instead."""
+        sync = session.sync_session
+        pending = sync.info.get(_PENDING)
+        if pending is None:
+            pending = sync.info[_PENDING] = {}
+
+            def after_commit(s) -> None:
+                for fp, result in s.info.pop(_PENDING, {}).items():
+                    self._remember_local(fp, result)
+
+            def after_rollback(s) -> None:
+                s.info.pop(_PENDING, None)
+
+            event.listen(sync, "after_commit", after_commit, once=True)
+            event.listen(sync, "after_rollback", after_rollback, once=True)
+        pending.update(results)
+
+    async def lookup(self, session: AsyncSession, fingerprints: Sequence[bytes],
+                     team_id: UUID = DEFAULT_TEAM_ID) -> Dict[bytes, StoredResult]:
+        """Stored results for whichever of `fingerprints` were seen before."""
+        if not self.enabled:
+            return {}
+        found: Dict[bytes, StoredResult] = {}
+        missing = []
+        now = time.monotonic()
+        for fp in dict.fromkeys(fingerprints):
+            entry = self._lru.get(fp)
+            if entry is not None and entry[1] <= now:
+                del self._lru[fp]
+                entry = None
+            if entry is None:
+                missing.append(fp)
+            else:
+                self._lru.move_to_end(fp)
+                found[fp] = entry[0]
+                self.memory_hits += 1
+
+        if missing:
+            rows = await get_fingerprints(session, missing, team_id)
+            for fp, row in rows.items():
+                found[fp] = StoredResult(row.prediction_id, row.risk_score, row.risk_level)
+            if rows:
+                self._remember_after_commit(session, {fp: found[fp] for fp in rows})
+            self.db_hits += len(rows)
+            self.misses += len(missing) - len(rows)
+        return found
+
+    async def remember(self, session: AsyncSession, model_id: UUID, results: Mapping[bytes, StoredResult],
+                       team_id: UUID = DEFAULT_TEAM_ID) -> None:
+        """Record freshly scored payloads; an existing fingerprint row wins.
+        The LRU picks them up when `session` commits."""
+        if not self.enabled or not results:
+            return
+        await insert_fingerprints(session, [
+            {
+                "team_id": team_id,
+                "fingerprint": fp,
+                "model_id": model_id,
+                "prediction_id": result.prediction_id,
+                "risk_score": result.risk_score,
+                "risk_level": result.risk_level,
+            }
+            for fp, result in results.items()
+        ])
+        self._remember_after_commit(session, results)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+        }
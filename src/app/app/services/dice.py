@@ -1,6 +1,9 @@
+import logging
 import numpy as np
 import math
 
+logger = logging.getLogger(__name__)
+
 class DICE:
     '''
     DICE class turns numbers into their respective DICE embeddings
@@ -8,7 +11,9 @@ class DICE:
     Since the cosine function decreases monotonically between 0 and pi, simply employ a linear mapping
     to map distances s_n \in [0, |a-b|] to angles \theta \in [0, pi]
     '''
-    def __init__(self, d=32, min_bound=0, max_bound=100, norm="l2", seed: int = 13):
+    def __init__(self, d=32, min_bound=0, max_bound=100, norm="l2", seed: int = 13,
+                 mode: str = "exact", lut_size: int = 4096, interpolate: bool = True,
+                 tolerance: float = 1e-4):
         # Minimal POC tweaks:
         # - deterministic basis via fixed seed
         # - keep API mostly the same
@@ -23,44 +28,109 @@ class DICE:
         rng = np.random.default_rng(self.seed)
         self.M = rng.normal(0.0, 1.0, (self.d, self.d))
         self.Q, self.R = np.linalg.qr(self.M, mode="complete")  # Orthonormal basis Q
-    
-    def __linear_mapping(self, num):
-        """Map value linearly from [min_bound, max_bound] to angle in [0, pi].
+        # float32 copy of the basis, transposed once so batches are a single matmul
+        self._QT32 = np.ascontiguousarray(self.Q.astype(np.float32).T)
+        self._QT32.setflags(write=False)
+
+        # Optional lookup-table mode: the angle is a clamped linear map of the
+        # value, so embeddings can be precomputed on a grid of angles
+        if mode not in ("exact", "lut"):
+            raise ValueError("Wrong value for `mode`. Expected 'exact' or 'lut'.")
+        self.mode = "exact"
+        self.lut_max_error = 0.0
+        if mode == "lut":
+            self._build_lut(int(lut_size), bool(interpolate), float(tolerance))
+
+    def _build_lut(self, size, interpolate, tolerance):
+        """Precompute `size` embeddings over [0, pi] and measure the worst
+        deviation from the exact encoding. Stays in exact mode if that
+        deviation exceeds `tolerance`.
+        """
+        if size < 2:
+            raise ValueError("Wrong value for `lut_size`. `lut_size` should be greater than or equal to 2.")
+        self.lut_size = size
+        self.interpolate = interpolate
+        self._lut = self._exact(np.linspace(0.0, 1.0, size))
+        self._lut.setflags(write=False)
+
+        # Probe between grid points, where lookup error peaks
+        probe = np.linspace(0.0, 1.0, 4 * (size - 1) + 1)
+        error = float(np.abs(self._lookup(probe) - self._exact(probe)).max())
+        if error > tolerance:
+            logger.warning(
+                "DICE lookup table (size=%d, interpolate=%s) deviates by %.2e > tolerance %.2e; using exact encoding",
+                size, interpolate, error, tolerance)
+            del self._lut
+            return
+        self.mode = "lut"
+        self.lut_max_error = error
+
+    def _unit_position(self, values):
+        """Map values linearly from [min_bound, max_bound] onto [0, 1].
         Clamps outside values. Guards against zero range.
         """
+        values = np.asarray(values, dtype=np.float64)
         span = self.max_bound - self.min_bound
         if span == 0:
-            return 0.0
-        t = (float(num) - self.min_bound) / span
-        # clamp to [0, 1]
-        if t < 0.0:
-            t = 0.0
-        elif t > 1.0:
-            t = 1.0
-        theta = t * math.pi
-        return theta
-    
-    def make_dice(self, num):
-        r = 1.0
-        theta = self.__linear_mapping(num)
+            return np.zeros_like(values)
+        return np.clip((values - self.min_bound) / span, 0.0, 1.0)
+
+    def _polar_coords(self, theta):
+        """Polar coordinates for angles `theta`, shaped ``(N, d)``."""
+        sin = np.sin(theta)[:, np.newaxis]
+        cos = np.cos(theta)[:, np.newaxis]
         if self.d == 2:
             # DICE-2
-            polar_coord = np.array([r * math.cos(theta), r * math.sin(theta)], dtype=np.float32)
+            polar = np.hstack([cos, sin])
         elif self.d > 2:
-            # DICE-D
-            polar_coord = np.array([
-                (math.sin(theta) ** (dim - 1)) * math.cos(theta) if dim < self.d else (math.sin(theta) ** (self.d))
-                for dim in range(1, self.d + 1)
-            ], dtype=np.float32)
+            # DICE-D: sin^(k-1) * cos for k < d, sin^d for the last dimension
+            polar = np.empty((theta.shape[0], self.d), dtype=np.float64)
+            polar[:, :-1] = sin ** np.arange(self.d - 1) * cos
+            polar[:, -1:] = sin ** self.d
         else:
             # Guarded in __init__, but keep for safety
             raise ValueError("Wrong value for `d`. `d` should be greater than or equal to 2.")
+        return polar.astype(np.float32)
+
+    def make_dice(self, num):
+        """DICE embedding of a single number, shaped ``(d,)``."""
+        return self.make_dice_batch(np.array([num], dtype=np.float64))[0]
 
-        dice = np.dot(self.Q.astype(np.float32, copy=False), polar_coord)  # DICE-D embedding for `num`
+    def make_dice_batch(self, values):
+        """DICE embeddings of N numbers at once, shaped ``(N, d)`` float32.
+
+        Angles, sine powers, the basis projection and the L2 normalisation
+        are all array operations over the whole batch; in lookup-table mode
+        the whole batch is a gather (plus a blend when interpolating).
+        """
+        t = self._unit_position(np.asarray(values, dtype=np.float64).reshape(-1))
+        if self.mode == "lut":
+            return self._lookup(t)
+        return self._exact(t)
+
+    def _lookup(self, t):
+        """Table lookup for unit positions `t`; NaN inputs stay NaN."""
+        pos = t * (self.lut_size - 1)
+        if not self.interpolate:
+            idx = np.rint(np.nan_to_num(pos)).astype(np.intp)
+            dice = self._lut[idx]
+        else:
+            lo = np.clip(np.floor(np.nan_to_num(pos)).astype(np.intp), 0, self.lut_size - 2)
+            w = (pos - lo)[:, np.newaxis].astype(np.float32)
+            dice = self._lut[lo] * (1.0 - w) + self._lut[lo + 1] * w
+            if self.norm == "l2":
+                n = np.linalg.norm(dice, axis=1, keepdims=True)
+                np.divide(dice, n, out=dice, where=n > 0)
+        dice[np.isnan(t)] = np.nan
+        return dice.astype(np.float32, copy=False)
+
+    def _exact(self, t):
+        """Exact DICE embeddings for unit positions `t`."""
+        theta = t * math.pi
+        dice = self._polar_coords(theta) @ self._QT32  # DICE-D embedding for every value
 
         if self.norm == "l2":
-            n = float(np.linalg.norm(dice))
-            if n > 0:
-                dice = dice / n
+            n = np.linalg.norm(dice, axis=1, keepdims=True)
+            np.divide(dice, n, out=dice, where=n > 0)
 
-        return dice.astype(np.float32, copy=False)
\ No newline at end of file
+        return dice.astype(np.float32, copy=False)
@@ -0,0 +1,83 @@
+"""embedding_cache.py
+Process-wide bounded LRU cache of text-feature embeddings.
+
+Most text columns (state, sub-grade, employment length, zip prefix, loan
+title) have a small vocabulary, so the same strings are encoded over and
+over.  Entries are keyed by ``(embedder, column, value)`` and hold the
+float32 vector exactly as `EmbeddingManager` would have produced it.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np  # type: ignore[import-not-found]
+
+
+class EmbeddingCache:
+    """Thread-safe LRU mapping of cache keys to embedding vectors.
+
+    Parameters
+    ----------
+    max_entries : int
+        Entries kept before the least recently used one is evicted.
+    """
+    def __init__(self, max_entries: int = 50_000):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = int(max_entries)
+        self._data: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, service_cfg: dict) -> Optional["EmbeddingCache"]:
+        """Build a cache from `service.embedding_cache`; None when disabled."""
+        opts = service_cfg.get("embedding_cache") or {}
+        if not opts.get("enabled", False):
+            return None
+        return cls(max_entries=opts.get("max_entries", 50_000))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[np.ndarray]]:
+        """Look up `keys`, returning the cached vector or None for each."""
+        found: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for key in keys:
+                vec = self._data.get(key)
+                if vec is None:
+                    self.misses += 1
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                found.append(vec)
+        return found
+
+    def put_many(self, keys: Sequence[Hashable], vectors: Sequence[np.ndarray]) -> None:
+        """Insert `vectors` under `keys`, evicting the oldest entries if full."""
+        with self._lock:
+            for key, vec in zip(keys, vectors):
+                # Store a read-only copy so callers cannot mutate cached state
+                vec = np.array(vec, dtype=np.float32, copy=True)
+                vec.setflags(write=False)
+                self._data[key] = vec
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
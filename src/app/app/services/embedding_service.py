@@ -5,11 +5,14 @@ using a configurable SentenceTransformer model.
 from __future__ import annotations
 from collections.abc import Mapping
 import logging
+from typing import Dict, Iterable, List, Optional, Tuple
 import numpy as np
 import json
 from app.errors import EmbeddingError
 from app.schemas import ModelConfig
 from app.services.dice import DICE
+from app.services.embedding_cache import EmbeddingCache
+from app.services.vocab_tables import VocabularyTable
 
 #replace with dynamic import when we have more than one model
 from app.constants.feature_bounds import MLP_1D_BOUNDS as BOUNDS
@@ -20,9 +23,18 @@ class EmbeddingManager:
     converts a raw feature dictionary into embeddings according to the
     strategy defined in the YAML configuration.
     """
-    def __init__(self, embed_model, model_cfg: ModelConfig, device):
+    # Texts per `encode` call; large enough that batch requests go through in few calls
+    ENCODE_BATCH_SIZE = 256
+
+    def __init__(self, embed_model, model_cfg: ModelConfig, device, cache: Optional[EmbeddingCache] = None,
+                 vocab_tables: Optional[Dict[str, VocabularyTable]] = None):
         self.model_cfg = model_cfg
         self.text_model = embed_model
+        self.embedder_name = self.model_cfg.embedding.embedder_name
+        # Optional LRU of text embeddings keyed by (embedder, column, value)
+        self.cache = cache
+        # Optional precomputed tables for closed-vocabulary columns
+        self.vocab_tables = vocab_tables or {}
         self.strategy = self.model_cfg.embedding.strategy
         self.feature_order = self.model_cfg.embedding.feature_order
         self.text_model.to(device)
@@ -32,7 +44,19 @@ class EmbeddingManager:
         
         self.numerical_cols = sorted([col for col in self.feature_order if col in BOUNDS.keys()])
         self.text_cols = sorted([col for col in self.feature_order if col not in BOUNDS.keys()])
-        self.dice_by_feature = {k: DICE(d=self.numeric_dim, min_bound=BOUNDS[k][0], max_bound=BOUNDS[k][1], seed=13) for k in self.numerical_cols}
+        self.dice_by_feature = {k: self._build_dice(k) for k in self.numerical_cols}
+
+    def _build_dice(self, col):
+        """DICE encoder for `col`, in lookup-table mode if configured for it."""
+        lut = self.model_cfg.embedding.dice_lut
+        if lut is None or col not in lut.features:
+            return DICE(d=self.numeric_dim, min_bound=BOUNDS[col][0], max_bound=BOUNDS[col][1], seed=13)
+        dice = DICE(d=self.numeric_dim, min_bound=BOUNDS[col][0], max_bound=BOUNDS[col][1], seed=13,
+                    mode="lut", lut_size=lut.size, interpolate=lut.interpolate, tolerance=lut.tolerance)
+        if dice.mode == "lut":
+            logging.getLogger(__name__).info(
+                "DICE lookup table for '%s': %d entries, max deviation %.2e", col, lut.size, dice.lut_max_error)
+        return dice
 
     def embed(self, features: dict):
         """Generate embeddings for the provided feature dictionary.
@@ -44,20 +68,195 @@ class EmbeddingManager:
 
         Returns
         -------
-        List[np.ndarray]
-            List of embedding vectors.
+        np.ndarray
+            Embedding shaped like ``input_shape`` (e.g. ``(2944,)`` or ``(9, 384)``).
         """
         self._input_validation(features)
+        return self._embed_rows([features])[0]
+
+    def embed_many(self, rows) -> np.ndarray:
+        """Generate embeddings for a batch of feature dictionaries.
+
+        Every row is validated before any encoding starts, all text values
+        from all rows go through a single `encode` call, and the result is
+        written into one preallocated float32 matrix.
+
+        Parameters
+        ----------
+        rows : Sequence[dict]
+            Feature mappings, one per row.
+
+        Returns
+        -------
+        np.ndarray
+            Matrix shaped ``(B, *input_shape)``.
+        """
+        rows = list(rows)
+        if not rows:
+            raise EmbeddingError("rows cannot be empty")
+        for i, features in enumerate(rows):
+            try:
+                self._input_validation(features)
+            except EmbeddingError as exc:
+                raise EmbeddingError(f"Row {i}: {exc}") from exc
+        return self._embed_rows(rows)
+
+    def embed_columns(self, columns: Mapping, n_rows: int) -> np.ndarray:
+        """Generate embeddings for a batch given column-wise.
+
+        Columnar counterpart of `embed_many` for file uploads: the values of
+        every `text_columns` entry must already be strings and every
+        `numeric_columns` entry an array of floats, so numerics go straight
+        into DICE without per-cell parsing.
+
+        Parameters
+        ----------
+        columns : Mapping[str, Sequence]
+            Column name to its `n_rows` values.
+        n_rows : int
+            Rows in the batch.
+
+        Returns
+        -------
+        np.ndarray
+            Matrix shaped ``(n_rows, *input_shape)``.
+        """
+        if n_rows < 1:
+            raise EmbeddingError("rows cannot be empty")
+        missing = [col for col in self.feature_order if col not in columns]
+        if missing:
+            raise EmbeddingError(f"Input payload is missing required features: {missing}")
+
+        pairs = [(col, value) for values in zip(*(columns[c] for c in self.text_columns))
+                 for col, value in zip(self.text_columns, values)]
+        if self.strategy == "value_only":
+            return self._encode_columns(pairs).reshape(n_rows, len(self.feature_order), self.text_dim)
+        if self.strategy == "hybrid_1d":
+            num_values = np.empty((n_rows, len(self.numerical_cols)), dtype=np.float64)
+            for j, col in enumerate(self.numerical_cols):
+                try:
+                    num_values[:, j] = np.asarray(columns[col], dtype=np.float64)
+                except (TypeError, ValueError) as exc:
+                    raise EmbeddingError(f"Feature '{col}' must be numeric") from exc
+            return self._assemble_hybrid_1d(pairs, num_values)
+        raise NotImplementedError(f"Embedding strategy '{self.strategy}' is not implemented.")
+
+    @property
+    def text_columns(self) -> List[str]:
+        """Columns embedded by the text model, in embedding order."""
+        return list(self.feature_order) if self.strategy == "value_only" else self.text_cols
+
+    @property
+    def numeric_columns(self) -> List[str]:
+        """Columns embedded with DICE, in embedding order."""
+        return [] if self.strategy == "value_only" else self.numerical_cols
+
+    def _embed_rows(self, rows):
+        """Dispatch already-validated rows to the configured strategy."""
         # implement with dict instead of if else
         if self.strategy == "value_only":
-            transformed = self._embed_value_only(features)
-            return transformed
+            return self._embed_value_only(rows)
         elif self.strategy == "hybrid_1d":
-            transformed = self._embed_hybrid_1d(features)
-            return transformed
+            return self._embed_hybrid_1d(rows)
         else:
             raise NotImplementedError(f"Embedding strategy '{self.strategy}' is not implemented.")
-    
+
+    @property
+    def normalize_text(self) -> bool:
+        """Whether text embeddings are L2-normalised for this strategy."""
+        return self.strategy == "hybrid_1d"
+
+    def encode_texts(self, texts):
+        """Run the text model over `texts` with the strategy's normalisation.
+
+        Returns a float32 array shaped ``(len(texts), text_dim)``.
+        """
+        embeddings = self.text_model.encode(
+            texts,
+            batch_size=self.ENCODE_BATCH_SIZE,
+            show_progress_bar=False,
+            normalize_embeddings=self.normalize_text,
+            convert_to_numpy=True,
+        )
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.text_dim)
+
+    def _encode_columns(self, pairs: List[Tuple[str, str]]):
+        """Encode ``(column, value)`` pairs.
+
+        Values found in a precomputed vocabulary table are copied straight
+        from the memory-mapped file; the rest go through `_encode_live`.
+        Returns a float32 array shaped ``(len(pairs), text_dim)``.
+        """
+        if not self.vocab_tables:
+            return self._encode_live(pairs)
+
+        out = np.empty((len(pairs), self.text_dim), dtype=np.float32)
+        live: List[int] = []
+        for i, (col, value) in enumerate(pairs):
+            table = self.vocab_tables.get(col)
+            vec = table.row(value) if table is not None else None
+            if vec is None:
+                live.append(i)
+            else:
+                out[i] = vec
+        if live:
+            out[live] = self._encode_live([pairs[i] for i in live])
+        return out
+
+    def _encode_live(self, pairs: List[Tuple[str, str]]):
+        """Encode ``(column, value)`` pairs, serving repeats from the cache.
+
+        Only distinct cache misses go to the encoder.
+        """
+        if self.cache is None:
+            return self.encode_texts([value for _, value in pairs])
+
+        keys = [(self.embedder_name, col, value) for col, value in pairs]
+        out = np.empty((len(pairs), self.text_dim), dtype=np.float32)
+        missing: Dict[tuple, List[int]] = {}
+        for i, (key, vec) in enumerate(zip(keys, self.cache.get_many(keys))):
+            if vec is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                out[i] = vec
+
+        if missing:
+            miss_keys = list(missing)
+            encoded = self.encode_texts([key[2] for key in miss_keys])
+            self.cache.put_many(miss_keys, encoded)
+            for key, vec in zip(miss_keys, encoded):
+                out[missing[key]] = vec
+        return out
+
+    def prewarm(self, values_by_column: Dict[str, Iterable]) -> int:
+        """Encode known column values into the cache ahead of traffic.
+
+        Columns that are not embedded as text are ignored. Returns the number
+        of values encoded.
+        """
+        if self.cache is None:
+            return 0
+        text_cols = set(self.text_columns)
+        pairs = [
+            (col, str(value))
+            for col, values in values_by_column.items() if col in text_cols
+            for value in dict.fromkeys(values) if value is not None
+        ]
+        # Chunk so one huge vocabulary does not hold the encoder for too long
+        for start in range(0, len(pairs), self.ENCODE_BATCH_SIZE * 4):
+            self._encode_columns(pairs[start:start + self.ENCODE_BATCH_SIZE * 4])
+        return len(pairs)
+
+    def validate(self, features) -> None:
+        """Raise `EmbeddingError` if `features` could not be embedded.
+
+        Runs the same checks as `embed` without touching the encoder, so a
+        caller can reject a bad row before it joins a shared batch.
+        """
+        self._input_validation(features)
+        if self.strategy == "hybrid_1d":
+            self._parse_numeric([features])
+
     def _input_validation(self, features):
         """Validate the input features."""
         # Mapping check
@@ -91,24 +290,38 @@ class EmbeddingManager:
             logger.warning("Ignoring unexpected feature keys: %s", extra)
                 
 
-    def _embed_value_only(self, features):
+    def _embed_value_only(self, rows):
         """Embed only the feature values as plain text."""
-        text_to_embed = [str(features[key]) for key in self.feature_order]
+        text_to_embed = [(key, str(features[key])) for features in rows for key in self.feature_order]
 
-        # Embed the text
-        embeddings = self.text_model.encode(
-            text_to_embed,
-            batch_size=32,
-            show_progress_bar=False,
-            normalize_embeddings=False,
-            convert_to_numpy=True,
-        )
-        return embeddings
-    
-    def _embed_hybrid_1d(self, features):
+        # Embed the text of every row in one call
+        embeddings = self._encode_columns(text_to_embed)
+        return embeddings.reshape(len(rows), len(self.feature_order), self.text_dim)
+
+    def _parse_numeric(self, rows):
+        """Cast the numeric columns of every row to float, shaped ``(B, N)``."""
+        values = np.empty((len(rows), len(self.numerical_cols)), dtype=np.float64)
+        for i, features in enumerate(rows):
+            for j, col in enumerate(self.numerical_cols):
+                try:
+                    values[i, j] = float(features[col])
+                except Exception as exc:
+                    where = f" (row {i})" if len(rows) > 1 else ""
+                    raise EmbeddingError(f"Feature '{col}' must be numeric; got {features[col]!r}{where}") from exc
+        return values
+
+    def _embed_hybrid_1d(self, rows):
         """Embed values, but integer values embedded using DICE.
         This is a 1D embedding strategy that embeds both text and numerical values.
         """
+        # Parse numerics first so a bad row fails before any encoding work
+        num_values = self._parse_numeric(rows)
+        vals = [(col, str(features[col])) for features in rows for col in self.text_cols]
+        return self._assemble_hybrid_1d(vals, num_values)
+
+    def _assemble_hybrid_1d(self, text_pairs: List[Tuple[str, str]], num_values: np.ndarray):
+        """Hybrid 1D matrix from row-major ``(column, text)`` pairs and the
+        parsed numeric values shaped ``(B, len(numerical_cols))``."""
         expected = len(self.text_cols)*self.text_dim + len(self.numerical_cols)*self.numeric_dim
         if expected != self.model_cfg.input_shape[0]:
             raise EmbeddingError(
@@ -116,26 +329,19 @@ class EmbeddingManager:
                 f"numeric={len(self.numerical_cols)}×{self.numeric_dim} = {expected}, "
                 f"but input_shape[0]={self.model_cfg.input_shape[0]}")
 
+        n_rows = num_values.shape[0]
+        out = np.empty((n_rows, expected), dtype=np.float32)
 
-        vals = [str(features[col]) for col in self.text_cols]
-        str_embs = self.text_model.encode(vals, batch_size=32, show_progress_bar=False, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32).reshape(-1)
-
-
-        dice_list = []
-        for col in self.numerical_cols:
-            try:
-                v = float(features[col])
-            except Exception as exc:
-                raise EmbeddingError(f"Feature '{col}' must be numeric; got {features[col]!r}") from exc
-            dice_list.append(self.dice_by_feature[col].make_dice(v))
-        num_embs = np.concatenate(dice_list, axis=0).astype(np.float32)
-
-        final = np.concatenate([str_embs, num_embs], axis=0)
-        if final.shape[0] != self.model_cfg.input_shape[0]:
-            raise EmbeddingError("Hybrid output length mismatch")
-        return final
-
+        # Strings first (sorted columns), row-major so each row is contiguous
+        text_width = len(self.text_cols) * self.text_dim
+        out[:, :text_width] = self._encode_columns(text_pairs).reshape(n_rows, text_width)
 
+        # Numerics after (sorted columns)
+        offset = text_width
+        for j, col in enumerate(self.numerical_cols):
+            out[:, offset:offset + self.numeric_dim] = self.dice_by_feature[col].make_dice_batch(num_values[:, j])
+            offset += self.numeric_dim
+        return out
 
     def _embed_key_value(self, features):
         """Embed both keys and values."""
@@ -6,9 +6,12 @@ as counterfactual generation, SHAP value computation, etc.
 from __future__ import annotations
 import json
 import logging
-from typing import List
+from typing import List, Optional, Tuple
+import numpy as np # type: ignore[import-not-found]
+import torch # type: ignore[import-not-found]
 from app.schemas import AppConfig, ModelConfig, ExplanationResponse
-import anyio # type: ignore
+from app.errors import InferenceError
+from app.model_architecture import EmbeddingMLP1D
 logger = logging.getLogger(__name__)
 
 
@@ -17,12 +20,22 @@ class ExplanationService:
     Service for generating explanations for model predictions.
     Currently only supports counterfactual explanations.
     """
-    def __init__(self, prediction_service, embedding_manager, cfg: AppConfig, model_cfg: ModelConfig):
+    def __init__(self, prediction_service, embedding_manager, cfg: AppConfig, model_cfg: ModelConfig, *, executor):
         self.cfg = cfg
+        self.executor = executor
         self.model_cfg = model_cfg
         self.prediction_service = prediction_service
         self.embedding_manager = embedding_manager
         self.feature_order = self.model_cfg.embedding.feature_order
+
+        # Multi-feature counterfactual search, used when no single swap flips the prediction
+        search_cfg = self.cfg.service.get("explanation") or {}
+        self.search = search_cfg.get("search", "single")
+        if self.search not in ("single", "beam"):
+            raise ValueError(f"Unknown explanation search '{self.search}'; expected 'single' or 'beam'")
+        self.beam_width = int(search_cfg.get("beam_width", 4))
+        self.max_depth = int(search_cfg.get("max_depth", 3))
+        self.max_evaluations = int(search_cfg.get("max_evaluations", 512))
         # Could handle path more robustly
         path = self.model_cfg.baseline_values_path
         with open(path, "r") as f:
@@ -38,6 +51,8 @@ class ExplanationService:
         if self.model_cfg.embedding.strategy == "hybrid_1d":
             # Get baseline slices for hybrid embedding
             self._get_baseline_slices()
+            # Precompute first-layer baseline projections when the model allows it
+            self._init_delta_scoring()
         else:
             self.row_index = {feature: i for i, feature in enumerate(self.feature_order)}
             self.baseline_vecs = {
@@ -74,13 +89,42 @@ class ExplanationService:
             v = float(self.baseline_values[k])
             self.baseline_slices[k] = self.embedding_manager.dice_by_feature[k].make_dice(v).astype("float32")
 
+    def _init_delta_scoring(self):
+        """
+        Precompute ``W1[:, slice] @ baseline_slice`` for every feature.
+
+        `EmbeddingMLP1D` starts with a Linear layer, so the first-layer output
+        of a counterfactual that swaps one slice equals the original output
+        plus ``W1[:, slice] @ (baseline_slice - orig_slice)``. Each
+        counterfactual then costs one small matvec plus the remaining layers
+        instead of a full-width forward pass. Other models keep using
+        stacked `predict_batch` calls.
+        """
+        self._first_layer = None
+        model = self.prediction_service.model
+        if not isinstance(model, EmbeddingMLP1D):
+            return
+        first = model.layers[0]
+        if not isinstance(first, torch.nn.Linear) or first.in_features != self.model_cfg.input_shape[0]:
+            return
+
+        device = self.prediction_service.device
+        with torch.no_grad():
+            self._slice_weights = [first.weight[:, sl] for sl in self.feature_slices.values()]  # views, (H, |slice|)
+            self._baseline_first_layer = torch.stack([
+                w @ torch.from_numpy(self.baseline_slices[f]).to(device)
+                for w, f in zip(self._slice_weights, self.feature_slices.keys())
+            ])  # (F, H)
+        self._first_layer = first
+        self._tail = model.layers[1:]
+        logger.info("Delta scoring enabled for %d counterfactual features", len(self._slice_weights))
+
     async def explain(self, input_data) -> ExplanationResponse:
         """
         Generate an explanation for a given input data
         """
         features = input_data
-        orig_embedding = self.embedding_manager.embed(features)
-        result = self.prediction_service.predict(orig_embedding)
+        orig_embedding, result = await self.executor.run(self._embed_and_predict, features)
 
         if result.risk_level == 0:
             logger.info("Prediction is low risk, no explanation needed")
@@ -91,10 +135,13 @@ class ExplanationService:
                     )
 
         # Get risk drivers
-        risk_drivers = await anyio.to_thread.run_sync(self._get_risk_drivers, orig_embedding)
+        risk_drivers, joint = await self.executor.run(self._get_risk_drivers, orig_embedding)
         
         msg = ""
-        if not risk_drivers:
+        if joint:
+            msg = (f"No single feature could reduce outcome to low risk. Swapping these {len(risk_drivers)} "
+                   "features to their baseline values together reduces it to low risk")
+        elif not risk_drivers:
             msg = "No single feature could reduce outcome to low risk. Multiple factors are contributing to this contribution being very high risk"
         
         response = ExplanationResponse(
@@ -106,27 +153,134 @@ class ExplanationService:
         logger.info("Generated explanation with %d risk drivers", len(risk_drivers))
         return response
 
-    def _get_risk_drivers(self, orig_embedding) -> List[str]:
+    def _embed_and_predict(self, features):
+        """Embed `features` and score them; runs on the inference executor."""
+        orig_embedding = self.embedding_manager.embed(features)
+        return orig_embedding, self.prediction_service.predict(orig_embedding)
+
+    def _get_risk_drivers(self, orig_embedding) -> Tuple[List[str], bool]:
         """
-        Get risk drivers for a given embedding
+        Get risk drivers for a given embedding.
+
+        All single-feature baseline swaps are scored as one batch. If none of
+        them reaches low risk and `search: beam` is configured, a beam search
+        over feature combinations looks for the smallest set whose joint swap
+        does. Returns the drivers and whether they only work jointly.
+        """
+        features = self._counterfactual_features()
+        score = self._counterfactual_scorer(orig_embedding)
+
+        singles = score(np.eye(len(features), dtype=bool))
+        levels = self.prediction_service.assign_levels(singles)
+        risk_drivers = [f for f, level in zip(features, levels) if level == 0]
+        if risk_drivers or self.search != "beam":
+            return risk_drivers, False
+
+        subset = self._beam_search(score, len(features), singles)
+        if subset is None:
+            return [], False
+        return [features[i] for i in subset], True
+
+    def _beam_search(self, score, n_features: int, single_scores) -> Optional[Tuple[int, ...]]:
+        """
+        Breadth-first beam search over feature subsets.
+
+        Each depth extends the `beam_width` best subsets by one feature and
+        scores the whole frontier as one batch, so the first hit is a
+        minimal-size set. Stops at `max_depth` or once `max_evaluations`
+        counterfactuals (including the single swaps) have been scored.
         """
-        risk_drivers = []
+        beam = [(int(i),) for i in np.argsort(single_scores, kind="stable")[:self.beam_width]]
+        evaluated = n_features
+        for _ in range(2, self.max_depth + 1):
+            # Extend better beam entries first so the budget cut drops the weakest
+            frontier = list(dict.fromkeys(
+                tuple(sorted(subset + (j,)))
+                for subset in beam for j in range(n_features) if j not in subset
+            ))[:max(self.max_evaluations - evaluated, 0)]
+            if not frontier:
+                break
+
+            masks = np.zeros((len(frontier), n_features), dtype=bool)
+            for k, subset in enumerate(frontier):
+                masks[k, list(subset)] = True
+            scores = score(masks)
+            evaluated += len(frontier)
 
-        # Loop thru features and check if they are risk drivers with cached baseline values and original embedding
+            hits = np.flatnonzero(self.prediction_service.assign_levels(scores) == 0)
+            if hits.size:
+                return frontier[hits[np.argmin(scores[hits])]]
+            beam = [frontier[i] for i in np.argsort(scores, kind="stable")[:self.beam_width]]
+        logger.debug("Beam search found no low-risk subset after %d evaluations", evaluated)
+        return None
+
+    def _counterfactual_features(self) -> List[str]:
+        """Feature names in the order counterfactual masks index them."""
         if self.model_cfg.embedding.strategy == "hybrid_1d":
-            for f in self.feature_slices.keys():
-                test_emb = orig_embedding.copy()
-                s1 = self.feature_slices[f]
-                test_emb[s1] = self.baseline_slices[f]
-                result = self.prediction_service.predict(test_emb)
-                if result.risk_level == 0:
-                    risk_drivers.append(f)
-        else:
-            for f in self.row_index:
-                test_emb = orig_embedding.copy()
-                test_emb[self.row_index[f]] = self.baseline_vecs[f]     # 1-row swap
-                result = self.prediction_service.predict(test_emb)
-                if result.risk_level == 0:
-                    risk_drivers.append(f)
-
-        return risk_drivers
\ No newline at end of file
+            return list(self.feature_slices.keys())
+        return list(self.row_index.keys())
+
+    def _counterfactual_scorer(self, orig_embedding):
+        """
+        Return ``score(masks)`` for `orig_embedding`.
+
+        `masks` is a boolean array shaped ``(K, F)``; row k marks the
+        features swapped to baseline in counterfactual k. The result is the
+        ``(K,)`` array of counterfactual probabilities, computed in one batch.
+        """
+        orig = np.asarray(orig_embedding, dtype=np.float32)
+        if self.model_cfg.embedding.strategy == "hybrid_1d" and self._first_layer is not None:
+            return self._delta_scorer(orig)
+
+        def score(masks):
+            scores, _ = self.prediction_service.predict_batch(self._stack_swaps(orig, masks))
+            return scores
+        return score
+
+    def _delta_scorer(self, orig):
+        """
+        Scorer built on the cached first-layer output of the original input.
+
+        A counterfactual's first-layer output is ``h0 + masks @ deltas`` where
+        row f of `deltas` is ``W1[:, slice_f] @ (baseline_f - orig_f)``; only
+        the remaining layers run per counterfactual.
+        """
+        device = self.prediction_service.device
+        x = torch.from_numpy(np.ascontiguousarray(orig)).to(device)
+        with torch.no_grad():
+            h0 = self._first_layer(x.unsqueeze(0))  # (1, H), bias included
+            orig_first_layer = torch.stack([
+                w @ x[sl] for w, sl in zip(self._slice_weights, self.feature_slices.values())
+            ])  # (F, H)
+            deltas = self._baseline_first_layer - orig_first_layer
+
+        def score(masks):
+            try:
+                with torch.no_grad():
+                    m = torch.from_numpy(np.asarray(masks, dtype=np.float32)).to(device)
+                    hidden = h0 + m @ deltas
+                    probs = torch.sigmoid(self._tail(hidden)).reshape(-1)
+            except Exception as exc:
+                logger.error("Counterfactual inference failed: %s", exc, exc_info=True)
+                raise InferenceError("Model inference failed") from exc
+            return probs.cpu().numpy().astype(np.float64)
+        return score
+
+    def _stack_swaps(self, orig, masks):
+        """
+        Build one counterfactual per mask row, with the marked features
+        swapped to their cached baseline values.
+
+        Returns a stacked array shaped ``(K, D)`` for hybrid embeddings or
+        ``(K, N, D)`` for the row-per-feature layout.
+        """
+        features = self._counterfactual_features()
+        batch = np.repeat(orig[np.newaxis], len(masks), axis=0)
+        for k, mask in enumerate(masks):
+            for i in np.flatnonzero(mask):
+                f = features[i]
+                if self.model_cfg.embedding.strategy == "hybrid_1d":
+                    batch[k, self.feature_slices[f]] = self.baseline_slices[f]
+                else:
+                    batch[k, self.row_index[f]] = self.baseline_vecs[f]     # 1-row swap
+        return batch
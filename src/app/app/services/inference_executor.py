@@ -0,0 +1,111 @@
+"""inference_executor.py
+Bounded thread pool that runs CPU-heavy embedding and inference work off
+the asyncio event loop.
+
+Only `max_workers` jobs run at once and at most `max_queue` more may wait;
+anything beyond that is rejected immediately with `ServiceOverloadedError`
+(mapped to HTTP 503) instead of piling up behind a slow encode.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar, Union
+
+import torch  # type: ignore[import-not-found]
+
+from app.errors import ServiceOverloadedError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class InferenceExecutor:
+    """Dedicated executor for embedding / forward-pass work.
+
+    Parameters
+    ----------
+    max_workers : int
+        Threads running inference concurrently.
+    max_queue : int
+        Jobs allowed to wait for a free thread before new ones are rejected.
+    torch_threads : int | "auto" | None
+        Intra-op threads per forward pass. ``"auto"`` splits the CPU cores
+        evenly across workers so concurrent jobs do not oversubscribe them;
+        ``None`` leaves PyTorch's default untouched.
+    """
+    def __init__(self, max_workers: int = 2, max_queue: int = 64,
+                 torch_threads: Union[int, str, None] = "auto"):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must be >= 0")
+        self.max_workers = int(max_workers)
+        self.max_queue = int(max_queue)
+
+        if torch_threads == "auto":
+            torch_threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+        if torch_threads is not None:
+            torch.set_num_threads(int(torch_threads))
+        self.torch_threads = torch.get_num_threads()
+
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        logger.info("Inference executor: %d workers, queue %d, torch threads %d",
+                    self.max_workers, self.max_queue, self.torch_threads)
+
+    @classmethod
+    def from_config(cls, service_cfg: dict) -> "InferenceExecutor":
+        """Build an executor from the `service.inference` section of `config.yaml`."""
+        opts = service_cfg.get("inference") or {}
+        return cls(
+            max_workers=opts.get("max_workers", 2),
+            max_queue=opts.get("max_queue", 64),
+            torch_threads=opts.get("torch_threads", "auto"),
+        )
+
+    @property
+    def pending(self) -> int:
+        """Jobs currently running or waiting for a thread."""
+        return self._pending
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `fn(*args, **kwargs)` on the pool and await its result.
+
+        Raises
+        ------
+        ServiceOverloadedError
+            If `max_workers + max_queue` jobs are already pending.
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ServiceOverloadedError("Inference queue is full; retry later")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+            self.completed += 1
+            return result
+        finally:
+            self._pending -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "torch_threads": self.torch_threads,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        """Stop accepting work and drop jobs that have not started yet."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -32,7 +32,10 @@ class PredictionService:
         
         self.categories = cats
         self.fallback_label = cats[-1]['code']
-    
+        # Array views of the categories for vectorised bucketing
+        self._upper_bounds = np.array([c['upper_bound'] for c in cats], dtype=np.float64)
+        self._codes = np.array([c['code'] for c in cats] + [self.fallback_label], dtype=np.int64)
+
     def predict(self, embeddings):
         """Run the forward pass of the underlying model and return a
         structured `PredictionResponse`.
@@ -44,39 +47,72 @@ class PredictionService:
             raise RuntimeError(
                 f"Expected embedding shape {self.input_shape}, got {list(arr.shape)}"
             )
+        scores, levels = self.predict_batch(arr[np.newaxis])
+        logger.debug("Predicted probability: %.5f", scores[0])
+        return self.to_results(scores, levels)[0]
+
+    def predict_batch(self, matrix):
+        """Score a stacked batch of embeddings in one forward pass.
+
+        Parameters
+        ----------
+        matrix : array-like
+            Embeddings shaped ``(B, *input_shape)``.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            ``(scores, levels)``: float64 probabilities and int64 category
+            codes, both of length ``B``.
+        """
+        arr = np.asarray(matrix, dtype=np.float32)
+        # Assert shape matches config
+        if arr.ndim != len(self.input_shape) + 1 or list(arr.shape[1:]) != self.input_shape:
+            raise RuntimeError(
+                f"Expected embedding batch shape [B, {', '.join(map(str, self.input_shape))}], got {list(arr.shape)}"
+            )
         # Torch tensor on correct device
-        mat = torch.from_numpy(arr).to(self.device)
+        mat = torch.from_numpy(np.ascontiguousarray(arr)).to(self.device)
 
         if len(self.input_shape) == 2: # 2-D CNN
-            xb = mat.unsqueeze(0).unsqueeze(0) # (1, 1, N, D)
-        elif len(self.input_shape) == 1:# 1-D CNN
-            xb = mat.view(1, -1) # (1, 384)
+            xb = mat.unsqueeze(1) # (B, 1, N, D)
+        elif len(self.input_shape) == 1: # 1-D MLP / CNN
+            xb = mat # (B, D)
         else:
             raise RuntimeError("Unsupported input_shape rank")
 
         try:
             # Run the forward pass
             with torch.no_grad():
-                logit = self.model(xb) # raw score
-                prob = torch.sigmoid(logit).item() # convert to probability
+                logits = self.model(xb) # raw scores
+                probs = torch.sigmoid(logits).reshape(-1) # convert to probabilities
         except Exception as exc:
             logger.error("Model inference failed: %s", exc, exc_info=True)
             raise InferenceError("Model inference failed") from exc
 
-        # Get category
-        prediction_label = self.fallback_label
-        logger.debug("Predicted probability: %.5f", prob)
-        for category in self.categories:
-            code = category['code']
-            upper_bnd = category['upper_bound']
-            if prob <= upper_bnd:
-                prediction_label = code
-                break
+        scores = probs.cpu().numpy().astype(np.float64)
+        return scores, self.assign_levels(scores)
+
+    def assign_levels(self, scores):
+        """Map probabilities to risk category codes.
 
-        # Return the pure inference result (no DB fields)
-        return RiskResult(
-            risk_level=prediction_label,
-            risk_score=round(prob, 4),
-            mdl_used=str(self.cfg.active_model),
-            version=self.service["version"],
-        )
+        A score falls in the first category whose `upper_bound` it does not
+        exceed; scores above every bound get the fallback (highest) code.
+        """
+        idx = np.searchsorted(self._upper_bounds, np.asarray(scores, dtype=np.float64), side="left")
+        return self._codes[idx]
+
+    def to_results(self, scores, levels):
+        """Wrap `predict_batch` output into `RiskResult` objects."""
+        mdl_used = str(self.cfg.active_model)
+        version = self.service["version"]
+        # Return the pure inference results (no DB fields)
+        return [
+            RiskResult(
+                risk_level=int(level),
+                risk_score=round(float(score), 4),
+                mdl_used=mdl_used,
+                version=version,
+            )
+            for score, level in zip(scores, levels)
+        ]
@@ -0,0 +1,375 @@
+"""tabular.py
+Columnar readers and writers for `/predict/file`.
+
+Uploads are CSV, Arrow IPC (file or stream) or Parquet.  `read_chunks`
+yields `FeatureChunk`s of at most `chunk_rows` rows, each holding the
+`feature_order` columns twice:
+
+* ``rows``    - one feature mapping per row, stored as `features_json`
+  and used for deduplication.  Each mapping is built on first access, so
+  a chunk scored column-wise only pays for the rows it stores or reports;
+* ``columns`` - the same values column-wise for
+  `EmbeddingManager.embed_columns`: text columns as strings, numeric
+  columns as float64 arrays (cast in one vectorised step, not per cell).
+  None when a chunk cannot be represented that way (a null, a short CSV
+  line, a non-numeric value); callers then fall back to the row path,
+  which reports the offending rows.
+
+Arrow and Parquet feature columns must be strings, integers, floats or
+booleans; other types (dates and timestamps, decimals, binary, nested)
+are rejected up front, as `features_json` could not store them.
+
+`ResultWriter` encodes result rows back into the upload's format
+incrementally, so a response can stream while later chunks are scored.
+
+Arrow and Parquet need the optional `pyarrow` package.
+"""
+from __future__ import annotations
+
+import csv
+import io
+from collections.abc import Sequence as SequenceABC
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np  # type: ignore[import-not-found]
+
+try:
+    import pyarrow as pa  # type: ignore[import-not-found]
+    import pyarrow.compute as pc  # type: ignore[import-not-found]
+    import pyarrow.ipc as pa_ipc  # type: ignore[import-not-found]
+    import pyarrow.parquet as pq  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Content-Type values accepted for each format (parameters stripped)
+_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+RESULT_COLUMNS = ("row", "record_id", "risk_level", "risk_score", "mdl_used", "version", "error")
+
+
+class TabularError(ValueError):
+    """The upload cannot be read (format, header or schema problem)."""
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    """Format for a Content-Type header value; None if unrecognised."""
+    if not content_type:
+        return None
+    return _CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+
+class LazyRows(SequenceABC):
+    """Row mappings of a chunk, each built on first access and kept.
+
+    Supports indexing, iteration and contiguous slices (``rows[5:]``),
+    which share nothing with the original once taken.
+    """
+    def __init__(self, n_rows: int):
+        self._n_rows = n_rows
+        self._built: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._n_rows)
+            if step != 1:
+                raise ValueError("LazyRows only supports contiguous slices")
+            return self._slice(start, max(start, stop))
+        if i < 0:
+            i += self._n_rows
+        if not 0 <= i < self._n_rows:
+            raise IndexError("row index out of range")
+        row = self._built.get(i)
+        if row is None:
+            row = self._built[i] = self._row(i)
+        return row
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _slice(self, start: int, stop: int) -> "LazyRows":
+        raise NotImplementedError
+
+
+class _CsvRows(LazyRows):
+    """Rows of parsed CSV lines; short lines keep the cells they have."""
+    def __init__(self, lines: List[List[str]], index: Dict[str, int]):
+        super().__init__(len(lines))
+        self._lines = lines
+        self._index = index
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        line = self._lines[i]
+        return {col: line[j] for col, j in self._index.items() if j < len(line)}
+
+    def _slice(self, start: int, stop: int) -> "LazyRows":
+        return _CsvRows(self._lines[start:stop], self._index)
+
+
+class _ArrowRows(LazyRows):
+    """Rows of an Arrow record batch, as Python values."""
+    def __init__(self, batch):
+        super().__init__(batch.num_rows)
+        self._batch = batch
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        return {name: column[i].as_py() for name, column in zip(self._batch.schema.names, self._batch.columns)}
+
+    def _slice(self, start: int, stop: int) -> "LazyRows":
+        return _ArrowRows(self._batch.slice(start, stop - start))
+
+
+@dataclass
+class FeatureChunk:
+    """Up to `chunk_rows` consecutive rows of an upload.
+
+    `first_row` is the 1-based data-row number of ``rows[0]``.
+    """
+    first_row: int
+    rows: Sequence[Dict[str, Any]]
+    columns: Optional[Dict[str, Any]]
+
+    def take(self, positions: Sequence[int]) -> Dict[str, Any]:
+        """`columns` restricted to the rows at `positions`."""
+        if len(positions) == len(self.rows):
+            return self.columns
+        idx = np.asarray(positions, dtype=np.intp)
+        return {
+            col: values[idx] if isinstance(values, np.ndarray) else [values[i] for i in positions]
+            for col, values in self.columns.items()
+        }
+
+
+def read_chunks(fh: BinaryIO, fmt: str, feature_order: Sequence[str], numeric_cols: Sequence[str],
+                chunk_rows: int, extra_columns: Sequence[str] = ()) -> Iterator[FeatureChunk]:
+    """Yield the upload in `fh` as `FeatureChunk`s.
+
+    `extra_columns` are read into ``rows`` as well, whatever their type,
+    but left out of ``columns``.
+
+    Raises `TabularError` when the file is unreadable, lacks a requested
+    column or has a feature column of an unsupported Arrow type.
+    """
+    names = list(feature_order) + [col for col in extra_columns if col not in feature_order]
+    if fmt == "csv":
+        return _read_csv(fh, names, feature_order, numeric_cols, chunk_rows)
+    if pa is None:
+        raise TabularError(f"{fmt} uploads need the optional 'pyarrow' package")
+    if fmt == "arrow":
+        schema, batches = _open_arrow(fh)
+        _check_columns(schema.names, names)
+        _check_types(schema, feature_order)
+        return _read_batches(batches, names, feature_order, numeric_cols, chunk_rows)
+    if fmt == "parquet":
+        try:
+            parquet = pq.ParquetFile(fh)
+        except (pa.ArrowException, OSError) as exc:
+            raise TabularError(f"Not a Parquet file: {exc}") from exc
+        _check_columns(parquet.schema_arrow.names, names)
+        _check_types(parquet.schema_arrow, feature_order)
+        return _read_batches(parquet.iter_batches(batch_size=chunk_rows, columns=names),
+                             names, feature_order, numeric_cols, chunk_rows)
+    raise TabularError(f"Unsupported format '{fmt}'")
+
+
+def _check_columns(names: Sequence[str], required: Sequence[str]) -> None:
+    missing = [col for col in required if col not in names]
+    if missing:
+        raise TabularError(f"Upload is missing required columns: {missing}")
+
+
+def _supported_type(arrow_type) -> bool:
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+            or pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+            or pa.types.is_boolean(arrow_type) or pa.types.is_null(arrow_type))
+
+
+def _check_types(schema, feature_order: Sequence[str]) -> None:
+    """Reject feature columns whose values `features_json` cannot hold."""
+    bad = {col: str(schema.field(col).type) for col in feature_order
+           if not _supported_type(schema.field(col).type)}
+    if bad:
+        raise TabularError(
+            f"Unsupported column types {bad}: feature columns must be strings, integers, "
+            "floats or booleans (send dates and times as ISO 8601 strings)"
+        )
+
+
+def _parse_floats(values: Sequence[str]) -> Optional[np.ndarray]:
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except ValueError:
+        return None
+
+
+def _read_csv(fh: BinaryIO, names: Sequence[str], feature_order: Sequence[str], numeric_cols: Sequence[str],
+              chunk_rows: int) -> Iterator[FeatureChunk]:
+    reader = csv.reader(io.TextIOWrapper(fh, encoding="utf-8-sig", newline=""))
+    try:
+        header = next(reader, None)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise TabularError(f"Cannot read the CSV header: {exc}") from exc
+    if header is None:
+        raise TabularError("CSV upload is empty")
+    header = [name.strip() for name in header]
+    _check_columns(header, names)
+    index = {col: header.index(col) for col in names}
+    width = max(index[col] for col in feature_order) + 1
+
+    def chunks() -> Iterator[FeatureChunk]:
+        first_row = 1
+        while True:
+            lines = []
+            for line in reader:
+                if line:
+                    lines.append(line)
+                    if len(lines) == chunk_rows:
+                        break
+            if not lines:
+                return
+            columns: Optional[Dict[str, Any]] = None
+            # Short lines go down the row path; validation names the missing cells
+            if all(len(line) >= width for line in lines):
+                columns = {col: [line[index[col]] for line in lines] for col in feature_order}
+                for col in numeric_cols:
+                    columns[col] = _parse_floats(columns[col])
+                    if columns[col] is None:
+                        columns = None
+                        break
+            yield FeatureChunk(first_row, _CsvRows(lines, index), columns)
+            first_row += len(lines)
+
+    return chunks()
+
+
+def _open_arrow(fh: BinaryIO):
+    """Schema and record batches of an Arrow IPC file, or of an IPC stream."""
+    try:
+        reader = pa_ipc.open_file(fh)
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        fh.seek(0)
+    try:
+        reader = pa_ipc.open_stream(fh)
+    except pa.ArrowInvalid as exc:
+        raise TabularError(f"Not an Arrow IPC file or stream: {exc}") from exc
+    return reader.schema, iter(reader)
+
+
+def _read_batches(batches, names: Sequence[str], feature_order: Sequence[str], numeric_cols: Sequence[str],
+                  chunk_rows: int) -> Iterator[FeatureChunk]:
+    first_row = 1
+    for batch in batches:
+        batch = batch.select(list(names))
+        for start in range(0, batch.num_rows, chunk_rows):
+            part = batch.slice(start, chunk_rows)
+            yield FeatureChunk(first_row, _ArrowRows(part), _arrow_columns(part, feature_order, numeric_cols))
+            first_row += part.num_rows
+
+
+def _arrow_text(array) -> List[str]:
+    """`array` as the strings the row path would embed (``str(value)``)."""
+    value_type = array.type.value_type if pa.types.is_dictionary(array.type) else array.type
+    if pa.types.is_boolean(value_type):
+        # Arrow's cast gives "true" / "false"
+        return pc.if_else(array, "True", "False").to_pylist()
+    if pa.types.is_floating(value_type):
+        # Arrow's cast renders 1.0 as "1" and switches to exponents at other
+        # points than Python, so floats keep str()
+        return [str(v) for v in array.to_pylist()]
+    return pc.cast(array, pa.string()).to_pylist()
+
+
+def _arrow_columns(batch, feature_order: Sequence[str], numeric_cols: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """Column-wise values of the `feature_order` columns of `batch`; None
+    if any value is null or a numeric column does not cast to float64."""
+    columns: Dict[str, Any] = {}
+    for col in feature_order:
+        array = batch.column(col)
+        if array.null_count:
+            return None
+        try:
+            if col in numeric_cols:
+                columns[col] = pc.cast(array, pa.float64()).to_numpy(zero_copy_only=False)
+            else:
+                columns[col] = _arrow_text(array)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+    return columns
+
+
+class ResultWriter:
+    """Incremental encoder for result rows (`RESULT_COLUMNS` dicts).
+
+    `write` and `close` return the bytes produced so far, which the caller
+    streams to the client; for Parquet every `write` is one row group and
+    `close` emits the footer.
+    """
+    def __init__(self, fmt: str):
+        if fmt != "csv" and pa is None:
+            raise TabularError(f"{fmt} output needs the optional 'pyarrow' package")
+        self.fmt = fmt
+        self.media_type = MEDIA_TYPES[fmt]
+        self._sink = io.BytesIO()
+        self._writer = None
+        if fmt == "csv":
+            self._text = io.TextIOWrapper(self._sink, encoding="utf-8", newline="", write_through=True)
+            self._writer = csv.writer(self._text)
+            self._writer.writerow(RESULT_COLUMNS)
+        else:
+            self._schema = pa.schema([
+                ("row", pa.int64()),
+                ("record_id", pa.string()),
+                ("risk_level", pa.int64()),
+                ("risk_score", pa.float64()),
+                ("mdl_used", pa.string()),
+                ("version", pa.string()),
+                ("error", pa.string()),
+            ])
+            if fmt == "arrow":
+                self._writer = pa_ipc.new_stream(self._sink, self._schema)
+            else:
+                self._writer = pq.ParquetWriter(self._sink, self._schema)
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def write(self, results: List[Dict[str, Any]]) -> bytes:
+        if self.fmt == "csv":
+            self._writer.writerows([[item.get(col) for col in RESULT_COLUMNS] for item in results])
+        elif results:
+            batch = pa.RecordBatch.from_pylist(
+                [{col: item.get(col) for col in RESULT_COLUMNS} for item in results], schema=self._schema)
+            if self.fmt == "arrow":
+                self._writer.write_batch(batch)
+            else:
+                self._writer.write_batch(batch, row_group_size=len(results))
+        return self._drain()
+
+    def close(self) -> bytes:
+        if self.fmt == "csv":
+            self._text.flush()
+        else:
+            self._writer.close()
+        return self._drain()
@@ -0,0 +1,93 @@
+"""vocab_tables.py
+Precomputed, memory-mapped embedding tables for closed-vocabulary columns.
+
+Each table is two files in the model's `vocab_dir`:
+
+    <column>.npy   float32 matrix, row i = embedding of values[i]
+    <column>.json  {"embedder": ..., "normalized": ..., "dim": ..., "values": [...]}
+
+Tables are opened with `mmap_mode="r"`, so every worker process maps the
+same pages and lookups read straight from the page cache without calling
+the encoder.  They are produced offline by `app/scripts/build_vocab_tables.py`.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np  # type: ignore[import-not-found]
+
+logger = logging.getLogger(__name__)
+
+
+class VocabularyTable:
+    """Read-only mapping of one column's known values to embedding rows."""
+    def __init__(self, column: str, vectors: np.ndarray, values: Sequence[str]):
+        if vectors.shape[0] != len(values):
+            raise ValueError(f"Vocabulary table '{column}' has {vectors.shape[0]} rows but {len(values)} values")
+        self.column = column
+        self.vectors = vectors
+        self.index = {value: i for i, value in enumerate(values)}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def row(self, value: str) -> Optional[np.ndarray]:
+        """Return the (memory-mapped) embedding row for `value`, or None."""
+        i = self.index.get(value)
+        return None if i is None else self.vectors[i]
+
+
+def build_vocab_table(embedding_manager, column: str, values: Sequence[str], out_dir: Path) -> Path:
+    """Embed `values` with `embedding_manager` and write `<column>.npy/.json`.
+
+    The vectors are produced by `EmbeddingManager.encode_texts`, so they
+    carry the same normalisation the live path would apply.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    values = [str(v) for v in dict.fromkeys(values)]
+    vectors = embedding_manager.encode_texts(values)
+
+    np.save(out_dir / f"{column}.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+    meta = {
+        "embedder": embedding_manager.embedder_name,
+        "normalized": embedding_manager.normalize_text,
+        "dim": int(vectors.shape[1]),
+        "values": values,
+    }
+    with open(out_dir / f"{column}.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return out_dir / f"{column}.npy"
+
+
+def load_vocab_tables(vocab_dir: Path, columns: List[str], *, embedder: str,
+                      normalized: bool, dim: int) -> Dict[str, VocabularyTable]:
+    """Memory-map every table in `vocab_dir` built for `columns`.
+
+    Tables built with a different embedder, normalisation or dimension are
+    skipped with a warning so stale files can never leak into predictions.
+    """
+    tables: Dict[str, VocabularyTable] = {}
+    vocab_dir = Path(vocab_dir)
+    if not vocab_dir.is_dir():
+        logger.warning("Vocabulary table directory %s not found; encoding all text live", vocab_dir)
+        return tables
+
+    for column in columns:
+        meta_path = vocab_dir / f"{column}.json"
+        npy_path = vocab_dir / f"{column}.npy"
+        if not (meta_path.exists() and npy_path.exists()):
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if (meta.get("embedder"), meta.get("normalized"), meta.get("dim")) != (embedder, normalized, dim):
+            logger.warning("Skipping vocabulary table %s: built for %s/normalized=%s/dim=%s",
+                           npy_path, meta.get("embedder"), meta.get("normalized"), meta.get("dim"))
+            continue
+        vectors = np.load(npy_path, mmap_mode="r")
+        tables[column] = VocabularyTable(column, vectors, meta["values"])
+        logger.info("Mapped vocabulary table '%s' (%d values)", column, len(tables[column]))
+    return tables
@@ -0,0 +1,371 @@
+"""write_behind.py
+Optional write-behind persistence for prediction rows.
+
+With `service.write_behind.enabled`, `/predict` hands its row (id already
+assigned client-side) to `WriteBehindWriter.enqueue` and responds without
+waiting for Postgres.  Rows are appended to a local spool file, kept in an
+in-process buffer, and inserted in bulk once `max_batch_rows` are waiting
+or every `flush_interval_ms`.
+
+Durability comes from the spool: each worker process writes numbered
+JSONL segments under ``<spool_dir>/<pid>-<token>/`` and deletes a segment
+only after its rows are committed.  A worker locks its directory before
+the directory appears under that name (it is created as a hidden claim
+directory and renamed into place), so a spool directory whose lock is
+free belongs to a dead worker.  On startup every such directory holding
+segments is replayed with ON CONFLICT DO NOTHING, so rows committed just
+before a crash are not duplicated, and then removed.
+
+Spool appends (and fsyncs) run on a dedicated thread, in order, so a slow
+disk delays the request being persisted but not the event loop.
+
+Rows are visible to the read endpoints only after their flush.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np  # type: ignore[import-not-found]
+
+from app.crud.predictions_help import insert_prediction_rows
+
+logger = logging.getLogger(__name__)
+
+_LOCK_NAME = ".lock"
+_CLAIM_PREFIX = ".claim-"
+
+
+def _encode_row(row: Dict[str, Any]) -> str:
+    """One spool line; the embedding is stored as base64 little-endian float32."""
+    emb = np.asarray(row["embedding"], dtype="<f4").reshape(-1)
+    return json.dumps({
+        "id": str(row["id"]),
+        "model_id": str(row["model_id"]),
+        "timestamp": row["timestamp"].isoformat(),
+        "features_json": row["features_json"],
+        "embedding": base64.b64encode(emb.tobytes()).decode("ascii"),
+        "risk_score": row["risk_score"],
+        "risk_level": row["risk_level"],
+        "explanation_json": row["explanation_json"],
+        "team_id": str(row["team_id"]),
+    }, separators=(",", ":"))
+
+
+def _decode_row(line: str) -> Dict[str, Any]:
+    data = json.loads(line)
+    return {
+        **data,
+        "id": UUID(data["id"]),
+        "model_id": UUID(data["model_id"]),
+        "timestamp": datetime.fromisoformat(data["timestamp"]),
+        "embedding": np.frombuffer(base64.b64decode(data["embedding"]), dtype="<f4").astype(np.float32),
+        "team_id": UUID(data["team_id"]),
+    }
+
+
+class WriteBehindWriter:
+    """Buffered, spool-backed bulk writer for `predictions` rows.
+
+    Parameters
+    ----------
+    session_factory : async_sessionmaker
+        Factory for the sessions flushes run in.
+    spool_dir : Path
+        Directory holding one spool subdirectory per worker process.
+    max_batch_rows : int
+        Buffered rows that trigger an immediate flush; also the INSERT chunk size.
+    flush_interval_ms : float
+        Maximum time a row waits in the buffer (and retry delay after a failed flush).
+    max_buffer_rows : int
+        Rows held (buffered or awaiting retry) before `enqueue` refuses more
+        and the caller must write synchronously.
+    fsync : bool
+        fsync the spool after every append. Without it the spool survives a
+        process crash but not a host crash.
+    """
+    def __init__(self, session_factory, spool_dir: Path, *, max_batch_rows: int = 500,
+                 flush_interval_ms: float = 200.0, max_buffer_rows: int = 20_000, fsync: bool = False):
+        if max_batch_rows < 1:
+            raise ValueError("max_batch_rows must be >= 1")
+        if max_buffer_rows < max_batch_rows:
+            raise ValueError("max_buffer_rows must be >= max_batch_rows")
+        self.session_factory = session_factory
+        self.spool_dir = Path(spool_dir)
+        self.max_batch_rows = int(max_batch_rows)
+        self.flush_interval = float(flush_interval_ms) / 1000.0
+        self.max_buffer_rows = int(max_buffer_rows)
+        self.fsync = bool(fsync)
+
+        self._dir: Optional[Path] = None
+        self._lock_fh = None
+        self._segment_fh = None
+        self._segment_path: Optional[Path] = None
+        self._next_segment = 0
+        # Single thread: spool writes and segment rotation stay in submission order
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._spool_lock: Optional[asyncio.Lock] = None
+        self._reserved = 0
+        self._buffer: List[Dict[str, Any]] = []
+        # Rotated segments waiting to be committed, oldest first
+        self._unflushed: Deque[Tuple[Path, List[Dict[str, Any]]]] = deque()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.overflowed = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.replayed_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_sum = 0.0
+
+    @classmethod
+    def from_config(cls, session_factory, service_cfg: dict, base_dir: Path) -> Optional["WriteBehindWriter"]:
+        """Build a writer from `service.write_behind`; None when disabled."""
+        opts = service_cfg.get("write_behind") or {}
+        if not opts.get("enabled", False):
+            return None
+        return cls(
+            session_factory,
+            Path(base_dir) / opts.get("spool_dir", "spool/predictions"),
+            max_batch_rows=opts.get("max_batch_rows", 500),
+            flush_interval_ms=opts.get("flush_interval_ms", 200),
+            max_buffer_rows=opts.get("max_buffer_rows", 20_000),
+            fsync=opts.get("fsync", False),
+        )
+
+    @property
+    def buffer_depth(self) -> int:
+        """Rows accepted but not yet committed."""
+        return len(self._buffer) + sum(len(rows) for _, rows in self._unflushed)
+
+    def _claim_dir(self) -> Path:
+        """Create and lock a fresh spool directory for this process.
+
+        The lock is taken while the directory still has a hidden claim name
+        that `_replay_spools` ignores, and only then is it renamed into place
+        (the flock follows the open file across the rename); another worker
+        can therefore never find our directory unlocked.
+        """
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        claim = self.spool_dir / f"{_CLAIM_PREFIX}{name}"
+        claim.mkdir()
+        self._lock_fh = open(claim / _LOCK_NAME, "w")
+        fcntl.flock(self._lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        target = self.spool_dir / name
+        os.rename(claim, target)
+        return target
+
+    async def start(self) -> None:
+        """Claim this process's spool directory, replay orphaned spools and
+        start the flush loop; must be called from the running event loop."""
+        if self._worker is not None:
+            return
+        self._dir = self._claim_dir()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="write-behind-spool")
+        self._spool_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+
+        await self._replay_spools()
+        self._worker = asyncio.create_task(self._run(), name="write-behind")
+        logger.info("Write-behind enabled (spool %s, max_batch_rows=%d, flush_interval_ms=%.0f)",
+                    self._dir, self.max_batch_rows, self.flush_interval * 1000.0)
+
+    async def stop(self) -> None:
+        """Stop the flush loop and make a final attempt to flush everything.
+        Rows that still fail stay in the spool for the next start."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await self._flush()
+        await asyncio.get_running_loop().run_in_executor(self._io, self._close_segment)
+        self._io.shutdown()
+        if self.buffer_depth == 0:
+            shutil.rmtree(self._dir, ignore_errors=True)
+        self._lock_fh.close()
+
+    async def enqueue(self, rows: List[Dict[str, Any]]) -> bool:
+        """Spool and buffer `rows` (from `build_prediction_rows`).
+
+        Returns False, without accepting anything, when the writer is not
+        running, the buffer is full or the spool cannot be written; the
+        caller should then insert the rows itself.
+        """
+        if self._worker is None or self.buffer_depth + self._reserved + len(rows) > self.max_buffer_rows:
+            self.overflowed += len(rows)
+            return False
+
+        loop = asyncio.get_running_loop()
+        self._reserved += len(rows)
+        try:
+            async with self._spool_lock:
+                try:
+                    await loop.run_in_executor(self._io, self._append, rows)
+                except OSError as exc:
+                    logger.error("Write-behind spool append failed; writing synchronously: %s", exc)
+                    self.overflowed += len(rows)
+                    return False
+                self._buffer.extend(rows)
+        finally:
+            self._reserved -= len(rows)
+        self.enqueued += len(rows)
+        if len(self._buffer) >= self.max_batch_rows:
+            self._wake.set()
+        return True
+
+    def _append(self, rows: List[Dict[str, Any]]) -> None:
+        """Append `rows` to the current segment; runs on the spool thread."""
+        if self._segment_fh is None:
+            self._segment_path = self._dir / f"{self._next_segment:012d}.jsonl"
+            self._next_segment += 1
+            self._segment_fh = open(self._segment_path, "a", encoding="utf-8")
+        self._segment_fh.write("".join(_encode_row(row) + "\n" for row in rows))
+        self._segment_fh.flush()
+        if self.fsync:
+            os.fsync(self._segment_fh.fileno())
+
+    async def _run(self) -> None:
+        """Flush on the size trigger or every `flush_interval`."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+
+    def _close_segment(self) -> None:
+        if self._segment_fh is not None:
+            self._segment_fh.close()
+            self._segment_fh = None
+
+    async def _flush(self) -> None:
+        """Rotate the current segment with the buffer and commit every
+        pending segment in order, stopping at the first failure."""
+        async with self._flush_lock:
+            async with self._spool_lock:
+                if self._buffer:
+                    # Holding the spool lock, so the segment holds exactly these rows
+                    await asyncio.get_running_loop().run_in_executor(self._io, self._close_segment)
+                    self._unflushed.append((self._segment_path, self._buffer))
+                    self._buffer = []
+
+            while self._unflushed:
+                path, rows = self._unflushed[0]
+                start = time.perf_counter()
+                try:
+                    await self._insert(rows)
+                except Exception as exc:
+                    self.failed_flushes += 1
+                    logger.error("Write-behind flush of %d rows failed; will retry: %s", len(rows), exc)
+                    return
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                self.flushes += 1
+                self.flushed_rows += len(rows)
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self._flush_ms_sum += elapsed_ms
+                path.unlink(missing_ok=True)
+                self._unflushed.popleft()
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert `rows` in one transaction, `max_batch_rows` per statement."""
+        async with self.session_factory() as session:
+            for i in range(0, len(rows), self.max_batch_rows):
+                await insert_prediction_rows(session, rows[i:i + self.max_batch_rows], skip_existing=True)
+            await session.commit()
+
+    async def _replay_spools(self) -> None:
+        """Insert rows left in spool directories whose owning process is
+        gone, then remove those directories.
+
+        Claim directories (still being set up by a starting worker) and
+        directories without segments are never touched.
+        """
+        for worker_dir in sorted(p for p in self.spool_dir.iterdir() if p.is_dir()):
+            if worker_dir == self._dir or worker_dir.name.startswith(_CLAIM_PREFIX):
+                continue
+            if not any(worker_dir.glob("*.jsonl")):
+                continue
+            try:
+                lock_fh = open(worker_dir / _LOCK_NAME, "a")
+            except FileNotFoundError:
+                continue  # removed by another worker meanwhile
+            with lock_fh:
+                try:
+                    fcntl.flock(lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker owns it
+                if any(worker_dir.glob("*.jsonl")) and await self._replay_dir(worker_dir):
+                    shutil.rmtree(worker_dir, ignore_errors=True)
+
+    async def _replay_dir(self, worker_dir: Path) -> bool:
+        """Replay and delete every segment in `worker_dir`; False if one failed."""
+        for segment in sorted(worker_dir.glob("*.jsonl")):
+            rows = self._read_segment(segment)
+            try:
+                if rows:
+                    await self._insert(rows)
+            except Exception as exc:
+                # Leave the spool in place; the next start retries it
+                logger.error("Replaying %s failed: %s", segment, exc)
+                return False
+            self.replayed_rows += len(rows)
+            segment.unlink()
+            logger.info("Replayed %d spooled predictions from %s", len(rows), segment)
+        return True
+
+    @staticmethod
+    def _read_segment(path: Path) -> List[Dict[str, Any]]:
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(_decode_row(line))
+                except (ValueError, KeyError) as exc:
+                    # A torn final line from a crash mid-append
+                    logger.warning("Skipping unreadable spool line %s:%d: %s", path, lineno, exc)
+        return rows
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "buffer_depth": self.buffer_depth,
+            "pending_segments": len(self._unflushed) + (self._segment_fh is not None),
+            "enqueued": self.enqueued,
+            "overflowed": self.overflowed,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "replayed_rows": self.replayed_rows,
+            "flush_latency_ms": {
+                "last": round(self.last_flush_ms, 3),
+                "mean": round(self._flush_ms_sum / self.flushes, 3) if self.flushes else 0.0,
+                "max": round(self.max_flush_ms, 3),
+            },
+        }
@@ -0,0 +1,159 @@
+"""app/vector_codec.py
+Binary pgvector wire format for asyncpg, straight from / into NumPy.
+
+pgvector's binary `vector` representation is a big-endian header
+``(int16 dim, int16 unused)`` followed by ``dim`` big-endian float32
+values.  Registering this codec on every asyncpg connection lets inserts
+send a float32 buffer and reads return a float32 `np.ndarray`, instead of
+round-tripping 2944 boxed Python floats through pgvector's text format.
+
+`halfvec` (pgvector >= 0.7) uses the same layout with big-endian float16
+values.  Setting ``EMBEDDING_STORAGE=halfvec`` stores embeddings in that
+type, halving their size; they are still returned as float32 arrays.
+
+Exposes:
+    register_vector_codecs(conn)  -> install the codecs on an asyncpg connection
+    NumpyVector(dim)              -> SQLAlchemy column type using them
+    NumpyHalfVector(dim)          -> the same, stored as `halfvec`
+    embedding_column_type(dim)    -> whichever of the two EMBEDDING_STORAGE selects
+    HalfVector(dim)               -> `halfvec` CAST target for the HNSW indexes
+"""
+from __future__ import annotations
+
+import os
+import struct
+from typing import Any
+
+import numpy as np  # type: ignore[import-not-found]
+from pgvector.sqlalchemy import Vector  # type: ignore[import-not-found]
+from sqlalchemy.types import UserDefinedType
+
+_HEADER = struct.Struct(">HH")
+_WIRE_DTYPE = np.dtype(">f4")
+_HALF_WIRE_DTYPE = np.dtype(">f2")
+
+# "vector" (float32, default) or "halfvec" (float16); must match the schema,
+# which `app.scripts.convert_embedding_storage` switches (checked at startup)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
+if EMBEDDING_STORAGE not in ("vector", "halfvec"):
+    raise ValueError(f"EMBEDDING_STORAGE must be 'vector' or 'halfvec', got '{EMBEDDING_STORAGE}'")
+
+
+def encode_vector(value: Any) -> bytes:
+    """Encode a 1-D float array (or sequence) in pgvector's binary format."""
+    arr = np.asarray(value, dtype=_WIRE_DTYPE).reshape(-1)
+    return _HEADER.pack(arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Decode pgvector's binary format into a native float32 array."""
+    dim, _ = _HEADER.unpack_from(data)
+    arr = np.frombuffer(data, dtype=_WIRE_DTYPE, count=dim, offset=_HEADER.size)
+    return arr.astype(np.float32)
+
+
+def encode_halfvec(value: Any) -> bytes:
+    """Encode a 1-D float array in pgvector's binary `halfvec` format."""
+    arr = np.asarray(value, dtype=np.float32).reshape(-1).astype(_HALF_WIRE_DTYPE)
+    return _HEADER.pack(arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_halfvec(data: bytes) -> np.ndarray:
+    """Decode pgvector's binary `halfvec` format into a float32 array."""
+    dim, _ = _HEADER.unpack_from(data)
+    arr = np.frombuffer(data, dtype=_HALF_WIRE_DTYPE, count=dim, offset=_HEADER.size)
+    return arr.astype(np.float32)
+
+
+async def register_vector_codecs(conn) -> None:
+    """Install the binary `vector` and `halfvec` codecs on an asyncpg connection."""
+    await conn.set_type_codec(
+        "vector",
+        schema="public",
+        encoder=encode_vector,
+        decoder=decode_vector,
+        format="binary",
+    )
+    try:
+        await conn.set_type_codec(
+            "halfvec",
+            schema="public",
+            encoder=encode_halfvec,
+            decoder=decode_halfvec,
+            format="binary",
+        )
+    except ValueError:
+        # pgvector < 0.7 has no halfvec type; only needed with EMBEDDING_STORAGE=halfvec
+        if EMBEDDING_STORAGE == "halfvec":
+            raise
+
+
+class NumpyVector(Vector):
+    """pgvector column type that exchanges float32 `np.ndarray` values.
+
+    On asyncpg connections (where `register_vector_codecs` is installed)
+    values pass through untouched and the binary codec does the work.
+    Other drivers, e.g. the sync driver Alembic uses, fall back to the
+    text format.
+    """
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        if dialect.driver == "asyncpg":
+            def process(value):
+                if value is None:
+                    return None
+                return np.asarray(value, dtype=np.float32).reshape(-1)
+            return process
+
+        def process_text(value):
+            if value is None:
+                return None
+            return "[" + ",".join(repr(float(v)) for v in np.asarray(value, dtype=np.float32).reshape(-1)) + "]"
+        return process_text
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None or isinstance(value, np.ndarray):
+                return value
+            return np.array(value[1:-1].split(","), dtype=np.float32)
+        return process
+
+
+class NumpyHalfVector(NumpyVector):
+    """`NumpyVector` stored as pgvector ``halfvec(dim)``.
+
+    Values are bound and returned as float32 arrays; the float16 rounding
+    happens in the `halfvec` codec (or server-side for text input).
+    """
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        if self.dim is None:
+            return "HALFVEC"
+        return f"HALFVEC({self.dim})"
+
+
+def embedding_column_type(dim: int) -> NumpyVector:
+    """Column type for stored embeddings under the configured `EMBEDDING_STORAGE`."""
+    if EMBEDDING_STORAGE == "halfvec":
+        return NumpyHalfVector(dim=dim)
+    return NumpyVector(dim=dim)
+
+
+class HalfVector(UserDefinedType):
+    """pgvector ``halfvec(dim)`` type, used only as a CAST target.
+
+    The HNSW indexes on `predictions.embedding` are built over
+    ``embedding::halfvec(2944)`` (HNSW caps `vector` at 2000 dimensions),
+    so ANN queries cast both sides of the distance operator to this type.
+    Values are never bound or fetched as `halfvec`.
+    """
+    cache_ok = True
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.dim = dim
+
+    def get_col_spec(self, **kw):
+        return f"HALFVEC({self.dim})"
@@ -13,7 +13,9 @@ export const usePredictionDetail = (id: string | null) => {
     enabled: Boolean(id),
     queryFn: async () => {
       if (!id) return null;
-      const { data } = await axios.get<PredictionDetail>(`/predictions/${id}`);
+      const { data } = await axios.get<PredictionDetail>(`/predictions/${id}`, {
+        params: { include_embedding: false },
+      });
       return data;
     },
   });